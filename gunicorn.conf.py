@@ -1,16 +1,45 @@
+import glob
 import multiprocessing
 import os
+import tempfile
 
 # Bind to 0.0.0.0:$PORT for Render compatibility
 bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
 
 # Worker configuration
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# With many workers set CACHE_BACKEND=sqlite so they share one warm cache
+# SERVER_MODE=asgi serves asgi:app on uvicorn workers; each worker event loop
+# keeps many Supabase calls in flight, so one worker per core is enough.
+server_mode = os.environ.get('SERVER_MODE', 'wsgi')
+if server_mode == 'asgi':
+    wsgi_app = "asgi:app"
+    workers = multiprocessing.cpu_count()
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    workers = multiprocessing.cpu_count() * 2 + 1
+    worker_class = "sync"
 worker_connections = 1000
 timeout = 120  # Increased timeout for slow startups
 keepalive = 2
 
+# Metrics: each worker writes samples to per-pid files that /metrics merges.
+# Set before the app (and prometheus_client) is imported. Only the sample
+# files of earlier runs are removed; the directory itself may be the operator's.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'lokiplus-metrics')
+)
+os.makedirs(metrics_dir, exist_ok=True)
+for sample_file in glob.glob(os.path.join(metrics_dir, '*.db')):
+    try:
+        os.remove(sample_file)
+    except OSError:
+        pass
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges from the merged view
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
 # Logging
 accesslog = "-"
 errorlog = "-"
@@ -1,11 +1,31 @@
-from flask import Flask, render_template, request, flash, redirect, url_for, jsonify
-import bcrypt
+from flask import Flask, Response, render_template, request, flash, redirect, url_for, jsonify
 import os
 from dotenv import load_dotenv
 import logging
 from datetime import datetime
 import re
 from config import Config, supabase
+from dashboard import DASHBOARD_TABLES, load_dashboard
+from fragments import fragment_cache, dashboard_fragments, client_cards
+from http_transport import TransportSettings, transport_stats
+from db import Database, DatabasePool, get_backend
+from health_probe import health_payload, live_payload
+from route_manager import route_manager
+import metrics
+import tracing
+import renewals
+import search
+from email_index import email_index, is_unique_violation, known_absent
+import conditional_get
+import events
+import compression
+import json_provider
+from conditional_get import conditional, conditional_json, read_only, versioned_key
+import rate_limit_storage  # registers the sqlite:// limiter storage
+from password_hasher import password_hasher, HasherBusy
+from bulk_import import parse_upload, import_accounts, import_clients, max_account_rows, UploadError
+from cache import (cache, DASHBOARD_KEY, DASHBOARD_TAG, CLIENT_PAGES_TAIL_TAG, client_page_key,
+                   client_email_key, account_clients_key, client_tag, account_tag)
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_cors import CORS
@@ -18,26 +38,40 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.secret_key = Config.SECRET_KEY
 
+# gzip/brotli negotiation; registered first so it runs after every other after_request hook
+compression.init_app(app)
+# Optional orjson encoder for jsonify, the client streams and the ASGI handlers
+json_provider.init_app(app)
+
 # Configure CORS
 CORS(app, resources={
     r"/*": {
-        "origins": [
-            "https://lokiplus.netlify.app",
-            "http://localhost:5173",
-            "http://localhost:4173",
-            "http://localhost:5000",
-            "http://127.0.0.1:5000"
-        ],
+        "origins": Config.CORS_ORIGINS,
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization"]
     }
 })
 
+# Per-route latency histograms for every endpoint
+route_manager.init_app(app)
+# Prometheus metrics, merged across workers at /metrics
+metrics.init_app(app)
+# Supabase call tracing (Server-Timing) and slow-query log
+tracing.init_app(app)
+# Email index loader (one background thread per worker)
+email_index.init_app(app)
+# ETag / Last-Modified validators for the read endpoints
+conditional_get.init_app(app)
+
 # Initialize rate limiter
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"]
+    default_limits=["200 per day", "50 per hour"],
+    storage_uri=Config.RATELIMIT_STORAGE_URL,
+    strategy=Config.RATELIMIT_STRATEGY,
+    # A broken shared store falls back to per-worker counters rather than failing requests
+    in_memory_fallback_enabled=True
 )
 
 # Helper functions and decorators
@@ -65,12 +99,8 @@ def validate_json_request(*required_fields):
     return decorator
 
 def hash_password(password):
-    """Hash a password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-def verify_password(password, hashed):
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    """Hash a password using bcrypt (503 via HasherBusy when the host is saturated)"""
+    return password_hasher.hash(password)
 
 def validate_email(email):
     """Validate email format"""
@@ -91,65 +121,102 @@ def validate_password(password):
 # Health check endpoints
 @app.route('/health')
 def health_check():
-    """Health check endpoint for Render."""
-    try:
-        # Try a simple query to check connection
-        supabase.table('accounts').select('id').limit(1).execute()
-        return jsonify({
-            'status': 'healthy',
-            'timestamp': datetime.utcnow().isoformat()
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'status': 'unhealthy',
-            'timestamp': datetime.utcnow().isoformat(),
-            'error': str(e)
-        }), 503
+    """Health check endpoint for Render, answered from the background prober."""
+    return conditional_json(*health_payload())
 
 @app.route('/health/database')
 def database_health():
-    """Get database health status"""
-    try:
-        # Try a simple query to check connection
-        supabase.table('accounts').select('id').limit(1).execute()
-        return jsonify({
-            'status': 'healthy',
-            'timestamp': datetime.utcnow().isoformat()
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'unhealthy',
-            'timestamp': datetime.utcnow().isoformat(),
-            'error': str(e)
-        }), 503
+    """Get database health status from the last background probe"""
+    return conditional_json(*health_payload())
 
 @app.route('/health/live')
 def live_status():
     """Get live status of all services"""
+    return conditional_json(*live_payload())
+
+@app.route('/health/routes')
+def routes_status():
+    """Get this worker's per-route call counts and latency percentiles"""
+    return jsonify({
+        'timestamp': datetime.now().isoformat(),
+        **route_manager.generate_report()
+    })
+
+@app.route('/metrics')
+@limiter.exempt
+def metrics_endpoint():
+    """Prometheus/OpenMetrics metrics for all workers on this host"""
+    if not Config.METRICS_ENABLED:
+        return {'error': 'Metrics are disabled'}, 404
+    body, content_type = metrics.render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route('/health/cache')
+def cache_status():
+    """Get read-through cache and rendered-row cache counters (hits, misses, evictions, hit ratio)"""
+    return jsonify({
+        'status': 'enabled' if cache.enabled else 'disabled',
+        'timestamp': datetime.now().isoformat(),
+        'cache': cache.stats(),
+        'fragments': fragment_cache.stats()
+    })
+
+@app.route('/health/ratelimit')
+@limiter.exempt
+def ratelimit_status():
+    """Get the rate limiter's storage: tracked keys and bytes per key"""
     try:
-        # Check database connection
-        supabase.table('accounts').select('id').limit(1).execute()
-        
-        status = {
-            'status': 'healthy',
-            'timestamp': datetime.now().isoformat(),
-            'services': {
-                'database': {
-                    'status': 'healthy'
-                },
-                'application': {
-                    'status': 'healthy'
-                }
-            }
-        }
-        return jsonify(status)
-    except Exception as e:
-        logger.error(f"Error checking live status: {e}")
         return jsonify({
-            'status': 'error',
             'timestamp': datetime.now().isoformat(),
-            'error': str(e)
-        }), 500
+            'strategy': Config.RATELIMIT_STRATEGY,
+            'storage': rate_limit_storage.storage_stats(limiter.storage)
+        })
+    except Exception as e:
+        logger.error(f"Error reading rate limit storage: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/health/email_index')
+def email_index_status():
+    """Get this worker's email index: filter sizes, false-positive rates and skipped queries"""
+    return jsonify({
+        'timestamp': datetime.now().isoformat(),
+        'email_index': email_index.stats()
+    })
+
+@app.route('/health/events')
+def events_status():
+    """Get change feed statistics (open streams, buffered events)"""
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'events': events.event_bus.stats()
+    })
+
+@app.route('/events')
+@limiter.exempt
+def event_stream():
+    """Server-Sent Events feed of writes and database status changes (see events.py)"""
+    if not events.streaming_enabled():
+        # Sync workers would each be held by one viewer; 204 stops EventSource reconnects
+        return Response(status=204)
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    return Response(events.stream(last_event_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.context_processor
+def inject_live_events():
+    """Let the pages know whether to open the /events stream or keep polling"""
+    return {'live_events': events.streaming_enabled()}
+
+@app.route('/health/pool')
+def pool_status():
+    """Get this worker's Supabase HTTP and direct database connection pool statistics"""
+    return jsonify({
+        'timestamp': datetime.now().isoformat(),
+        'backend': Config.DATABASE_BACKEND,
+        'pool': transport_stats(TransportSettings.from_config(Config)),
+        'database_pool': DatabasePool.stats()
+    })
 
 def check_db_connection():
     """Check database connection and handle errors"""
@@ -165,33 +232,19 @@ def get_db():
     return supabase.client.postgrest.client()
 
 @app.route('/')
+@conditional('accounts', 'clients', 'account_clients')
 def index():
     """Render the main page with accounts and clients"""
     try:
-        # Try to connect to Supabase and fetch data
-        accounts_response = supabase.table('accounts').select('*').execute()
-        clients_response = supabase.table('clients').select('*').execute()
-        
-        # Get client count for each account
-        for account in accounts_response.data:
-            # Count clients linked to this account
-            count_result = supabase.table('account_clients').select(
-                'id', count='exact'
-            ).eq('account_id', account['id']).execute()
-            account['client_count'] = count_result.count or 0
-            
-            # Format the created_at date
-            if account.get('created_at'):
-                try:
-                    created_at = datetime.fromisoformat(account['created_at'].replace('Z', '+00:00'))
-                    account['created_at'] = created_at.strftime('%Y-%m-%d %H:%M:%S')
-                except Exception as e:
-                    logger.warning(f"Error formatting date: {e}")
-                    account['created_at'] = account['created_at']
+        # Accounts (with client counts) and clients in a constant number of round trips
+        data = cache.get_or_load(versioned_key(DASHBOARD_KEY, *DASHBOARD_TABLES), load_dashboard,
+                                 tags=lambda data: [DASHBOARD_TAG])
         
+        # Table bodies come from the fragment cache; only changed rows are rendered
         return render_template('index.html', 
-                             accounts=accounts_response.data, 
-                             clients=clients_response.data,
+                             accounts=data.accounts, 
+                             clients=data.clients,
+                             fragments=dashboard_fragments(data),
                              db_error=None,
                              error=None)
     except Exception as e:
@@ -228,15 +281,17 @@ def add_account():
             flash('Password must be at least 8 characters long and contain at least one uppercase letter, one lowercase letter, and one number', 'danger')
             return redirect(url_for('index'))
 
+        # Check if account already exists (before spending CPU on the hash);
+        # emails the index has never seen skip the query, the insert catches the rest
+        if email_index.might_exist('accounts', email):
+            existing = supabase.table('accounts').select('id').eq('email', email).execute()
+            if existing.data:
+                flash('An account with this email already exists', 'danger')
+                return redirect(url_for('index'))
+
         # Hash the password
         hashed_password = hash_password(password)
 
-        # Check if account already exists
-        existing = supabase.table('accounts').select('id').eq('email', email).execute()
-        if existing.data:
-            flash('An account with this email already exists', 'danger')
-            return redirect(url_for('index'))
-
         # Insert new account
         new_account = {
             'email': email,
@@ -245,15 +300,31 @@ def add_account():
             'created_at': datetime.utcnow().isoformat(),
             'updated_at': datetime.utcnow().isoformat()
         }
-        result = supabase.table('accounts').insert(new_account).execute()
+        try:
+            result = supabase.table('accounts').insert(new_account).execute()
+        except Exception as e:
+            if not is_unique_violation(e):
+                raise
+            # Written by another worker since this one's email index was loaded
+            email_index.add('accounts', email)
+            flash('An account with this email already exists', 'danger')
+            return redirect(url_for('index'))
 
         if result.data:
+            email_index.add('accounts', email)
+            # A new id may have been probed (and cached as missing) before
+            cache.delete_tag(DASHBOARD_TAG, account_tag(result.data[0]['id']))
+            account = result.data[0]
+            events.publish('account_added', id=account['id'], email=account['email'],
+                           status=account['status'], created_at=account['created_at'])
             flash(f'Account {email} created successfully', 'success')
         else:
             flash('Error creating account', 'danger')
 
         return redirect(url_for('index'))
 
+    except HasherBusy:
+        raise
     except Exception as e:
         logger.error(f"Error adding account: {e}")
         flash('Error adding account', 'danger')
@@ -277,6 +348,8 @@ def update_status():
         }).eq('id', account_id).execute()
 
         if result.data:
+            cache.delete_tag(DASHBOARD_TAG)
+            events.publish('account_updated', id=result.data[0]['id'], status=new_status)
             flash('Status updated successfully', 'success')
         else:
             flash('Error updating status', 'danger')
@@ -288,17 +361,23 @@ def update_status():
     return redirect(url_for('index'))
 
 @app.route('/check_client', methods=['POST'])
+@read_only
 @validate_json_request('email')
 def check_client():
     """Check if a client with the given email already exists"""
     try:
         data = request.get_json()
         email = data['email']
-
-        result = supabase.table('clients').select('*').eq('email', email).execute()
-
-        if result.data:
-            client = result.data[0]
+        # A filter built at the clients table's current version proves a negative
+        if known_absent('clients', email):
+            return jsonify({'exists': False})
+        client = cache.get_or_load(
+            client_email_key(email),
+            lambda: get_backend().client_by_email(email),
+            tags=lambda client: [client_tag(client['id'])] if client else []
+        )
+
+        if client:
             return jsonify({
                 'exists': True,
                 'client': {
@@ -331,41 +410,25 @@ def add_client():
             flash('Invalid email format', 'danger')
             return redirect(url_for('index'))
 
-        # Check if client already exists
-        existing = supabase.table('clients').select('id').eq('email', email).execute()
-        if existing.data:
-            flash('A client with this email already exists', 'danger')
-            return redirect(url_for('index'))
-
-        # Insert new client
-        new_client = {
-            'name': name,
-            'email': email,
-            'renewal_date': renewal_date,
-            'status': 'active',
-            'created_at': datetime.utcnow().isoformat(),
-            'updated_at': datetime.utcnow().isoformat()
-        }
-        client_result = supabase.table('clients').insert(new_client).execute()
-
-        if client_result.data:
-            # Create account-client relationship
-            client_id = client_result.data[0]['id']
-            relation = {
-                'account_id': account_id,
-                'client_id': client_id,
-                'created_at': datetime.utcnow().isoformat()
-            }
-            relation_result = supabase.table('account_clients').insert(relation).execute()
-
-            if relation_result.data:
-                flash(f'Client {name} added successfully', 'success')
-            else:
-                # Rollback client creation if relation fails
-                supabase.table('clients').delete().eq('id', client_id).execute()
-                flash('Error linking client to account', 'danger')
+        # Duplicate check, client limit, insert and link run in one transaction
+        result = supabase.rpc('create_client_for_account', {
+            'p_account_id': account_id,
+            'p_name': name,
+            'p_email': email,
+            'p_renewal_date': renewal_date,
+            'p_max_clients': Config.MAX_CLIENTS_PER_ACCOUNT
+        }).execute().data or {}
+
+        if result.get('success'):
+            email_index.add('clients', email)
+            cache.delete(client_email_key(email))
+            cache.delete_tag(DASHBOARD_TAG, account_tag(account_id))
+            cache.delete_tag(CLIENT_PAGES_TAIL_TAG)
+            events.publish('client_added', id=result.get('client_id'), name=name, email=email,
+                           renewal_date=renewal_date, account_id=int(account_id))
+            flash(f'Client {name} added successfully', 'success')
         else:
-            flash('Error adding client', 'danger')
+            flash(result.get('error', 'Error adding client'), 'danger')
 
         return redirect(url_for('index'))
 
@@ -384,40 +447,23 @@ def link_client():
         client_id = data['client_id']
         account_id = data['account_id']
 
-        # Check if account already has 5 clients
-        count_result = supabase.table('account_clients').select(
-            'id', count='exact'
-        ).eq('account_id', account_id).execute()
+        # Limit check, duplicate check and insert run in one transaction
+        result = supabase.rpc('link_client_to_account', {
+            'p_account_id': account_id,
+            'p_client_id': client_id,
+            'p_max_clients': Config.MAX_CLIENTS_PER_ACCOUNT
+        }).execute().data or {}
 
-        if count_result.count >= 5:
-            return jsonify({
-                'success': False,
-                'error': 'Account already has maximum number of clients (5)'
-            }), 400
-
-        # Check if client is already linked to this account
-        existing = supabase.table('account_clients').select('id').match({
-            'client_id': client_id,
-            'account_id': account_id
-        }).execute()
-
-        if existing.data:
-            return jsonify({
-                'success': False,
-                'error': 'Client is already linked to this account'
-            }), 400
-
-        # Link client to account
-        result = supabase.table('account_clients').insert({
-            'client_id': client_id,
-            'account_id': account_id,
-            'created_at': datetime.utcnow().isoformat()
-        }).execute()
-
-        if result.data:
+        if result.get('success'):
+            cache.delete_tag(DASHBOARD_TAG, account_tag(account_id))
+            events.publish('client_linked', account_id=account_id, client_id=client_id)
             return jsonify({'success': True})
-        else:
-            return jsonify({'success': False, 'error': 'Failed to link client'}), 500
+
+        status_code = 404 if result.get('code') in ('account_not_found', 'client_not_found') else 400
+        return jsonify({
+            'success': False,
+            'error': result.get('error', 'Failed to link client')
+        }), status_code
 
     except Exception as e:
         logger.error(f"Error linking client: {e}")
@@ -439,6 +485,8 @@ def unlink_client():
         }).execute()
 
         if result.data:
+            cache.delete_tag(DASHBOARD_TAG, account_tag(account_id))
+            events.publish('client_unlinked', account_id=account_id, client_id=client_id)
             return jsonify({'success': True})
         else:
             return jsonify({
@@ -450,39 +498,134 @@ def unlink_client():
         logger.error(f"Error unlinking client: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def load_account_clients(account_id):
+    """Load the clients linked to an account, or None if the account does not exist"""
+    return get_backend().account_clients(account_id)
+
+def account_clients_tags(account_id, clients):
+    return [account_tag(account_id), *(client_tag(client['id']) for client in clients or [])]
+
+def parse_account_ids(value):
+    """Parse a comma-separated ``ids`` parameter into unique account ids; raises ValueError"""
+    try:
+        account_ids = list(dict.fromkeys(int(part) for part in (value or '').split(',') if part.strip()))
+    except ValueError:
+        raise ValueError('Parameter ids must be comma-separated integers')
+    if not account_ids:
+        raise ValueError('Parameter ids is required')
+    if len(account_ids) > Config.ACCOUNT_CLIENTS_MAX_IDS:
+        raise ValueError(f'At most {Config.ACCOUNT_CLIENTS_MAX_IDS} ids per request')
+    return account_ids
+
+def run_import(importer, invalidate, max_rows=None):
+    """Parse an upload, run a bulk importer on it and report per-row results"""
+    try:
+        rows = parse_upload(request)
+        batch_size = int(request.args.get('batch_size', Config.IMPORT_BATCH_SIZE))
+    except (UploadError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    if batch_size < 1:
+        return jsonify({'success': False, 'error': 'batch_size must be positive'}), 400
+    max_rows = max_rows or Config.IMPORT_MAX_ROWS
+    if len(rows) > max_rows:
+        return jsonify({
+            'success': False,
+            'error': f'Too many rows ({len(rows)}), the limit is {max_rows}'
+        }), 413
+
+    try:
+        report = importer(rows, batch_size)
+    except HasherBusy:
+        raise
+    except Exception as e:
+        logger.error(f"Error running bulk import: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    created = [result for result in report['results'] if result['status'] == 'created']
+    if created:
+        invalidate(created)
+    return jsonify({'success': True, **report})
+
+@app.route('/import/accounts', methods=['POST'])
+@limiter.limit("5 per minute")
+def bulk_import_accounts():
+    """Create many accounts from a CSV or JSON upload (email, password)"""
+    def invalidate(created):
+        email_index.add('accounts', *(result['email'] for result in created))
+        cache.delete_tag(DASHBOARD_TAG, *(account_tag(result['id']) for result in created))
+        events.publish('accounts_imported', count=len(created))
+
+    # Every row costs a bcrypt hash, so the limit follows the hash cost
+    return run_import(import_accounts, invalidate, max_account_rows())
+
+@app.route('/import/clients', methods=['POST'])
+@limiter.limit("5 per minute")
+def bulk_import_clients():
+    """Create and link many clients from a CSV or JSON upload
+    (name, email, account_id, renewal_date)"""
+    def invalidate(created):
+        email_index.add('clients', *(result['email'] for result in created))
+        cache.delete(*(client_email_key(result['email']) for result in created))
+        cache.delete_tag(DASHBOARD_TAG, CLIENT_PAGES_TAIL_TAG,
+                         *{account_tag(result['account_id']) for result in created})
+        events.publish('clients_imported', count=len(created),
+                       account_ids=sorted({result['account_id'] for result in created}))
+
+    return run_import(import_clients, invalidate)
+
 @app.route('/account_clients/<int:account_id>')
+@conditional('accounts', 'clients', 'account_clients')
 def get_account_clients(account_id):
     """Get all clients linked to an account"""
     try:
-        # First check if the account exists
-        account = supabase.table('accounts').select('id').eq('id', account_id).execute()
-        if not account.data:
+        clients = cache.get_or_load(
+            versioned_key(account_clients_key(account_id), *DASHBOARD_TABLES),
+            lambda: load_account_clients(account_id),
+            tags=lambda clients: account_clients_tags(account_id, clients)
+        )
+        if clients is None:
             return {'error': 'Account not found'}, 404
 
-        # Get all clients linked to this account through the account_clients table
-        relations = supabase.table('account_clients').select(
-            'client_id'
-        ).eq('account_id', account_id).execute()
-
-        if not relations.data:
-            return {'clients': []}
+        return {'clients': clients}
 
-        client_ids = [r['client_id'] for r in relations.data]
-        clients_result = supabase.table('clients').select('*').in_('id', client_ids).execute()
+    except Exception as e:
+        logger.error(f"Error fetching account clients: {e}")
+        return {'error': str(e)}, 500
 
-        clients = []
-        for client in clients_result.data:
-            clients.append({
-                'id': client['id'],
-                'name': client['name'],
-                'email': client['email'],
-                'renewal_date': client['renewal_date']
-            })
+@app.route('/account_clients')
+@conditional('accounts', 'clients', 'account_clients')
+def get_many_account_clients():
+    """Get the clients of many accounts (?ids=1,2,3), loading cache misses in one query"""
+    try:
+        account_ids = parse_account_ids(request.args.get('ids'))
+    except ValueError as e:
+        return {'error': str(e)}, 400
 
-        return {'clients': clients}
+    try:
+        missing = object()
+        found = {}
+        if cache.enabled:
+            for account_id in account_ids:
+                clients = cache.get(versioned_key(account_clients_key(account_id), *DASHBOARD_TABLES), missing)
+                if clients is not missing:
+                    found[account_id] = clients
+        to_load = [account_id for account_id in account_ids if account_id not in found]
+        if to_load:
+            loaded = get_backend().clients_for_accounts(to_load)
+            for account_id in to_load:
+                clients = loaded.get(account_id)
+                cache.set(versioned_key(account_clients_key(account_id), *DASHBOARD_TABLES), clients,
+                          tags=account_clients_tags(account_id, clients))
+                found[account_id] = clients
 
+        return jsonify({
+            'accounts': {account_id: found[account_id] for account_id in account_ids
+                         if found[account_id] is not None},
+            'missing': [account_id for account_id in account_ids if found[account_id] is None]
+        })
     except Exception as e:
-        logger.error(f"Error fetching account clients: {e}")
+        logger.error(f"Error fetching clients for accounts: {e}")
         return {'error': str(e)}, 500
 
 @app.route('/renew_client', methods=['POST'])
@@ -501,6 +644,9 @@ def renew_client():
         }).eq('id', client_id).execute()
 
         if result.data:
+            # Drops the client's page, email lookup and account client lists
+            cache.delete_tag(DASHBOARD_TAG, client_tag(result.data[0]['id']))
+            events.publish('clients_renewed', ids=[result.data[0]['id']], renewal_date=new_renewal_date)
             return jsonify({'success': True})
         else:
             return jsonify({
@@ -512,6 +658,35 @@ def renew_client():
         logger.error(f"Error renewing client: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/renew_clients', methods=['POST'])
+@limiter.limit("10 per minute")
+def renew_clients():
+    """Renew many clients (by id, or all due before a date) with one set-based update"""
+    if not request.is_json:
+        return jsonify({'success': False, 'error': 'Content-Type must be application/json'}), 400
+    try:
+        params = renewals.bulk_renewal_params(request.get_json() or {})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    try:
+        result = supabase.rpc('renew_clients', params).execute().data or {}
+        updated_ids = result.get('updated_ids') or []
+        if updated_ids:
+            # Drops the renewed clients' pages, email lookups and account client lists
+            cache.delete_tag(DASHBOARD_TAG, *[client_tag(client_id) for client_id in updated_ids])
+            # With extend_months every client gets its own date: renewal_date is None
+            events.publish('clients_renewed', ids=updated_ids, renewal_date=params['p_renewal_date'])
+        return jsonify({
+            'success': True,
+            'updated': result.get('updated', len(updated_ids)),
+            'failed_ids': result.get('failed_ids', [])
+        })
+
+    except Exception as e:
+        logger.error(f"Error renewing clients: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/delete_account', methods=['POST'])
 @limiter.limit("5 per minute")
 def delete_account():
@@ -526,6 +701,8 @@ def delete_account():
         result = supabase.table('accounts').delete().eq('id', account_id).execute()
 
         if result.data:
+            cache.delete_tag(DASHBOARD_TAG, account_tag(account_id))
+            events.publish('account_deleted', id=result.data[0]['id'])
             flash('Account deleted successfully', 'success')
         else:
             flash('Account not found', 'danger')
@@ -536,27 +713,197 @@ def delete_account():
     
     return redirect(url_for('index'))
 
+def parse_page_args():
+    """Parse keyset pagination arguments (`after`, `limit`) from the query string"""
+    after = request.args.get('after')
+    limit = request.args.get('limit', Config.CLIENTS_PAGE_SIZE)
+    try:
+        after = int(after) if after not in (None, '') else None
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError('Parameters after and limit must be integers')
+    if limit < 1:
+        raise ValueError('Parameter limit must be positive')
+    return after, min(limit, Config.CLIENTS_MAX_PAGE_SIZE)
+
+def wants_json():
+    """Check whether the client asked for a JSON response"""
+    return (request.args.get('format') == 'json'
+            or request.headers.get('Accept') == 'application/json')
+
+def client_page_payload(after, limit):
+    """Fetch one page of clients and wrap it with its continuation cursor"""
+    def load():
+        clients = Database.get_clients_page(after, limit)
+        next_cursor = clients[-1]['id'] if len(clients) == limit else None
+        return {
+            'status': 'success',
+            'clients': clients,
+            'next_cursor': next_cursor,
+            'limit': limit
+        }
+
+    def tags(payload):
+        # The last page is the only one a newly added client can land on
+        page_tags = [client_tag(client['id']) for client in payload['clients']]
+        if payload['next_cursor'] is None:
+            page_tags.append(CLIENT_PAGES_TAIL_TAG)
+        return page_tags
+
+    return cache.get_or_load(versioned_key(client_page_key(after, limit), 'clients'), load, tags=tags)
+
+def stream_clients(after, limit, stream_format):
+    """Stream all clients after the cursor page by page as NDJSON or a JSON array"""
+    def generate_ndjson():
+        for page in Database.iter_client_pages(limit, after):
+            yield ''.join(app.json.dumps(client) + '\n' for client in page)
+
+    def generate_array():
+        yield '['
+        first = True
+        for page in Database.iter_client_pages(limit, after):
+            chunk = ','.join(app.json.dumps(client) for client in page)
+            yield chunk if first else ',' + chunk
+            first = False
+        yield ']'
+
+    generator = generate_ndjson if stream_format == 'ndjson' else generate_array
+    mimetype = 'application/x-ndjson' if stream_format == 'ndjson' else 'application/json'
+
+    def guarded():
+        try:
+            yield from generator()
+        except Exception as e:
+            # Headers are already sent; abort the body so the client sees a truncated stream
+            logger.error(f"Error streaming clients: {e}")
+            raise
+
+    return Response(guarded(), mimetype=mimetype)
+
 @app.route('/clients')
+@conditional('clients')
 def get_clients():
-    """Get all clients with optional JSON response"""
+    """Get clients one keyset page at a time, as HTML, JSON or a stream"""
     try:
-        # Fetch clients from Supabase
-        clients_response = supabase.table('clients').select('*').execute()
-        clients = clients_response.data
+        after, limit = parse_page_args()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+
+    stream_format = request.args.get('stream')
+    if stream_format is None and request.headers.get('Accept') == 'application/x-ndjson':
+        stream_format = 'ndjson'
+    if stream_format is not None:
+        if stream_format not in ('ndjson', 'json'):
+            return jsonify({'status': 'error', 'error': 'stream must be ndjson or json'}), 400
+        return stream_clients(after, limit, stream_format)
 
-        # If request wants JSON response
-        if request.headers.get('Accept') == 'application/json':
-            return jsonify(clients)
+    try:
+        payload = client_page_payload(after, limit)
+
+        if wants_json():
+            return jsonify(payload)
 
-        # Otherwise render template
-        return render_template('clients.html', clients=clients)
+        # Render the first page; the template fetches the rest on demand
+        return render_template('clients.html', initial_data=payload,
+                               client_cards=client_cards(payload['clients']))
 
     except Exception as e:
         logger.error(f"Error fetching clients: {e}")
-        if request.headers.get('Accept') == 'application/json':
-            return jsonify({'error': str(e)}), 500
+        if wants_json():
+            return jsonify({'status': 'error', 'error': str(e)}), 500
         flash('Error fetching clients', 'danger')
-        return render_template('clients.html', clients=[], error=str(e))
+        return render_template('clients.html', initial_data=None, error=str(e))
+
+def parse_renewal_args():
+    """Parse `status`, the `after` cursor and `limit` for the renewal queries"""
+    status = request.args.get('status', 'active')
+    after = renewals.parse_cursor(request.args.get('after'))
+    try:
+        limit = int(request.args.get('limit', Config.CLIENTS_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('Parameter limit must be an integer')
+    if limit < 1:
+        raise ValueError('Parameter limit must be positive')
+    return status, after, min(limit, Config.CLIENTS_MAX_PAGE_SIZE)
+
+def parse_bounded_int(name, default, maximum):
+    """Parse a non-negative integer query parameter capped at `maximum`"""
+    try:
+        value = int(request.args.get(name, default))
+    except ValueError:
+        raise ValueError(f'Parameter {name} must be an integer')
+    if value < 0:
+        raise ValueError(f'Parameter {name} must not be negative')
+    return min(value, maximum)
+
+@app.route('/renewals/due')
+@conditional('clients', daily=True)
+def renewals_due():
+    """Get clients renewing within `days` days (default RENEWALS_DUE_DAYS), soonest first"""
+    try:
+        days = parse_bounded_int('days', Config.RENEWALS_DUE_DAYS, Config.RENEWALS_MAX_DAYS)
+        status, after, limit = parse_renewal_args()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+
+    try:
+        return jsonify(renewals.due_clients(days, status, after, limit))
+    except Exception as e:
+        logger.error(f"Error fetching due renewals: {e}")
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+@app.route('/renewals/overdue')
+@conditional('clients', daily=True)
+def renewals_overdue():
+    """Get clients whose renewal date has passed, longest overdue first"""
+    try:
+        status, after, limit = parse_renewal_args()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+
+    try:
+        return jsonify(renewals.overdue_clients(status, after, limit))
+    except Exception as e:
+        logger.error(f"Error fetching overdue renewals: {e}")
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+@app.route('/renewals/weekly')
+@conditional('clients', daily=True)
+def renewals_weekly():
+    """Get the number of renewals in each of the next `weeks` weeks"""
+    try:
+        weeks = parse_bounded_int('weeks', Config.RENEWALS_WEEKS, Config.RENEWALS_MAX_WEEKS)
+        status = request.args.get('status', 'active')
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+
+    try:
+        return jsonify(renewals.weekly_counts(weeks, status))
+    except Exception as e:
+        logger.error(f"Error counting renewals: {e}")
+        return jsonify({'status': 'error', 'error': str(e)}), 500
+
+@app.route('/search')
+@conditional('accounts', 'clients')
+def search_directory():
+    """Search client names/emails and account emails by prefix (default) or fuzzily"""
+    mode = request.args.get('mode', 'prefix')
+    if mode not in ('prefix', 'fuzzy'):
+        return jsonify({'status': 'error', 'error': 'mode must be prefix or fuzzy'}), 400
+    try:
+        limit = int(request.args.get('limit', Config.SEARCH_PAGE_SIZE))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'status': 'error', 'error': 'Parameters limit and offset must be integers'}), 400
+
+    try:
+        return jsonify(search.search(request.args.get('q', ''), mode == 'fuzzy',
+                                     request.args.get('kind', 'all'), limit, offset))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error searching: {e}")
+        return jsonify({'status': 'error', 'error': str(e)}), 500
 
 @app.errorhandler(404)
 def not_found_error(error):
@@ -575,6 +922,20 @@ def internal_error(error):
     logger.error(f"Internal server error: {error}")
     return jsonify(error_context), 500
 
+@app.errorhandler(HasherBusy)
+def hasher_busy_error(error):
+    """Shed load when every password hashing slot on the host is taken"""
+    logger.warning("Password hashing queue full, rejecting request")
+    response = jsonify({
+        'error': 'Server busy, please retry',
+        'status_code': 503,
+        'timestamp': datetime.now().isoformat(),
+        'retry_after': error.retry_after
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
 @app.errorhandler(Exception)
 def handle_db_error(error):
     """Handle database and other errors"""
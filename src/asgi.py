@@ -0,0 +1,460 @@
+"""
+ASGI entry point: async handlers for the read-heavy JSON endpoints, with every
+other route served by the Flask app through a WSGI adapter.
+
+One uvicorn worker can then keep many Supabase round trips in flight at once
+instead of blocking a whole sync worker per request:
+
+    SERVER_MODE=asgi gunicorn -c gunicorn.conf.py asgi:app
+
+The async handlers keep the behaviour of Flask's request pipeline. Each
+request is checked against the Flask route's Flask-Limiter limits (same keys,
+same storage), and a request over a limit is handed to Flask, which answers it.
+They also get the CORS headers, compression, metrics and route timings.
+CORS preflights go to Flask-CORS. Calls that can block on a file lock (the
+SQLite cache, the limiter storage) run in a thread, so they never stall the
+event loop and the open ``/events`` streams.
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import request as flask_request
+from flask_limiter.errors import RateLimitExceeded
+from postgrest import AsyncPostgrestClient
+from werkzeug.datastructures import ImmutableMultiDict
+import werkzeug.urls  # registers the 'werkzeug.url_quote' decode error handler
+
+from app import app as flask_app, limiter
+from cache import (cache, CLIENT_PAGES_TAIL_TAG, TABLE_VERSIONS_KEY, client_page_key, client_email_key,
+                   account_clients_key, client_tag, account_tag)
+from conditional_get import Validators, not_modified, payload_etag, stamped_key, validator_headers, validators
+from config import Config
+from dashboard import DASHBOARD_TABLES
+from db import ACCOUNT_CLIENTS_EMBED, TABLE_VERSIONS_COLUMNS, clients_by_account
+from email_index import email_index, known_absent
+import compression
+import events
+from health_probe import health_prober, health_payload, live_payload
+from http_transport import PooledAsyncPostgrestClient, TransportSettings
+from metrics import observe_request
+from route_manager import route_manager
+import tracing
+
+logger = logging.getLogger(__name__)
+
+_async_client: Optional[AsyncPostgrestClient] = None
+
+
+def create_async_client() -> AsyncPostgrestClient:
+    """Create a non-blocking PostgREST client for the current event loop"""
+    return PooledAsyncPostgrestClient(
+        f"{Config.SUPABASE_URL}/rest/v1",
+        settings=TransportSettings.from_config(Config),
+        headers={
+            'apikey': Config.SUPABASE_KEY,
+            'Authorization': f'Bearer {Config.SUPABASE_KEY}'
+        }
+    )
+
+
+def get_async_client() -> AsyncPostgrestClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = create_async_client()
+    return _async_client
+
+
+async def cache_get(key: str, default: Any = None) -> Any:
+    """``cache.get`` off the event loop when the backend is the SQLite file"""
+    if not cache.enabled:
+        return default
+    if cache.backend == 'memory':
+        return cache.get(key, default)
+    return await asyncio.to_thread(cache.get, key, default)
+
+
+async def cache_set(key: str, value: Any, **kwargs):
+    if cache.backend == 'memory':
+        cache.set(key, value, **kwargs)
+    else:
+        await asyncio.to_thread(cache.set, key, value, **kwargs)
+
+
+class Request:
+    def __init__(self, scope, body: bytes):
+        self.scope = scope
+        self.method = scope['method']
+        self.path = scope['path']
+        # Parsed exactly as flask.Request.args, so views, cache keys and ETags agree under both servers
+        self.args = ImmutableMultiDict(parse_qsl(scope.get('query_string', b'').decode(), keep_blank_values=True,
+                                                 errors='werkzeug.url_quote'))
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+        self.body = body
+        self.table_versions = None  # the stamps the response's validators came from
+
+    def conditional_environ(self) -> Dict[str, str]:
+        """The WSGI environ keys werkzeug's conditional checks read"""
+        environ = {'REQUEST_METHOD': self.method}
+        for header in ('if-none-match', 'if-modified-since'):
+            if header in self.headers:
+                environ['HTTP_' + header.upper().replace('-', '_')] = self.headers[header]
+        return environ
+
+    def get_json(self) -> Any:
+        if not self.headers.get('content-type', '').startswith('application/json'):
+            return None
+        try:
+            return json.loads(self.body or b'null')
+        except ValueError:
+            return None
+
+
+def json_response(payload: Any, status: int = 200, headers: Dict[str, str] = None):
+    return status, flask_app.json.dumps(payload).encode('utf-8'), {
+        'content-type': 'application/json', **(headers or {})
+    }
+
+
+def _validator_headers(found: Optional[Validators], weak: bool = False) -> Dict[str, str]:
+    if found is None:
+        return {}
+    return {k.lower(): v for k, v in validator_headers(*found, weak=weak).items()}
+
+
+async def current_table_versions() -> Optional[Dict[str, Dict[str, Any]]]:
+    """The table version stamps (cached like ``conditional_get.table_versions``); None when unavailable"""
+    missing = object()
+    versions = await cache_get(TABLE_VERSIONS_KEY, missing)
+    if versions is missing:
+        try:
+            result = await get_async_client().from_('table_versions').select(TABLE_VERSIONS_COLUMNS).execute()
+        except Exception as e:
+            logger.warning(f"Table versions unavailable: {e}")
+            return None
+        versions = {row['table_name']: row for row in result.data}
+        await cache_set(TABLE_VERSIONS_KEY, versions, ttl=Config.CONDITIONAL_GET_VERSION_TTL)
+    return versions
+
+
+async def version_validators(request: Request, *tables: str) -> Optional[Validators]:
+    """ETag and Last-Modified from the table version stamps; None serves unconditionally"""
+    if not Config.CONDITIONAL_GET_ENABLED:
+        return None
+    versions = await current_table_versions()
+    if versions is None:
+        logger.warning(f"Serving {request.path} unconditionally")
+        return None
+    request.table_versions = versions
+    # Same parts as conditional_get.conditional, so both servers agree on ETags
+    return validators(versions, tables, request.path, sorted(request.args.to_dict().items()),
+                      request.headers.get('accept'), None)
+
+
+def conditional_json_response(request: Request, payload: Any, status: int = 200):
+    """JSON response with a weak ETag over the payload, or 304 if the client holds it"""
+    if status != 200 or not Config.CONDITIONAL_GET_ENABLED:
+        return json_response(payload, status)
+    etag = payload_etag(payload)
+    headers = _validator_headers((etag, None), weak=True)
+    if not_modified(request.conditional_environ(), etag):
+        return 304, b'', headers
+    return json_response(payload, headers=headers)
+
+
+# Handlers mirror their Flask counterparts in app.py
+
+async def health_check(request: Request):
+    # Answered from the background prober's last result, without awaiting I/O
+    return conditional_json_response(request, *health_payload())
+
+
+async def live_status(request: Request):
+    return conditional_json_response(request, *live_payload())
+
+
+async def get_clients(request: Request):
+    """JSON pages of /clients; HTML and streaming requests go to Flask"""
+    try:
+        after = request.args.get('after')
+        after = int(after) if after not in (None, '') else None
+        limit = int(request.args.get('limit', Config.CLIENTS_PAGE_SIZE))
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return json_response({'status': 'error', 'error': 'Parameters after and limit must be positive integers'}, 400)
+    limit = min(limit, Config.CLIENTS_MAX_PAGE_SIZE)
+
+    found = await version_validators(request, 'clients')
+    if found is not None and not_modified(request.conditional_environ(), *found):
+        return 304, b'', _validator_headers(found)
+
+    key = stamped_key(client_page_key(after, limit), request.table_versions, ['clients'])
+    missing = object()
+    payload = await cache_get(key, missing)
+    if payload is missing:
+        try:
+            query = get_async_client().from_('clients').select('*').order('id').limit(limit)
+            if after is not None:
+                query = query.gt('id', after)
+            clients = (await query.execute()).data
+        except Exception as e:
+            logger.error(f"Error fetching clients: {e}")
+            return json_response({'status': 'error', 'error': str(e)}, 500)
+        next_cursor = clients[-1]['id'] if len(clients) == limit else None
+        payload = {'status': 'success', 'clients': clients, 'next_cursor': next_cursor, 'limit': limit}
+        tags = [client_tag(client['id']) for client in clients]
+        if next_cursor is None:
+            tags.append(CLIENT_PAGES_TAIL_TAG)
+        await cache_set(key, payload, tags=tags)
+    return json_response(payload, headers=_validator_headers(found))
+
+
+async def get_account_clients(request: Request, account_id: str):
+    account_id = int(account_id)
+    found = await version_validators(request, 'accounts', 'clients', 'account_clients')
+    if found is not None and not_modified(request.conditional_environ(), *found):
+        return 304, b'', _validator_headers(found)
+
+    key = stamped_key(account_clients_key(account_id), request.table_versions, DASHBOARD_TABLES)
+    missing = object()
+    clients = await cache_get(key, missing)
+    if clients is missing:
+        client = get_async_client()
+        try:
+            # One embedded query; an account that does not exist returns no row
+            result = await client.from_('accounts').select(
+                ACCOUNT_CLIENTS_EMBED
+            ).eq('id', account_id).execute()
+            clients = clients_by_account(result.data).get(account_id)
+        except Exception as e:
+            logger.error(f"Error fetching account clients: {e}")
+            return json_response({'error': str(e)}, 500)
+        await cache_set(key, clients, tags=[account_tag(account_id), *(client_tag(c['id']) for c in clients or [])])
+
+    if clients is None:
+        return json_response({'error': 'Account not found'}, 404)
+    return json_response({'clients': clients}, headers=_validator_headers(found))
+
+
+async def check_client(request: Request):
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return json_response({'error': 'Content-Type must be application/json'}, 400)
+    if 'email' not in data:
+        return json_response({'error': 'Missing required fields', 'missing_fields': ['email']}, 400)
+
+    email = data['email']
+    if email_index.enabled:
+        versions = await current_table_versions()
+        if versions is not None and known_absent('clients', email, versions):
+            return json_response({'exists': False})
+    missing = object()
+    client = await cache_get(client_email_key(email), missing)
+    if client is missing:
+        try:
+            result = await get_async_client().from_('clients').select('*').eq('email', email).execute()
+        except Exception as e:
+            logger.error(f"Error checking client: {e}")
+            return json_response({'error': str(e)}, 500)
+        client = result.data[0] if result.data else None
+        await cache_set(client_email_key(email), client, tags=[client_tag(client['id'])] if client else [])
+
+    if client:
+        return json_response({'exists': True, 'client': {
+            'id': client['id'],
+            'name': client['name'],
+            'email': client['email'],
+            'renewal_date': client['renewal_date']
+        }})
+    return json_response({'exists': False})
+
+
+async def event_stream(request: Request):
+    last_event_id = request.headers.get('last-event-id', request.args.get('last_event_id'))
+    return 200, events.async_stream(last_event_id), {
+        'content-type': 'text/event-stream; charset=utf-8',
+        'cache-control': 'no-cache',
+        'x-accel-buffering': 'no'
+    }
+
+
+def _wants_json_page(request: Request) -> bool:
+    return ('stream' not in request.args
+            and (request.args.get('format') == 'json'
+                 or request.headers.get('accept') == 'application/json'))
+
+
+# (method, path pattern, handler, extra predicate)
+ROUTES = [
+    ('GET', re.compile(r'^/health$'), health_check, None),
+    ('GET', re.compile(r'^/health/database$'), health_check, None),
+    ('GET', re.compile(r'^/health/live$'), live_status, None),
+    ('GET', re.compile(r'^/clients$'), get_clients, _wants_json_page),
+    ('GET', re.compile(r'^/account_clients/(\d+)$'), get_account_clients, None),
+    ('POST', re.compile(r'^/check_client$'), check_client, None),
+    ('GET', re.compile(r'^/events$'), event_stream, None),
+]
+
+
+class AsyncApp:
+    """Dispatch to async handlers, falling back to the Flask app"""
+
+    def __init__(self, wsgi_app):
+        self.fallback = WsgiToAsgi(wsgi_app)
+
+    def match(self, method: str, path: str):
+        for route_method, pattern, handler, predicate in ROUTES:
+            found = pattern.match(path)
+            if found and route_method == method:
+                return handler, found.groups(), predicate
+        return None, (), None
+
+    async def lifespan(self, receive, send):
+        global _async_client
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # One client (and connection pool) per worker event loop
+                _async_client = create_async_client()
+                # First probe at startup, so health requests never wait on the database
+                await asyncio.get_running_loop().run_in_executor(None, health_prober.ensure_started)
+                email_index.ensure_started()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                health_prober.stop()
+                email_index.stop()
+                events.event_bus.stop()
+                if _async_client is not None:
+                    await _async_client.aclose()
+                    _async_client = None
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return await self.fallback(scope, receive, send)
+
+        handler, params, predicate = self.match(scope['method'], scope['path'])
+        if handler is None:
+            return await self.fallback(scope, receive, send)
+
+        body = b''
+        if scope['method'] == 'POST':
+            more = True
+            while more:
+                message = await receive()
+                body += message.get('body', b'')
+                more = message.get('more_body', False)
+        request = Request(scope, body)
+
+        # Replay the consumed body for the WSGI app
+        async def replay():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        if predicate is not None and not predicate(request):
+            return await self.fallback(scope, replay, send)
+
+        started = time.perf_counter()
+        endpoint, allowed = await asyncio.to_thread(self.check_limits, request)
+        if not allowed:
+            # Flask answers the request over the limit, as it would without ASGI
+            return await self.fallback(scope, replay, send)
+
+        trace_token = tracing.start_trace(request.path)
+        try:
+            status, payload, headers = await handler(request, *params)
+            calls = tracing.current_calls()
+            if calls:
+                headers['server-timing'] = tracing.server_timing(calls)
+        finally:
+            tracing.end_trace(trace_token)
+        elapsed = time.perf_counter() - started
+        observe_request(handler.__name__, request.method, status, elapsed)
+        failed = status >= 500
+        route_manager.record(endpoint or handler.__name__, elapsed, failed, f"HTTP {status}" if failed else None)
+        vary = []
+        origin = request.headers.get('origin')
+        if origin in Config.CORS_ORIGINS:
+            headers['access-control-allow-origin'] = origin
+            vary.append('Origin')
+        if isinstance(payload, bytes):
+            payload = self.compress(request, status, payload, headers, vary)
+        if vary:
+            headers['vary'] = ', '.join(vary)
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(k.encode('latin-1'), v.encode('latin-1')) for k, v in headers.items()]
+        })
+        if isinstance(payload, bytes):
+            await send({'type': 'http.response.body', 'body': payload})
+        else:
+            await self.stream(payload, receive, send)
+
+    def check_limits(self, request: Request):
+        """``(endpoint, allowed)``: Flask-Limiter's checks for the Flask route
+        of this request, against the same counters (blocks on the storage)"""
+        client = request.scope.get('client') or ('', 0)
+        with flask_app.test_request_context(request.path, method=request.method,
+                                            query_string=request.scope.get('query_string', b'').decode('latin-1'),
+                                            environ_base={'REMOTE_ADDR': client[0]}):
+            try:
+                limiter.check()
+            except RateLimitExceeded:
+                return flask_request.endpoint, False
+            return flask_request.endpoint, True
+
+    def compress(self, request: Request, status: int, payload: bytes, headers: Dict[str, str], vary: list) -> bytes:
+        """Negotiated gzip/brotli for handler bodies, as compression.py does for Flask"""
+        content_type = headers.get('content-type')
+        if 'content-encoding' in headers or not compression.is_compressible(content_type):
+            return payload
+        if Config.COMPRESSION_ENABLED:
+            vary.append('Accept-Encoding')
+        encoding = compression.choose_encoding(request.method, status, content_type,
+                                               request.headers.get('accept-encoding'))
+        if encoding is None or len(payload) < Config.COMPRESSION_MIN_SIZE:
+            return payload
+        payload = compression.compress(payload, encoding)
+        headers['content-encoding'] = encoding
+        headers['content-length'] = str(len(payload))
+        if 'etag' in headers:
+            headers['etag'] = compression.weak_etag(headers['etag'])
+        return payload
+
+    async def stream(self, chunks, receive, send):
+        """Send an async iterator of text chunks until it ends or the client goes away"""
+        async def disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        disconnected = asyncio.ensure_future(disconnect())
+        iterator = chunks.__aiter__()
+        try:
+            while True:
+                next_chunk = asyncio.ensure_future(iterator.__anext__())
+                await asyncio.wait({next_chunk, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_chunk.done():
+                    next_chunk.cancel()
+                    await asyncio.gather(next_chunk, return_exceptions=True)
+                    return
+                try:
+                    chunk = next_chunk.result()
+                except StopAsyncIteration:
+                    await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+                    return
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        finally:
+            disconnected.cancel()
+            await iterator.aclose()
+
+
+app = AsyncApp(flask_app)
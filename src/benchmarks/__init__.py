@@ -0,0 +1,11 @@
+"""
+Micro-benchmarks for LokiPlus data paths.
+
+Run from the ``src`` directory, e.g. ``python -m benchmarks.bench_dashboard``.
+"""
+import os
+
+# config.py builds the Supabase client at import time; the benchmarks only
+# talk to the in-memory fake, so placeholder credentials are enough.
+os.environ.setdefault('SUPABASE_URL', 'https://example.supabase.co')
+os.environ.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.e30.benchmark')
@@ -0,0 +1,62 @@
+"""
+Round trips and wall time for renewing N clients: one ``/renew_client``
+request per client (what the clients page did) vs. a single
+``/renew_clients`` request running one set-based update.
+
+    python -m benchmarks.bench_bulk_renewal
+"""
+import logging
+import sys
+import time
+
+import app as app_module
+from tests.fake_supabase import FakeSupabase
+
+CLIENT_COUNTS = [100, 1000, 5000]
+LATENCY = 0.0005  # simulated per-request latency (seconds)
+
+
+def make_db(num_clients):
+    clients = [{'id': i, 'name': f'Client {i}', 'email': f'c{i}@example.com', 'status': 'active',
+                'renewal_date': '2025-01-01'} for i in range(1, num_clients + 1)]
+    return FakeSupabase({'accounts': [], 'clients': clients, 'account_clients': []}, latency=LATENCY)
+
+
+def use_db(db):
+    for module in (app_module, sys.modules['db']):
+        module.supabase = db
+
+
+def renew_per_client(client, ids):
+    for client_id in ids:
+        client.post('/renew_client', json={'client_id': client_id, 'renewal_date': '2026-01-01'})
+
+
+def renew_bulk(client, ids):
+    client.post('/renew_clients', json={'client_ids': ids, 'renewal_date': '2026-01-01'})
+
+
+def measure(renew, num_clients):
+    db = make_db(num_clients)
+    use_db(db)
+    ids = list(range(1, num_clients + 1))
+    with app_module.app.test_client() as client:
+        start = time.perf_counter()
+        renew(client, ids)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+    assert all(c['renewal_date'] == '2026-01-01' for c in db.tables['clients'])
+    return len(db.calls), elapsed_ms
+
+
+def main():
+    logging.disable(logging.WARNING)
+    app_module.limiter.enabled = False
+    print(f"{'clients':>8} | {'single trips':>12} {'single ms':>10} | {'bulk trips':>10} {'bulk ms':>8}")
+    for num_clients in CLIENT_COUNTS:
+        single_trips, single_ms = measure(renew_per_client, num_clients)
+        bulk_trips, bulk_ms = measure(renew_bulk, num_clients)
+        print(f"{num_clients:>8} | {single_trips:>12} {single_ms:>10.1f} | {bulk_trips:>10} {bulk_ms:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Round trips and wall time for loading the dashboard, per-account count
+queries (the old ``index()`` loop) vs. the embedded-count loader.
+
+    python -m benchmarks.bench_dashboard
+"""
+import time
+
+from dashboard import load_dashboard_data
+from tests.fake_supabase import FakeSupabase
+
+ACCOUNT_COUNTS = [10, 100, 500, 1000]
+LATENCY = 0.0005  # simulated per-request latency (seconds)
+
+
+def make_db(num_accounts):
+    accounts = [{'id': i, 'email': f'a{i}@example.com', 'status': 'active',
+                 'created_at': '2024-01-01T00:00:00+00:00'} for i in range(1, num_accounts + 1)]
+    clients = [{'id': i, 'name': f'Client {i}', 'email': f'c{i}@example.com',
+                'renewal_date': '2025-01-01'} for i in range(1, num_accounts * 3 + 1)]
+    relations = [{'id': i, 'account_id': (i - 1) // 3 + 1, 'client_id': i}
+                 for i in range(1, num_accounts * 3 + 1)]
+    return FakeSupabase({'accounts': accounts, 'clients': clients,
+                         'account_clients': relations}, latency=LATENCY)
+
+
+def load_per_account(db):
+    """The original N+1 loop from index()/get_mock_data()"""
+    accounts = db.table('accounts').select('*').execute().data
+    clients = db.table('clients').select('*').execute().data
+    for account in accounts:
+        count_result = db.table('account_clients').select(
+            'id', count='exact'
+        ).eq('account_id', account['id']).execute()
+        account['client_count'] = count_result.count or 0
+    return accounts, clients
+
+
+def measure(loader, db):
+    db.reset_calls()
+    start = time.perf_counter()
+    loader(db)
+    return len(db.calls), (time.perf_counter() - start) * 1000
+
+
+def main():
+    print(f"{'accounts':>8} | {'N+1 trips':>9} {'N+1 ms':>9} | {'loader trips':>12} {'loader ms':>9}")
+    for num_accounts in ACCOUNT_COUNTS:
+        db = make_db(num_accounts)
+        legacy_trips, legacy_ms = measure(load_per_account, db)
+        loader_trips, loader_ms = measure(load_dashboard_data, db)
+        print(f"{num_accounts:>8} | {legacy_trips:>9} {legacy_ms:>9.1f} | {loader_trips:>12} {loader_ms:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
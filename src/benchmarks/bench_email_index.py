@@ -0,0 +1,53 @@
+"""
+Memory and false-positive rate of the email index's Bloom filter against an
+exact set of the same emails, at 10k, 100k and 1M emails.
+
+    python -m benchmarks.bench_email_index
+"""
+import sys
+import time
+
+from config import Config
+from email_index import BloomFilter
+
+EMAIL_COUNTS = [10_000, 100_000, 1_000_000]
+PROBES = 200_000  # emails known not to be in the index
+
+
+def set_bytes(emails):
+    return sys.getsizeof(emails) + sum(sys.getsizeof(email) for email in emails)
+
+
+def measure(count):
+    emails = [f'user{i}@example.com' for i in range(count)]
+    start = time.perf_counter()
+    bloom = BloomFilter(count, Config.EMAIL_INDEX_ERROR_RATE)
+    for email in emails:
+        bloom.add(email)
+    build_s = time.perf_counter() - start
+
+    probes = [f'other{i}@example.org' for i in range(PROBES)]
+    start = time.perf_counter()
+    false_positives = sum(email in bloom for email in probes)
+    lookup_us = (time.perf_counter() - start) / PROBES * 1e6
+    return {
+        'bloom_kib': bloom.size_bytes / 1024,
+        'set_kib': set_bytes(set(emails)) / 1024,
+        'fp_rate': false_positives / PROBES,
+        'expected': bloom.expected_error_rate(),
+        'build_s': build_s,
+        'lookup_us': lookup_us
+    }
+
+
+def main():
+    print(f"{'emails':>9} | {'bloom KiB':>9} {'set KiB':>9} | {'fp rate':>8} {'expected':>8} | "
+          f"{'build s':>7} {'lookup us':>9}")
+    for count in EMAIL_COUNTS:
+        r = measure(count)
+        print(f"{count:>9} | {r['bloom_kib']:>9.0f} {r['set_kib']:>9.0f} | {r['fp_rate']:>8.4%} "
+              f"{r['expected']:>8.4%} | {r['build_s']:>7.2f} {r['lookup_us']:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
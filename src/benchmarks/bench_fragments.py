@@ -0,0 +1,97 @@
+"""
+Render time of ``index.html`` with 1k/10k/100k accounts (and as many
+clients). It compares four cases:
+
+- every row rendered on every request (the fragment cache disabled);
+- a cold fragment cache;
+- a warm cache at the same data version, where the table bodies are reused
+  whole;
+- a warm cache after one account changed, where one row is rendered and the
+  others are joined from the cache.
+
+    python -m benchmarks.bench_fragments
+"""
+import time
+
+from flask import render_template
+
+import fragments
+from app import app
+from dashboard import DashboardData
+from fragments import FragmentCache, dashboard_fragments
+
+ROW_COUNTS = [1_000, 10_000, 100_000]
+REPEAT = 3
+
+
+def make_data(rows):
+    accounts = [{'id': i, 'email': f'account{i}@example.com', 'status': 'active',
+                 'created_at': '2024-01-01T00:00:00+00:00', 'client_count': i % 6}
+                for i in range(1, rows + 1)]
+    clients = [{'id': i, 'name': f'Client {i}', 'email': f'client{i}@example.com'}
+               for i in range(1, rows + 1)]
+    return accounts, clients
+
+
+def render(data):
+    return render_template('index.html', accounts=data.accounts, clients=data.clients,
+                           fragments=dashboard_fragments(data), db_error=None, error=None)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def best_of(setup, fn):
+    best = None
+    for _ in range(REPEAT):
+        setup()
+        elapsed = timed(fn)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure(rows):
+    accounts, clients = make_data(rows)
+    data = DashboardData(accounts, clients, (1, 1, 1))
+    changed = [dict(account) for account in accounts]
+    changed[rows // 2]['status'] = 'suspended'
+    changed_data = DashboardData(changed, clients, (2, 1, 1))
+
+    def fresh(enabled=True):
+        fragments.fragment_cache = FragmentCache(max_rows=rows * 3, enabled=enabled)
+
+    def warm():
+        fresh()
+        render(data)
+
+    return {
+        'uncached': best_of(lambda: fresh(enabled=False), lambda: render(data)),
+        'cold': best_of(fresh, lambda: render(data)),
+        'same version': best_of(warm, lambda: render(data)),
+        'one changed': best_of(warm, lambda: render(changed_data)),
+    }
+
+
+def main():
+    cache = fragments.fragment_cache
+    results = []
+    try:
+        with app.test_request_context('/'):
+            render(DashboardData([], [], None))  # compile the templates
+            for rows in ROW_COUNTS:
+                results.append((rows, measure(rows)))
+    finally:
+        fragments.fragment_cache = cache
+
+    columns = list(results[0][1])
+    print(f"index.html render time, ms (best of {REPEAT})\n")
+    print(f"{'rows':>7} | " + ' '.join(f'{name:>12}' for name in columns))
+    for rows, times in results:
+        print(f"{rows:>7} | " + ' '.join(f'{times[name] * 1000:>12.1f}' for name in columns))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Serialization time and payload size of the two biggest responses with 100k
+clients: the clients JSON (one ``/clients?format=json`` page of every client,
+and the same rows as an NDJSON export) and the rendered dashboard
+(``index.html`` with every account and client). It compares the stdlib and
+orjson JSON providers, and the bodies identity-encoded, gzipped (levels 1 and
+6) and brotli-compressed (if the brotli package is installed).
+
+    python -m benchmarks.bench_json_compression
+"""
+import time
+
+from flask import render_template
+from flask.json.provider import DefaultJSONProvider
+
+import compression
+from app import app
+from config import Config
+from json_provider import OrjsonProvider, orjson
+
+CLIENTS = 100_000
+ACCOUNTS = CLIENTS // 3
+REPEAT = 3
+
+
+def make_data():
+    clients = [{'id': i, 'name': f'Client {i}', 'email': f'client{i}@example.com',
+                'phone': f'+1555{i:07d}', 'renewal_date': f'2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}',
+                'created_at': '2024-01-01T00:00:00+00:00', 'updated_at': '2024-06-01T00:00:00+00:00'}
+               for i in range(1, CLIENTS + 1)]
+    accounts = [{'id': i, 'email': f'account{i}@example.com', 'status': 'active',
+                 'created_at': '2024-01-01T00:00:00+00:00', 'client_count': 3}
+                for i in range(1, ACCOUNTS + 1)]
+    return accounts, clients
+
+
+def best_of(fn):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def serialization_rows(clients):
+    payload = {'status': 'success', 'clients': clients, 'next_cursor': None, 'limit': CLIENTS}
+    providers = [('stdlib', DefaultJSONProvider(app))]
+    if orjson is not None:
+        providers.append(('orjson', OrjsonProvider(app)))
+    rows = []
+    for name, provider in providers:
+        page_s, response = best_of(lambda: provider.response(payload))
+        ndjson_s, _ = best_of(lambda: ''.join(provider.dumps(client) + '\n' for client in clients))
+        rows.append((name, page_s, ndjson_s, len(response.get_data())))
+    return rows, response.get_data()
+
+
+def compression_rows(label, body):
+    encodings = [('identity', None, None), ('gzip-1', 'gzip', 1), ('gzip-6', 'gzip', 6)]
+    if compression.brotli is not None:
+        encodings.append((f'br-{Config.COMPRESSION_BROTLI_QUALITY}', 'br', None))
+    rows = []
+    for name, encoding, level in encodings:
+        if encoding is None:
+            rows.append((label, name, len(body), 0.0))
+            continue
+        if level is not None:
+            Config.COMPRESSION_LEVEL = level
+        seconds, compressed = best_of(lambda: compression.compress(body, encoding))
+        rows.append((label, name, len(compressed), seconds))
+    return rows
+
+
+def main():
+    accounts, clients = make_data()
+    with app.test_request_context('/'):
+        rows, page = serialization_rows(clients)
+        render_s, html = best_of(lambda: render_template('index.html', accounts=accounts, clients=clients,
+                                                         db_error=None, error=None))
+
+    print(f"{CLIENTS} clients, {ACCOUNTS} accounts (best of {REPEAT})\n")
+    print(f"{'provider':>8} | {'page ms':>8} {'ndjson ms':>9} | {'page KiB':>8}")
+    for name, page_s, ndjson_s, size in rows:
+        print(f"{name:>8} | {page_s * 1000:>8.0f} {ndjson_s * 1000:>9.0f} | {size / 1024:>8.0f}")
+    print(f"\nindex.html render: {render_s * 1000:.0f} ms\n")
+
+    level = Config.COMPRESSION_LEVEL
+    print(f"{'body':>10} {'encoding':>8} | {'KiB':>7} {'ratio':>6} | {'compress ms':>11}")
+    try:
+        for label, body in [('clients', page), ('index.html', html.encode('utf-8'))]:
+            for label, name, size, seconds in compression_rows(label, body):
+                print(f"{label:>10} {name:>8} | {size / 1024:>7.0f} {len(body) / size:>5.1f}x | "
+                      f"{seconds * 1000:>11.0f}")
+    finally:
+        Config.COMPRESSION_LEVEL = level
+
+
+if __name__ == '__main__':
+    main()
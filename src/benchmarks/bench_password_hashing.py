@@ -0,0 +1,64 @@
+"""
+Accounts created per second with bcrypt in the request threads, with and
+without the host-wide slot limit, and a bulk-import batch hashed in the
+calling thread vs. spread over the thread pool.
+
+    python -m benchmarks.bench_password_hashing [rounds] [accounts] [concurrency]
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from password_hasher import PasswordHasher, HasherBusy
+from tests.fake_supabase import FakeSupabase
+
+
+def create_accounts(hasher, count, concurrency):
+    db = FakeSupabase({'accounts': []})
+    rejected = []
+
+    def create(i):
+        email = f'user{i}@example.com'
+        if db.table('accounts').select('id').eq('email', email).execute().data:
+            return
+        try:
+            hashed = hasher.hash('Secret123')
+        except HasherBusy:
+            rejected.append(i)
+            return
+        db.table('accounts').insert({'email': email, 'password': hashed}).execute()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(create, range(count)))
+    elapsed = time.perf_counter() - start
+    return len(db.tables['accounts']) / elapsed, len(rejected)
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    cpus = os.cpu_count() or 1
+
+    print(f"rounds={rounds} accounts={count} request threads={concurrency} cpus={cpus}")
+    slots_dir = tempfile.mkdtemp(prefix='bench-bcrypt-')
+    for label, max_pending in [('no limit', count), (f'{cpus} slots', cpus), ('2 slots', 2)]:
+        hasher = PasswordHasher(rounds=rounds, pool_size=0, max_pending=max_pending, slots_dir=slots_dir)
+        rate, rejected = create_accounts(hasher, count, concurrency)
+        print(f"{label:>18}: {rate:8.1f} accounts/sec, {rejected} rejected with 503")
+
+    print()
+    for label, pool_size in [('batch inline', 0), (f'batch pool x{cpus}', cpus)]:
+        hasher = PasswordHasher(rounds=rounds, pool_size=pool_size, slots_dir=slots_dir)
+        hasher.hash_many(['warmup'])  # exclude pool start-up
+        start = time.perf_counter()
+        hasher.hash_many(['Secret123'] * count)
+        elapsed = time.perf_counter() - start
+        hasher.shutdown()
+        print(f"{label:>18}: {count / elapsed:8.1f} hashes/sec")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Load comparison of the sync deployment (N gunicorn sync workers, each blocked
+for every Supabase round trip) against one ASGI worker (asgi.py) keeping many
+round trips in flight. Both run in-process against the in-memory fake with a
+simulated per-request database latency.
+
+    python -m benchmarks.bench_serving [requests] [concurrency] [latency_ms]
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+import app as app_module
+import asgi
+import config
+from tests.fake_supabase import FakeSupabase, FakeAsyncPostgrest
+
+SYNC_WORKERS = 3  # cpu_count() * 2 + 1 on a single-core instance
+PATHS = ['/health', '/account_clients/1', '/clients?format=json&limit=50']
+
+
+def make_db(latency):
+    return FakeSupabase({
+        'accounts': [{'id': 1, 'email': 'a@example.com'}],
+        'clients': [{'id': i, 'name': f'C{i}', 'email': f'c{i}@example.com', 'renewal_date': '2025-01-01'}
+                    for i in range(1, 201)],
+        'account_clients': [{'id': i, 'account_id': 1, 'client_id': i} for i in range(1, 6)],
+    }, latency=latency)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_sync(total, concurrency, latency):
+    """``concurrency`` clients share SYNC_WORKERS workers that each serve one request at a time"""
+    db = make_db(latency)
+    for module in (app_module, sys.modules['db']):
+        module.supabase = db
+    app_module.limiter.enabled = False
+    workers = threading.BoundedSemaphore(SYNC_WORKERS)
+    latencies = []
+
+    def client_loop(client_index):
+        with app_module.app.test_client() as client:
+            for i in range(client_index, total, concurrency):
+                sent = time.perf_counter()
+                with workers:
+                    client.get(PATHS[i % len(PATHS)])
+                latencies.append(time.perf_counter() - sent)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as clients:
+        list(clients.map(client_loop, range(concurrency)))
+    return total / (time.perf_counter() - start), latencies
+
+
+def run_async(total, concurrency, latency):
+    """``concurrency`` clients against a single event loop"""
+    asgi._async_client = FakeAsyncPostgrest(make_db(latency))
+    latencies = []
+
+    async def main():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            async def client_loop(client_index):
+                for i in range(client_index, total, concurrency):
+                    sent = time.perf_counter()
+                    await client.get(PATHS[i % len(PATHS)])
+                    latencies.append(time.perf_counter() - sent)
+            await asyncio.gather(*(client_loop(c) for c in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return total / (time.perf_counter() - start), latencies
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000
+    logging.disable(logging.INFO)
+    asgi.cache.enabled = False  # measure database-bound requests, not cache hits
+
+    print(f"requests={total} concurrency={concurrency} db latency={latency * 1000:.0f}ms")
+    rate, latencies = run_sync(total, concurrency, latency)
+    print(f"  sync x{SYNC_WORKERS} workers: {rate:7.1f} req/s  p50 {percentile(latencies, 50) * 1000:7.1f}ms"
+          f"  p99 {percentile(latencies, 99) * 1000:7.1f}ms")
+    rate, latencies = run_async(total, concurrency, latency)
+    print(f"  asgi x1 worker:   {rate:7.1f} req/s  p50 {percentile(latencies, 50) * 1000:7.1f}ms"
+          f"  p99 {percentile(latencies, 99) * 1000:7.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+import csv
+import io
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import Config, supabase
+from email_index import email_index, filter_possible, is_unique_violation
+from password_hasher import HasherBusy, password_hasher
+
+logger = logging.getLogger(__name__)
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+
+class UploadError(ValueError):
+    """Raised when an upload cannot be parsed at all"""
+
+
+def parse_upload(request) -> List[Dict[str, Any]]:
+    """Read import rows from a JSON body, a CSV body or a multipart ``file`` upload"""
+    if request.is_json:
+        data = request.get_json(silent=True)
+        rows = data.get('rows') if isinstance(data, dict) else data
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise UploadError('JSON body must be a list of objects or {"rows": [...]}')
+        return rows
+
+    upload = request.files.get('file')
+    if upload is not None:
+        text = upload.read().decode('utf-8-sig')
+    elif request.mimetype == 'text/csv':
+        text = request.get_data(as_text=True)
+    else:
+        raise UploadError('Upload a CSV file, a text/csv body or a JSON body')
+
+    return [
+        {key.strip(): (value or '').strip() for key, value in row.items() if key}
+        for row in csv.DictReader(io.StringIO(text))
+    ]
+
+
+def _batches(rows: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _password_ok(password: str) -> bool:
+    return (len(password) >= 8 and re.search(r'[A-Z]', password) is not None
+            and re.search(r'[a-z]', password) is not None
+            and re.search(r'[0-9]', password) is not None)
+
+
+def _existing_emails(client, table: str, emails: List[str], use_index: bool = True) -> set:
+    """Find which of the emails already exist, with a single ``in_`` query
+    over those the email index cannot rule out"""
+    if use_index:
+        emails = filter_possible(table, emails)
+    if not emails:
+        return set()
+    result = client.table(table).select('email').in_('email', emails).execute()
+    return {row['email'] for row in result.data}
+
+
+def _insert_new(client, table: str, records: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], set]:
+    """Insert ``records``; returns the inserted rows and the emails found taken.
+
+    The email index does not know emails written by other workers since its
+    last load, so such a duplicate reaches the insert and fails the batch on
+    the unique constraint. The batch is then checked against the database
+    alone and inserted again without the taken emails.
+    """
+    try:
+        return client.table(table).insert(records).execute().data, set()
+    except Exception as e:
+        if not is_unique_violation(e):
+            raise
+        taken = _existing_emails(client, table, [record['email'] for record in records], use_index=False)
+        if not taken:
+            raise
+    email_index.add(table, *taken)
+    remaining = [record for record in records if record['email'] not in taken]
+    inserted = client.table(table).insert(remaining).execute().data if remaining else []
+    return inserted, taken
+
+
+def _link(client, links: List[Tuple[int, str, int, int]], limit: int) -> Dict[int, Dict[str, Any]]:
+    """Link a batch of imported clients with one ``link_clients_to_accounts``
+    call, which locks each account once, so concurrent imports cannot exceed
+    the limit. ``links`` are ``(row, email, client_id, account_id)``; returns
+    the result of each row by client id."""
+    try:
+        result = client.rpc('link_clients_to_accounts', {
+            'p_links': [{'account_id': account_id, 'client_id': client_id}
+                        for _, _, client_id, account_id in links],
+            'p_max_clients': limit
+        }).execute().data or {}
+    except Exception as e:
+        logger.error(f"Error linking imported clients: {e}")
+        return {client_id: {'row': index, 'email': email, 'status': 'error', 'error': str(e)}
+                for index, email, client_id, _ in links}
+
+    linked = set(result.get('linked_ids') or [])
+    rejected = set(result.get('rejected_ids') or [])
+    not_found = set(result.get('not_found_ids') or [])
+    results = {}
+    for index, email, client_id, account_id in links:
+        if client_id in linked:
+            results[client_id] = {'row': index, 'email': email, 'status': 'created', 'id': client_id,
+                                  'account_id': account_id}
+        elif client_id in rejected:
+            results[client_id] = {'row': index, 'email': email, 'status': 'rejected',
+                                  'error': f'Account already has maximum number of clients ({limit})'}
+        elif client_id in not_found:
+            results[client_id] = {'row': index, 'email': email, 'status': 'invalid',
+                                  'error': f'Account {account_id} not found'}
+        else:
+            results[client_id] = {'row': index, 'email': email, 'status': 'error',
+                                  'error': 'Failed to link client'}
+    return results
+
+
+def _delete_clients(client, ids: List[int]):
+    """Roll back imported clients; a failure is logged so the batch results survive"""
+    if not ids:
+        return
+    try:
+        client.table('clients').delete().in_('id', ids).execute()
+    except Exception as e:
+        logger.error(f"Error rolling back imported clients {ids}: {e}")
+
+
+def _summarize(results: List[Dict[str, Any]]) -> Dict[str, int]:
+    summary: Dict[str, int] = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return summary
+
+
+def max_account_rows(hasher=None) -> int:
+    """Accounts one request may import: as many as the thread pool can hash in
+    ``IMPORT_HASH_BUDGET`` seconds, at most ``IMPORT_MAX_ROWS``"""
+    hasher = hasher or password_hasher
+    threads = min(max(hasher.pool_size, 1), os.cpu_count() or 1)
+    per_second = threads / hasher.seconds_per_hash()
+    return max(1, min(Config.IMPORT_MAX_ROWS, int(Config.IMPORT_HASH_BUDGET * per_second)))
+
+
+def import_accounts(rows: List[Dict[str, Any]], batch_size: int = Config.IMPORT_BATCH_SIZE,
+                    client=None, hasher=None) -> Dict[str, Any]:
+    """Create accounts in batches: one duplicate check and one insert per batch.
+
+    Returns a per-row result (``created``, ``duplicate``, ``invalid`` or
+    ``error``) in input order plus a summary. :class:`HasherBusy` is not a
+    row error; it propagates when no hashing slot is free.
+    """
+    client = client or supabase
+    hasher = hasher or password_hasher
+    results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+    seen = set()
+
+    indexed = list(enumerate(rows))
+    for batch in _batches(indexed, batch_size):
+        candidates = []
+        for index, row in batch:
+            email = str(row.get('email') or '').strip()
+            password = str(row.get('password') or '')
+            if not EMAIL_PATTERN.match(email):
+                results[index] = {'row': index, 'email': email, 'status': 'invalid',
+                                  'error': 'Invalid email format'}
+            elif not _password_ok(password):
+                results[index] = {'row': index, 'email': email, 'status': 'invalid',
+                                  'error': 'Password does not meet strength requirements'}
+            elif email in seen:
+                results[index] = {'row': index, 'email': email, 'status': 'duplicate',
+                                  'error': 'Duplicate email in upload'}
+            else:
+                seen.add(email)
+                candidates.append((index, email, password))
+
+        existing = _existing_emails(client, 'accounts', [email for _, email, _ in candidates])
+        to_insert = []
+        for index, email, password in candidates:
+            if email in existing:
+                results[index] = {'row': index, 'email': email, 'status': 'duplicate',
+                                  'error': 'An account with this email already exists'}
+            else:
+                to_insert.append((index, email, password))
+        if not to_insert:
+            continue
+
+        now = datetime.utcnow().isoformat()
+        try:
+            hashed = hasher.hash_many([password for _, _, password in to_insert])
+            inserted, taken = _insert_new(client, 'accounts', [
+                {'email': email, 'password': hashed_password, 'status': 'active',
+                 'created_at': now, 'updated_at': now}
+                for (_, email, _), hashed_password in zip(to_insert, hashed)
+            ])
+        except HasherBusy:
+            # The route answers 503 with Retry-After, like a single sign-up
+            raise
+        except Exception as e:
+            logger.error(f"Error importing account batch: {e}")
+            for index, email, _ in to_insert:
+                results[index] = {'row': index, 'email': email, 'status': 'error', 'error': str(e)}
+            continue
+
+        ids = {row['email']: row['id'] for row in inserted}
+        for index, email, _ in to_insert:
+            if email in taken:
+                results[index] = {'row': index, 'email': email, 'status': 'duplicate',
+                                  'error': 'An account with this email already exists'}
+            else:
+                results[index] = {'row': index, 'email': email, 'status': 'created', 'id': ids.get(email)}
+
+    return {'summary': _summarize(results), 'results': results}
+
+
+def _account_client_counts(client, account_ids: List[int]) -> Dict[int, int]:
+    """Get existing accounts and their client counts with one embedded-count query"""
+    if not account_ids:
+        return {}
+    result = client.table('accounts').select('id, account_clients(count)').in_('id', account_ids).execute()
+    counts = {}
+    for account in result.data:
+        relation = account.get('account_clients') or [{}]
+        counts[account['id']] = relation[0].get('count') or 0
+    return counts
+
+
+def import_clients(rows: List[Dict[str, Any]], batch_size: int = Config.IMPORT_BATCH_SIZE,
+                   client=None) -> Dict[str, Any]:
+    """Create clients (linked to their account) in batches.
+
+    Per batch: one duplicate-email query, one query for account existence and
+    client counts, one insert into ``clients`` and one
+    ``link_clients_to_accounts`` call, which locks the accounts like
+    ``/link_client`` does, so the per-account limit holds against concurrent
+    imports and links. The counts only reject rows that are clearly over the
+    limit before anything is inserted. Clients whose link is refused are
+    deleted again.
+    """
+    client = client or supabase
+    limit = Config.MAX_CLIENTS_PER_ACCOUNT
+    results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+    seen = set()
+    counts: Dict[int, int] = {}
+
+    indexed = list(enumerate(rows))
+    for batch in _batches(indexed, batch_size):
+        candidates = []
+        for index, row in batch:
+            name = str(row.get('name') or '').strip()
+            email = str(row.get('email') or '').strip()
+            account_id = str(row.get('account_id') or '').strip()
+            renewal_date = str(row.get('renewal_date') or '').strip()
+            if not all([name, email, account_id, renewal_date]):
+                results[index] = {'row': index, 'email': email, 'status': 'invalid',
+                                  'error': 'name, email, account_id and renewal_date are required'}
+            elif not EMAIL_PATTERN.match(email):
+                results[index] = {'row': index, 'email': email, 'status': 'invalid',
+                                  'error': 'Invalid email format'}
+            elif not account_id.isdigit():
+                results[index] = {'row': index, 'email': email, 'status': 'invalid',
+                                  'error': 'account_id must be an integer'}
+            elif email in seen:
+                results[index] = {'row': index, 'email': email, 'status': 'duplicate',
+                                  'error': 'Duplicate email in upload'}
+            else:
+                seen.add(email)
+                candidates.append((index, name, email, int(account_id), renewal_date))
+
+        existing = _existing_emails(client, 'clients', [c[2] for c in candidates])
+        unknown = sorted({c[3] for c in candidates} - set(counts))
+        counts.update(_account_client_counts(client, unknown))
+
+        to_insert = []
+        for index, name, email, account_id, renewal_date in candidates:
+            if email in existing:
+                results[index] = {'row': index, 'email': email, 'status': 'duplicate',
+                                  'error': 'A client with this email already exists'}
+            elif account_id not in counts:
+                results[index] = {'row': index, 'email': email, 'status': 'invalid',
+                                  'error': f'Account {account_id} not found'}
+            elif counts[account_id] >= limit:
+                results[index] = {'row': index, 'email': email, 'status': 'rejected',
+                                  'error': f'Account already has maximum number of clients ({limit})'}
+            else:
+                counts[account_id] += 1
+                to_insert.append((index, name, email, account_id, renewal_date))
+        if not to_insert:
+            continue
+
+        now = datetime.utcnow().isoformat()
+        try:
+            inserted, taken = _insert_new(client, 'clients', [
+                {'name': name, 'email': email, 'renewal_date': renewal_date, 'status': 'active',
+                 'created_at': now, 'updated_at': now}
+                for _, name, email, _, renewal_date in to_insert
+            ])
+        except Exception as e:
+            logger.error(f"Error importing client batch: {e}")
+            for index, _, email, account_id, _ in to_insert:
+                counts[account_id] -= 1
+                results[index] = {'row': index, 'email': email, 'status': 'error', 'error': str(e)}
+            continue
+
+        ids = {row['email']: row['id'] for row in inserted}
+        links = []
+        for index, _, email, account_id, _ in to_insert:
+            if email in taken:
+                counts[account_id] -= 1
+                results[index] = {'row': index, 'email': email, 'status': 'duplicate',
+                                  'error': 'A client with this email already exists'}
+            else:
+                links.append((index, email, ids[email], account_id))
+        linked = _link(client, links, limit) if links else {}
+        unlinked = []
+        for index, email, client_id, account_id in links:
+            results[index] = linked[client_id]
+            if results[index]['status'] != 'created':
+                counts[account_id] -= 1
+                unlinked.append(client_id)
+        # Clients whose link was refused or failed are not kept
+        _delete_clients(client, unlinked)
+
+    return {'summary': _summarize(results), 'results': results}
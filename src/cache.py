@@ -0,0 +1,447 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Cache keys. Entries can also carry tags (e.g. ``client:<id>``) so a write
+# can drop every entry that contains a given row without knowing the keys.
+# The dashboard and account client lists are stored under keys stamped with
+# the table versions (``conditional_get.versioned_key``), so writes drop them
+# by tag: that covers every stamp, and the plain key used while unstamped.
+DASHBOARD_KEY = 'dashboard'
+DASHBOARD_TAG = 'dashboard'
+CLIENT_PAGES_TAIL_TAG = 'clients:tail'
+TABLE_VERSIONS_KEY = 'table_versions'
+
+
+def client_page_key(after: Optional[int], limit: int) -> str:
+    return f'clients:page:{after}:{limit}'
+
+
+def client_email_key(email: str) -> str:
+    return f'clients:email:{email}'
+
+
+def account_clients_key(account_id: int) -> str:
+    return f'account_clients:{account_id}'
+
+
+def client_tag(client_id: Any) -> str:
+    return f'client:{client_id}'
+
+
+def account_tag(account_id: Any) -> str:
+    return f'account:{account_id}'
+
+
+class CacheBackend:
+    """Interface shared by the cache backends.
+
+    Backends implement ``get``/``set``/``delete``/``delete_tag``/``clear`` and
+    ``_counters``; the read-through and stats logic lives here.
+    """
+    backend = 'base'
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        # Optional ``callback(event, amount)`` for every counter change (see metrics.py)
+        self.on_event: Optional[Callable[[str, int], None]] = None
+
+    def _notify(self, event: str, amount: int = 1):
+        if self.on_event is not None and amount:
+            self.on_event(event, amount)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, tags: Iterable[str] = ()):
+        raise NotImplementedError
+
+    def delete(self, *keys: str):
+        raise NotImplementedError
+
+    def delete_tag(self, *tags: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def _counters(self) -> Dict[str, int]:
+        """Get the raw counters plus the current ``size``"""
+        raise NotImplementedError
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], ttl: Optional[float] = None,
+                    tags: Callable[[Any], Iterable[str]] = None) -> Any:
+        """Read-through lookup: call ``loader`` on a miss and cache its result.
+
+        Loader exceptions propagate and nothing is cached. ``tags`` maps the
+        loaded value to the tags the entry should carry.
+        """
+        if not self.enabled:
+            return loader()
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = loader()
+            self.set(key, value, ttl, tags(value) if tags else ())
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters and the current size"""
+        stats = self._counters()
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'backend': self.backend,
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'enabled': self.enabled,
+            'hit_ratio': round(stats['hits'] / lookups, 4) if lookups else None
+        })
+        return stats
+
+
+class TTLCache(CacheBackend):
+    """Thread-safe in-process cache with per-entry TTL and LRU eviction"""
+    backend = 'memory'
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60, enabled: bool = True):
+        super().__init__(max_entries, ttl, enabled)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tags: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def _count(self, event: str):
+        self._stats[event] += 1
+        self._notify(event)
+
+    def _remove(self, key: str):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a value, counting the lookup as a hit or miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._count('misses')
+                return default
+            value, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self._count('expirations')
+                self._count('misses')
+                return default
+            self._entries.move_to_end(key)
+            self._count('hits')
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, tags: Iterable[str] = ()):
+        """Store a value, evicting the least recently used entries when full"""
+        if not self.enabled:
+            return
+        tags = frozenset(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + (ttl or self.ttl), tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._count('evictions')
+
+    def delete(self, *keys: str):
+        """Invalidate specific keys"""
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+                    self._count('invalidations')
+
+    def delete_tag(self, *tags: str):
+        """Invalidate every entry carrying one of the tags"""
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    self._count('invalidations')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _counters(self) -> Dict[str, int]:
+        with self._lock:
+            counters = dict(self._stats)
+            counters['size'] = len(self._entries)
+        return counters
+
+
+class SQLiteCache(CacheBackend):
+    """Cache stored in a local SQLite file shared by every worker on the host.
+
+    Values are pickled. Connections are opened lazily per process and thread,
+    so an instance created before gunicorn forks (``preload_app``) is safe to
+    use in the workers.
+
+    A lookup is a plain ``SELECT``, so reads never wait on SQLite's single
+    write lock. Hit/miss counters and the read times that drive LRU eviction
+    are kept in the process and written to the file at most every
+    ``flush_interval`` seconds, or with the next write. A read time is only
+    recorded once it is older than ``TOUCH_FRACTION`` of the TTL. ``stats()``
+    reports the counters summed over every worker on the host.
+    """
+    backend = 'sqlite'
+
+    # Record a hit's read time once the stored one is older than this part of the TTL
+    TOUCH_FRACTION = 0.25
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            key TEXT PRIMARY KEY,
+            value BLOB NOT NULL,
+            expires_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed_at ON cache_entries(accessed_at);
+        CREATE INDEX IF NOT EXISTS idx_cache_entries_expires_at ON cache_entries(expires_at);
+        CREATE TABLE IF NOT EXISTS cache_tags (
+            tag TEXT NOT NULL,
+            key TEXT NOT NULL REFERENCES cache_entries(key) ON DELETE CASCADE,
+            PRIMARY KEY (tag, key)
+        );
+        CREATE INDEX IF NOT EXISTS idx_cache_tags_key ON cache_tags(key);
+        CREATE TABLE IF NOT EXISTS cache_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, max_entries: int = 1024, ttl: float = 60, enabled: bool = True,
+                 flush_interval: float = Config.CACHE_SQLITE_FLUSH_INTERVAL):
+        super().__init__(max_entries, ttl, enabled)
+        self.path = path
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending_pid = None
+        self._pending: Dict[str, int] = {}
+        self._touched: Dict[str, float] = {}
+        self._flushed_at = time.monotonic()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        # Never reuse a connection inherited across fork
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        conn.executescript(self.SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _own_pending(self):
+        # Counters copied across fork belong to the parent; caller holds self._lock
+        if self._pending_pid != os.getpid():
+            self._pending_pid = os.getpid()
+            self._pending = {}
+            self._touched = {}
+
+    def _count(self, name: str, amount: int = 1, touched: Optional[str] = None, now: float = 0):
+        """Count an event in this process; it reaches the file with the next flush"""
+        with self._lock:
+            self._own_pending()
+            if amount:
+                self._pending[name] = self._pending.get(name, 0) + amount
+            if touched is not None:
+                self._touched[touched] = now
+        self._notify(name, amount)
+
+    def _flush(self, conn: sqlite3.Connection):
+        """Write this process's counters and read times; the caller holds a write transaction"""
+        with self._lock:
+            self._own_pending()
+            pending, touched = self._pending, self._touched
+            self._pending, self._touched = {}, {}
+            self._flushed_at = time.monotonic()
+        try:
+            conn.executemany(
+                'INSERT INTO cache_stats (name, value) VALUES (?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                list(pending.items())
+            )
+            conn.executemany('UPDATE cache_entries SET accessed_at = MAX(accessed_at, ?) WHERE key = ?',
+                             [(accessed_at, key) for key, accessed_at in touched.items()])
+        except sqlite3.Error:
+            # Put them back for the next flush
+            with self._lock:
+                for name, amount in pending.items():
+                    self._pending[name] = self._pending.get(name, 0) + amount
+                for key, accessed_at in touched.items():
+                    self._touched[key] = max(accessed_at, self._touched.get(key, 0))
+            raise
+
+    def _flush_due(self):
+        if time.monotonic() - self._flushed_at < self.flush_interval:
+            return
+        try:
+            conn = self._connect()
+            with conn:
+                self._flush(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Cache counter flush failed: {e}")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            value = self._get(key, default)
+        except sqlite3.Error as e:
+            # A locked or broken cache file degrades to a miss, never a failed request
+            logger.warning(f"Cache read failed for {key}: {e}")
+            return default
+        self._flush_due()
+        return value
+
+    def _get(self, key: str, default: Any) -> Any:
+        # Outside a transaction: a read takes no write lock
+        row = self._connect().execute(
+            'SELECT value, expires_at, accessed_at FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        now = time.time()
+        if row is None or row[1] <= now:
+            # Expired rows are purged by the next write
+            self._count('misses')
+            return default
+        stale = now - row[2] > self.ttl * self.TOUCH_FRACTION
+        self._count('hits', touched=key if stale else None, now=now)
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, tags: Iterable[str] = ()):
+        if not self.enabled:
+            return
+        try:
+            self._set(key, value, ttl, tags)
+        except sqlite3.Error as e:
+            logger.warning(f"Cache write failed for {key}: {e}")
+
+    def _set(self, key: str, value: Any, ttl: Optional[float], tags: Iterable[str]):
+        conn = self._connect()
+        now = time.time()
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with conn:
+            expired = conn.execute('DELETE FROM cache_entries WHERE expires_at <= ?', (now,)).rowcount
+            self._count('expirations', expired)
+            conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+            conn.execute(
+                'INSERT INTO cache_entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, payload, now + (ttl or self.ttl), now)
+            )
+            conn.executemany('INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)',
+                             [(tag, key) for tag in set(tags)])
+            # Recorded read times count for this eviction
+            self._flush(conn)
+            overflow = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    'DELETE FROM cache_entries WHERE key IN ('
+                    'SELECT key FROM cache_entries ORDER BY accessed_at LIMIT ?)',
+                    (overflow,)
+                )
+                self._count('evictions', overflow)
+                self._flush(conn)
+
+    def delete(self, *keys: str):
+        if not keys:
+            return
+        try:
+            self._delete(keys)
+        except sqlite3.Error as e:
+            # The write behind the invalidation already succeeded; entries expire with their TTL
+            logger.warning(f"Cache invalidation failed for {', '.join(keys)}: {e}")
+
+    def _delete(self, keys: Iterable[str]):
+        keys = tuple(keys)
+        conn = self._connect()
+        with conn:
+            deleted = conn.execute(
+                f"DELETE FROM cache_entries WHERE key IN ({','.join('?' * len(keys))})", keys
+            ).rowcount
+            self._count('invalidations', deleted)
+            self._flush(conn)
+
+    def delete_tag(self, *tags: str):
+        if not tags:
+            return
+        try:
+            self._delete_tag(tags)
+        except sqlite3.Error as e:
+            logger.warning(f"Cache invalidation failed for tags {', '.join(tags)}: {e}")
+
+    def _delete_tag(self, tags: Iterable[str]):
+        tags = tuple(tags)
+        conn = self._connect()
+        with conn:
+            deleted = conn.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                f"SELECT key FROM cache_tags WHERE tag IN ({','.join('?' * len(tags))}))", tags
+            ).rowcount
+            self._count('invalidations', deleted)
+            self._flush(conn)
+
+    def clear(self):
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute('DELETE FROM cache_entries')
+        except sqlite3.Error as e:
+            logger.warning(f"Cache clear failed: {e}")
+
+    def _counters(self) -> Dict[str, int]:
+        counters = {name: 0 for name in ('hits', 'misses', 'evictions', 'expirations', 'invalidations')}
+        try:
+            conn = self._connect()
+            with conn:
+                self._flush(conn)
+            counters.update(dict(conn.execute('SELECT name, value FROM cache_stats').fetchall()))
+            counters['size'] = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        except sqlite3.Error as e:
+            # Health endpoints report what this worker knows instead of failing
+            logger.warning(f"Cache stats unavailable: {e}")
+            with self._lock:
+                self._own_pending()
+                counters.update(self._pending)
+            counters['size'] = None
+        return counters
+
+
+def create_cache(config=Config) -> CacheBackend:
+    """Create the cache backend selected by ``Config.CACHE_BACKEND``"""
+    if config.CACHE_BACKEND == 'memory':
+        return TTLCache(config.CACHE_MAX_ENTRIES, config.CACHE_TTL, config.CACHE_ENABLED)
+    if config.CACHE_BACKEND == 'sqlite':
+        return SQLiteCache(config.CACHE_SQLITE_PATH, config.CACHE_MAX_ENTRIES,
+                           config.CACHE_TTL, config.CACHE_ENABLED)
+    raise ValueError(f"Unknown CACHE_BACKEND '{config.CACHE_BACKEND}' (expected memory or sqlite)")
+
+
+# Create a global instance
+cache = create_cache()
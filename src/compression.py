@@ -0,0 +1,174 @@
+"""
+Negotiated response compression: gzip, plus brotli when the ``brotli``
+package is installed.
+
+Responses of a compressible type (HTML, JSON, NDJSON, CSV, ...) are
+compressed if the request's ``Accept-Encoding`` allows it:
+
+- buffered bodies once they reach ``COMPRESSION_MIN_SIZE`` bytes;
+- streamed bodies, such as the ``/clients?stream=`` exports, chunk by chunk
+  through an incremental compressor, so a large export is never held in
+  memory.
+
+Server-Sent Events are never compressed, because the compressor would hold
+events back.
+
+A compressed response gets ``Vary: Accept-Encoding``. Its strong ETag is
+made weak, since its bytes differ from the uncompressed representation.
+``If-None-Match`` uses the weak comparison, so revalidation still answers
+304.
+"""
+import zlib
+from typing import Iterable, Iterator, Optional, Union
+
+from flask import request
+from werkzeug.http import parse_accept_header
+
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is understood by every client
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'application/xml', 'image/svg+xml'
+}
+NEVER_COMPRESS = {'text/event-stream'}
+SKIP_STATUS = {204, 206, 304}
+
+
+def available_encodings() -> list:
+    """Encodings this process can produce, most preferred first"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """The best encoding the client accepts ('br' or 'gzip'), or None"""
+    if not accept_encoding:
+        return None
+    accepted = parse_accept_header(accept_encoding)
+    best, best_quality = None, 0.0
+    for encoding in available_encodings():
+        quality = accepted.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(mimetype: Optional[str]) -> bool:
+    mimetype = (mimetype or '').split(';')[0].strip().lower()
+    if mimetype in NEVER_COMPRESS:
+        return False
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+
+def choose_encoding(method: str, status: int, mimetype: Optional[str],
+                    accept_encoding: Optional[str]) -> Optional[str]:
+    """The encoding to compress a response with, or None to send it as is"""
+    if not Config.COMPRESSION_ENABLED or method == 'HEAD':
+        return None
+    if status < 200 or status in SKIP_STATUS or not is_compressible(mimetype):
+        return None
+    return negotiate(accept_encoding)
+
+
+def weak_etag(etag: Optional[str]) -> Optional[str]:
+    if etag and not etag.startswith('W/'):
+        return 'W/' + etag
+    return etag
+
+
+class StreamCompressor:
+    """Incremental gzip or brotli compressor for one response body"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=Config.COMPRESSION_BROTLI_QUALITY)
+        else:
+            # wbits 31: deflate with a gzip header and trailer
+            self._compressor = zlib.compressobj(Config.COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        """Emit everything compressed so far, keeping the stream open"""
+        if self.encoding == 'br':
+            return self._compressor.flush()
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress a whole body"""
+    compressor = StreamCompressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_stream(chunks: Iterable[Union[bytes, str]], encoding: str) -> Iterator[bytes]:
+    """Compress a streamed body chunk by chunk.
+
+    The compressor is flushed every ``COMPRESSION_STREAM_FLUSH`` input bytes, so
+    a client reading the stream incrementally still gets steady progress.
+    """
+    compressor = StreamCompressor(encoding)
+    pending = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            output = compressor.compress(chunk)
+            pending += len(chunk)
+            if pending >= Config.COMPRESSION_STREAM_FLUSH:
+                output += compressor.flush()
+                pending = 0
+            if output:
+                yield output
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_response(response):
+    """Compress a Flask response for the current request, if it qualifies"""
+    if 'Content-Encoding' in response.headers or response.direct_passthrough:
+        return response
+    encoding = choose_encoding(request.method, response.status_code, response.mimetype,
+                               request.headers.get('Accept-Encoding'))
+    if Config.COMPRESSION_ENABLED and is_compressible(response.mimetype):
+        response.vary.add('Accept-Encoding')
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < Config.COMPRESSION_MIN_SIZE:
+            return response
+        response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    if 'ETag' in response.headers:
+        response.headers['ETag'] = weak_etag(response.headers['ETag'])
+    return response
+
+
+def init_app(app):
+    """Compress responses after every other ``after_request`` hook has run.
+
+    Flask runs these hooks in reverse order of registration, so this must be
+    registered before the other extensions.
+    """
+    app.after_request(compress_response)
@@ -0,0 +1,169 @@
+"""
+Conditional GET (ETag / Last-Modified) for the read endpoints.
+
+The validators come from the ``table_versions`` stamps, which statement
+triggers bump on every write (see database/schema.sql), not from the
+response body. A request whose ``If-None-Match`` / ``If-Modified-Since``
+still matches is answered ``304 Not Modified`` before the view runs, so no
+rows are fetched or rendered. Reading the stamps is one small query; the
+result stays in the read-through cache for ``CONDITIONAL_GET_VERSION_TTL``
+seconds and is dropped by every write request this worker serves.
+
+The bodies behind those ETags are cached under keys that carry the same
+stamps (``versioned_key``). A body cached before a write, by this worker or
+another one, is then never served under the ETag of a later version, where
+a client would keep it until the next write.
+
+Health payloads have no table behind them. They get weak ETags over the
+payload minus the timing fields, so the ETag changes when a status or error
+does and a polling page is answered 304 in between.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime
+from functools import wraps
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from flask import Response, g, has_request_context, jsonify, make_response, request, session
+from werkzeug.http import http_date, is_resource_modified, quote_etag
+
+from cache import cache, TABLE_VERSIONS_KEY
+from config import Config
+from db import get_backend
+
+logger = logging.getLogger(__name__)
+
+# Timing fields left out of health ETags
+VOLATILE_FIELDS = frozenset({'timestamp', 'checked_at', 'age_seconds', 'latency', 'latency_ms', 'uptime'})
+
+Validators = Tuple[str, Optional[datetime]]
+
+
+def load_table_versions() -> Dict[str, Dict[str, Any]]:
+    return {row['table_name']: row for row in get_backend().table_versions()}
+
+
+def table_versions() -> Dict[str, Dict[str, Any]]:
+    """``{table_name: {version, updated_at}}``, cached briefly"""
+    return cache.get_or_load(TABLE_VERSIONS_KEY, load_table_versions, ttl=Config.CONDITIONAL_GET_VERSION_TTL)
+
+
+def stamped_key(key: str, versions: Optional[Dict[str, Dict[str, Any]]], tables: Iterable[str]) -> str:
+    """``key`` qualified with the versions of ``tables``; as is when they are not stamped"""
+    tables = tuple(tables)
+    if not versions or not all(table in versions for table in tables):
+        return key
+    return f"{key}@{'.'.join(str(versions[table].get('version', 0)) for table in tables)}"
+
+
+def versioned_key(key: str, *tables: str) -> str:
+    """Cache key for the current request, stamped with the versions its validators came from"""
+    versions = g.get('table_versions') if has_request_context() else None
+    return stamped_key(key, versions, tables)
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def validators(versions: Dict[str, Dict[str, Any]], tables: Iterable[str], *parts: Any) -> Validators:
+    """ETag and Last-Modified of a representation built from ``tables``.
+
+    ``parts`` tell representations of the same tables apart (path, query
+    arguments, Accept header).
+    """
+    tables = tuple(tables)
+    stamp = [(table, versions.get(table, {}).get('version', 0)) for table in tables]
+    etag = hashlib.sha1(repr((Config.APP_VERSION, stamp, parts)).encode()).hexdigest()
+    modified = [_parse_timestamp(versions[table].get('updated_at')) for table in tables if table in versions]
+    return etag, max(filter(None, modified), default=None)
+
+
+def payload_etag(payload: Any) -> str:
+    """Weak-ETag value of a JSON payload without its ``VOLATILE_FIELDS``"""
+    def stable(value):
+        if isinstance(value, dict):
+            return {k: stable(v) for k, v in value.items() if k not in VOLATILE_FIELDS}
+        if isinstance(value, list):
+            return [stable(v) for v in value]
+        return value
+    return hashlib.sha1(json.dumps(stable(payload), sort_keys=True, default=str).encode()).hexdigest()
+
+
+def not_modified(environ: Dict[str, Any], etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Whether a GET with this WSGI ``environ`` can be answered with 304"""
+    return not is_resource_modified(environ, etag=etag, last_modified=last_modified)
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None, weak: bool = False) -> Dict[str, str]:
+    headers = {'ETag': quote_etag(etag, weak), 'Cache-Control': 'private, no-cache'}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+
+def conditional(*tables: str, daily: bool = False):
+    """Give a GET view version-stamp validators and answer matching requests with 304.
+
+    ``daily`` adds the UTC date to the ETag, for views relative to today.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # A pending flash message must reach the page, so never 304 over one
+            if not Config.CONDITIONAL_GET_ENABLED or session.get('_flashes'):
+                return view(*args, **kwargs)
+            try:
+                versions = table_versions()
+                etag, last_modified = validators(
+                    versions, tables, request.path, sorted(request.args.to_dict().items()),
+                    request.headers.get('Accept'), datetime.utcnow().date().isoformat() if daily else None
+                )
+            except Exception as e:
+                logger.warning(f"Table versions unavailable, serving {request.path} unconditionally: {e}")
+                return view(*args, **kwargs)
+            g.table_versions = versions
+
+            if not_modified(request.environ, etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.headers.update(validator_headers(etag, last_modified))
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_json(payload: Any, status_code: int = 200) -> Response:
+    """``jsonify(payload)`` with a weak ETag, or 304 if the client holds an equivalent payload"""
+    if status_code != 200 or not Config.CONDITIONAL_GET_ENABLED:
+        return make_response(jsonify(payload), status_code)
+    etag = payload_etag(payload)
+    response = Response(status=304) if not_modified(request.environ, etag) else jsonify(payload)
+    response.headers.update(validator_headers(etag, weak=True))
+    return response
+
+
+# Endpoints that take a POST body but never write
+_read_only_endpoints = set()
+
+
+def read_only(view):
+    """Mark a non-GET view that writes nothing, so it keeps the cached table versions"""
+    _read_only_endpoints.add(view.__name__)
+    return view
+
+
+def init_app(app):
+    """Drop the cached table versions after every write request"""
+    @app.after_request
+    def forget_table_versions(response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and request.endpoint not in _read_only_endpoints:
+            cache.delete(TABLE_VERSIONS_KEY)
+        return response
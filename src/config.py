@@ -1,6 +1,8 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 from supabase import create_client, Client
+from http_transport import TransportSettings, install_pooled_transport
 
 # Load environment variables
 load_dotenv()
@@ -15,12 +17,185 @@ class Config:
     SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here')
     DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
     
+    # CORS
+    CORS_ORIGINS = [
+        "https://lokiplus.netlify.app",
+        "http://localhost:5173",
+        "http://localhost:4173",
+        "http://localhost:5000",
+        "http://127.0.0.1:5000"
+    ]
+    
+    # Serving mode: 'wsgi' (gunicorn sync workers) or 'asgi' (uvicorn workers, see asgi.py)
+    SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+    
+    # Supabase HTTP transport (per-worker connection pool)
+    SUPABASE_TIMEOUT = float(os.getenv('SUPABASE_TIMEOUT', '5'))  # read timeout, seconds
+    SUPABASE_CONNECT_TIMEOUT = float(os.getenv('SUPABASE_CONNECT_TIMEOUT', '5'))
+    SUPABASE_POOL_TIMEOUT = float(os.getenv('SUPABASE_POOL_TIMEOUT', '5'))  # wait for a free connection
+    SUPABASE_POOL_SIZE = int(os.getenv('SUPABASE_POOL_SIZE', '20'))
+    SUPABASE_POOL_KEEPALIVE = int(os.getenv('SUPABASE_POOL_KEEPALIVE', '10'))
+    SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv('SUPABASE_KEEPALIVE_EXPIRY', '30'))
+    SUPABASE_HTTP2 = os.getenv('SUPABASE_HTTP2', 'False').lower() == 'true'  # needs the h2 package
+    SUPABASE_CONNECT_RETRIES = int(os.getenv('SUPABASE_CONNECT_RETRIES', '1'))
+    # Per-request call tracing (Server-Timing header) and the slow-query log, see tracing.py
+    SUPABASE_TRACE = os.getenv('SUPABASE_TRACE', 'False').lower() == 'true'
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '500'))  # 0 disables the slow-query log
+    # Prometheus metrics (metrics.py); off leaves the Supabase transport unobserved
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+
+    # Read backend: 'postgrest' (Supabase REST API) or 'postgres' (direct connections, see db.py)
+    DATABASE_BACKEND = os.getenv('DATABASE_BACKEND', 'postgrest')
+    # Direct Postgres connection: DATABASE_URL, or the individual DB_* settings
+    DATABASE_URL = os.getenv('DATABASE_URL')
+    DB_HOST = os.getenv('DB_HOST')
+    DB_PORT = int(os.getenv('DB_PORT', '5432'))
+    DB_NAME = os.getenv('DB_NAME', 'postgres')
+    DB_USER = os.getenv('DB_USER', 'postgres')
+    DB_PASSWORD = os.getenv('DB_PASSWORD', '')
+    DB_SSLMODE = os.getenv('DB_SSLMODE', 'prefer')
+    DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '5'))  # seconds
+    # Per-worker pool: DB_POOL_MIN connections opened up front, up to DB_POOL_MAX in use and kept open between requests
+    DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '2'))
+    DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))  # wait for a free connection
+    DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '1800'))  # recycle after, seconds
+    DB_POOL_VALIDATE_AFTER = float(os.getenv('DB_POOL_VALIDATE_AFTER', '30'))  # ping if idle longer
+
+    @classmethod
+    def get_db_connection_string(cls) -> str:
+        """Get the libpq connection string for direct Postgres access"""
+        if cls.DATABASE_URL:
+            return cls.DATABASE_URL
+        if not cls.DB_HOST:
+            raise ValueError(
+                "Direct database access needs DATABASE_URL or DB_HOST in your .env file"
+            )
+        params = {
+            'host': cls.DB_HOST,
+            'port': cls.DB_PORT,
+            'dbname': cls.DB_NAME,
+            'user': cls.DB_USER,
+            'password': cls.DB_PASSWORD,
+            'sslmode': cls.DB_SSLMODE,
+            'connect_timeout': cls.DB_CONNECT_TIMEOUT
+        }
+        # libpq keyword/value format; quote values so passwords may contain spaces
+        return ' '.join(
+            "{}='{}'".format(key, str(value).replace('\\', '\\\\').replace("'", "\\'"))
+            for key, value in params.items()
+        )
+
     # Rate limiting
     RATELIMIT_DEFAULT = "200 per day"
-    RATELIMIT_STORAGE_URL = "memory://"
+    # Shared by all workers on the host (rate_limit_storage.py); any limits URI such as redis:// also works
+    RATELIMIT_STORAGE_URL = os.getenv(
+        'RATELIMIT_STORAGE_URL',
+        'sqlite://' + os.path.join(tempfile.gettempdir(), 'lokiplus-ratelimit.sqlite3')
+    )
+    RATELIMIT_STRATEGY = os.getenv('RATELIMIT_STRATEGY', 'sliding-window-counter')
+    RATELIMIT_SWEEP_INTERVAL = float(os.getenv('RATELIMIT_SWEEP_INTERVAL', '60'))  # seconds between expired-key sweeps
+    
+    # Business rules
+    MAX_CLIENTS_PER_ACCOUNT = 5
+    
+    # Bulk import
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '500'))
+    IMPORT_MAX_ROWS = int(os.getenv('IMPORT_MAX_ROWS', '20000'))
+    # Seconds of bcrypt an account import may spend, well below gunicorn's 120 s timeout;
+    # caps the rows per account import by the measured hash cost
+    IMPORT_HASH_BUDGET = float(os.getenv('IMPORT_HASH_BUDGET', '60'))
+    
+    # Client listing (keyset pagination on clients.id)
+    CLIENTS_PAGE_SIZE = int(os.getenv('CLIENTS_PAGE_SIZE', '100'))
+    CLIENTS_MAX_PAGE_SIZE = int(os.getenv('CLIENTS_MAX_PAGE_SIZE', '1000'))
+    ACCOUNT_CLIENTS_MAX_IDS = int(os.getenv('ACCOUNT_CLIENTS_MAX_IDS', '200'))  # per /account_clients?ids= request
+    
+    # Renewal queries (/renewals/due, /renewals/overdue, /renewals/weekly)
+    RENEWALS_DUE_DAYS = int(os.getenv('RENEWALS_DUE_DAYS', '30'))
+    RENEWALS_MAX_DAYS = int(os.getenv('RENEWALS_MAX_DAYS', '366'))
+    RENEWALS_WEEKS = int(os.getenv('RENEWALS_WEEKS', '8'))
+    RENEWALS_MAX_WEEKS = int(os.getenv('RENEWALS_MAX_WEEKS', '52'))
+    RENEW_MAX_CLIENT_IDS = int(os.getenv('RENEW_MAX_CLIENT_IDS', '10000'))  # per /renew_clients request
+    
+    # Search (/search): 'database' (pg_trgm), 'memory' (in-process index over the cached
+    # dashboard data) or 'auto' (database, falling back to memory if the query fails)
+    SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+    SEARCH_MIN_LENGTH = int(os.getenv('SEARCH_MIN_LENGTH', '3'))  # shorter queries cannot use trigrams
+    SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', '20'))
+    SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', '200'))  # cap on offset + limit
+    SEARCH_FUZZY_THRESHOLD = float(os.getenv('SEARCH_FUZZY_THRESHOLD', '0.3'))  # in-process index only
+    
+    # In-process email index (Bloom filter per table) answering definite "not taken"
+    # duplicate checks without a database trip
+    EMAIL_INDEX_ENABLED = os.getenv('EMAIL_INDEX_ENABLED', 'True').lower() == 'true'
+    EMAIL_INDEX_REFRESH = float(os.getenv('EMAIL_INDEX_REFRESH', '30'))  # seconds between stamp checks (a moved stamp reloads), 0 loads once
+    EMAIL_INDEX_ERROR_RATE = float(os.getenv('EMAIL_INDEX_ERROR_RATE', '0.01'))  # Bloom false-positive rate
+    EMAIL_INDEX_PAGE_SIZE = int(os.getenv('EMAIL_INDEX_PAGE_SIZE', '1000'))  # emails per query while loading
+    
+    # Conditional GET: ETag/Last-Modified from the table_versions stamps (database/schema.sql)
+    CONDITIONAL_GET_ENABLED = os.getenv('CONDITIONAL_GET_ENABLED', 'True').lower() == 'true'
+    # Seconds a worker reuses the table version stamps. Cached bodies are keyed by
+    # these stamps, so with CACHE_BACKEND=memory another worker's write is seen
+    # here only after up to this long (a write served by this worker, or the
+    # shared sqlite cache, drops the stamps at once).
+    CONDITIONAL_GET_VERSION_TTL = float(os.getenv('CONDITIONAL_GET_VERSION_TTL', '5'))
+    APP_VERSION = os.getenv('APP_VERSION', os.getenv('RENDER_GIT_COMMIT', ''))  # part of every ETag, so deploys invalidate them
+    
+    # Server-Sent Events change feed (/events, see events.py): 'memory' (per worker) or
+    # 'sqlite' (one log shared by all workers on the host)
+    EVENTS_BACKEND = os.getenv('EVENTS_BACKEND', 'sqlite')
+    EVENTS_SQLITE_PATH = os.getenv(
+        'EVENTS_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'lokiplus-events.sqlite3')
+    )
+    EVENTS_BUFFER = int(os.getenv('EVENTS_BUFFER', '1000'))  # events kept for Last-Event-ID replay
+    EVENTS_POLL_INTERVAL = float(os.getenv('EVENTS_POLL_INTERVAL', '0.5'))  # seconds between reads of the shared log
+    EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', '15'))  # seconds between keepalive comments
+    EVENTS_STREAM_MAX_SECONDS = float(os.getenv('EVENTS_STREAM_MAX_SECONDS', '55'))  # below gunicorn's worker timeout
+    EVENTS_RETRY_MS = int(os.getenv('EVENTS_RETRY_MS', '3000'))  # browser reconnect delay
+    
+    # JSON encoding of responses: 'stdlib' or 'orjson' (needs the orjson package, see json_provider.py)
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'stdlib')
+    # Negotiated gzip/brotli response compression (compression.py; brotli needs the brotli package)
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'True').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))  # bytes; smaller bodies are sent as is
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', '6'))  # gzip, 1-9
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))  # 0-11
+    COMPRESSION_STREAM_FLUSH = int(os.getenv('COMPRESSION_STREAM_FLUSH', '65536'))  # streamed bytes between flushes
+    
+    # Rendered dashboard rows (fragments.py): each row is re-rendered only when it changes
+    FRAGMENT_CACHE_ENABLED = os.getenv('FRAGMENT_CACHE_ENABLED', 'True').lower() == 'true'
+    FRAGMENT_CACHE_MAX_ROWS = int(os.getenv('FRAGMENT_CACHE_MAX_ROWS', '250000'))  # per worker, all tables together
+    
+    # Read-through cache for accounts/clients
+    CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'True').lower() == 'true'
+    CACHE_TTL = float(os.getenv('CACHE_TTL', '60'))  # seconds
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+    # 'memory' (per worker) or 'sqlite' (one file shared by all workers on the host)
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+    CACHE_SQLITE_PATH = os.getenv(
+        'CACHE_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'lokiplus-cache.sqlite3')
+    )
+    # How often a worker writes its sqlite cache counters and read times to the file
+    CACHE_SQLITE_FLUSH_INTERVAL = float(os.getenv('CACHE_SQLITE_FLUSH_INTERVAL', '5'))  # seconds
+    
+    # Password hashing (bcrypt, see password_hasher.py; pool size 0 hashes batches inline)
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+    BCRYPT_POOL_SIZE = int(os.getenv('BCRYPT_POOL_SIZE', '2'))  # threads per worker for bulk imports
+    BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', '8'))  # hashes at once on the host, all workers
+    BCRYPT_SLOTS_DIR = os.getenv('BCRYPT_SLOTS_DIR', os.path.join(tempfile.gettempdir(), 'lokiplus-bcrypt'))
+    BCRYPT_RETRY_AFTER = int(os.getenv('BCRYPT_RETRY_AFTER', '5'))  # seconds
     
     # Health check configuration
     HEALTH_CHECK_CACHE_TIMEOUT = 300  # 5 minutes
+    # Background prober (per worker); the health endpoints answer from its last result
+    HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', '10'))  # seconds, 0 probes per request
+    HEALTH_PROBE_JITTER = float(os.getenv('HEALTH_PROBE_JITTER', '0.2'))  # +/- fraction of the interval
+    HEALTH_STALE_AFTER = float(os.getenv('HEALTH_STALE_AFTER', '0'))  # 'degraded' after; 0 means 3 intervals
+    
+    # Per-route latency histograms (route_manager.py): rolling windows and their slot size, seconds
+    ROUTE_LATENCY_WINDOWS = [float(w) for w in os.getenv('ROUTE_LATENCY_WINDOWS', '60,300,900').split(',')]
+    ROUTE_LATENCY_SLOT = float(os.getenv('ROUTE_LATENCY_SLOT', '5'))
     
     # Logging configuration
     LOG_LEVEL = 'INFO'
@@ -33,6 +208,9 @@ supabase: Client = create_client(
     Config.SUPABASE_KEY
 )
 
+# Keep-alive connection pool, created lazily in each worker process
+install_pooled_transport(supabase, TransportSettings.from_config(Config))
+
 # Validate configuration
 if not all([Config.SUPABASE_URL, Config.SUPABASE_KEY]):
     raise ValueError(
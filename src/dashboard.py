@@ -0,0 +1,91 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from conditional_get import load_table_versions, table_versions
+from db import PostgrestBackend, get_backend
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_TABLES = ('accounts', 'clients', 'account_clients')
+
+
+class DashboardData(NamedTuple):
+    """The dashboard rows and the data version they were read at"""
+    accounts: List[Dict[str, Any]]
+    clients: List[Dict[str, Any]]
+    version: Optional[Tuple] = None  # None when unknown
+
+def format_timestamp(value: Optional[str]) -> Optional[str]:
+    """Format an ISO timestamp from Supabase for display"""
+    if not value:
+        return value
+    try:
+        created_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return created_at.strftime('%Y-%m-%d %H:%M:%S')
+    except Exception as e:
+        logger.warning(f"Error formatting date: {e}")
+        return value
+
+
+def _embedded_count(relation: Any) -> int:
+    """Extract the count from an embedded ``account_clients(count)`` result"""
+    if isinstance(relation, list) and relation:
+        return relation[0].get('count') or 0
+    if isinstance(relation, dict):
+        return relation.get('count') or 0
+    return 0
+
+
+def load_dashboard_data(client=None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Load accounts (with client counts) and clients for the dashboard.
+
+    Always costs two round trips regardless of the number of accounts: each
+    account row carries ``account_clients: [{"count": N}]``, so no
+    per-account count query is needed. Reads go through the configured
+    backend unless a Supabase ``client`` is passed in. Errors are propagated
+    so callers can tell connection failures apart.
+    """
+    backend = PostgrestBackend(client) if client is not None else get_backend()
+
+    accounts = backend.accounts_with_client_counts()
+    clients = backend.clients()
+
+    for account in accounts:
+        account['client_count'] = _embedded_count(account.pop('account_clients', None))
+
+    return accounts, clients
+
+
+def _version(versions: Dict[str, Dict[str, Any]]) -> Optional[Tuple]:
+    if not all(table in versions for table in DASHBOARD_TABLES):
+        return None  # not stamped (yet): no writes would ever change the version
+    return tuple(versions[table]['version'] for table in DASHBOARD_TABLES)
+
+
+def load_dashboard() -> DashboardData:
+    """Load the dashboard rows together with their data version.
+
+    The version comes from the ``table_versions`` stamps: the (briefly cached)
+    stamps are older than the rows, and a fresh read after the rows must
+    still match them. If a write landed in between, or the stamps cannot be
+    read, the version is unknown and the rendered tables are not reused
+    (see fragments.py). Timestamps are left as stored; they are formatted
+    when a row is rendered.
+    """
+    try:
+        before = _version(table_versions())
+    except Exception as e:
+        logger.warning(f"Could not read table versions: {e}")
+        before = None
+
+    accounts, clients = load_dashboard_data()
+
+    version = None
+    if before is not None:
+        try:
+            if _version(load_table_versions()) == before:
+                version = before
+        except Exception as e:
+            logger.warning(f"Could not read table versions: {e}")
+    return DashboardData(accounts, clients, version)
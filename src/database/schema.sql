@@ -59,4 +59,326 @@ CREATE TRIGGER update_accounts_updated_at
 CREATE TRIGGER update_clients_updated_at
     BEFORE UPDATE ON clients
     FOR EACH ROW
-    EXECUTE FUNCTION update_updated_at_column(); 
\ No newline at end of file
+    EXECUTE FUNCTION update_updated_at_column(); 
+-- Columns used by the application (clients are created without a password)
+ALTER TABLE clients ADD COLUMN IF NOT EXISTS name TEXT;
+ALTER TABLE clients ALTER COLUMN password DROP NOT NULL;
+
+-- Link a client to an account in one transaction.
+-- The account row is locked first, so concurrent links to the same account
+-- are serialized and the client limit cannot be exceeded.
+CREATE OR REPLACE FUNCTION link_client_to_account(
+    p_account_id BIGINT,
+    p_client_id BIGINT,
+    p_max_clients INTEGER DEFAULT 5
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    PERFORM 1 FROM accounts WHERE id = p_account_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('success', false, 'code', 'account_not_found',
+                                  'error', 'Account not found');
+    END IF;
+
+    PERFORM 1 FROM clients WHERE id = p_client_id;
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('success', false, 'code', 'client_not_found',
+                                  'error', 'Client not found');
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM account_clients
+               WHERE account_id = p_account_id AND client_id = p_client_id) THEN
+        RETURN jsonb_build_object('success', false, 'code', 'already_linked',
+                                  'error', 'Client is already linked to this account');
+    END IF;
+
+    SELECT COUNT(*) INTO v_count FROM account_clients WHERE account_id = p_account_id;
+    IF v_count >= p_max_clients THEN
+        RETURN jsonb_build_object('success', false, 'code', 'limit_reached',
+                                  'error', format('Account already has maximum number of clients (%s)', p_max_clients));
+    END IF;
+
+    INSERT INTO account_clients (account_id, client_id) VALUES (p_account_id, p_client_id);
+    RETURN jsonb_build_object('success', true);
+END;
+$$ language 'plpgsql';
+
+-- Create a client and link it to an account in one transaction
+-- (replaces insert + link + compensating delete).
+CREATE OR REPLACE FUNCTION create_client_for_account(
+    p_account_id BIGINT,
+    p_name TEXT,
+    p_email TEXT,
+    p_renewal_date DATE,
+    p_max_clients INTEGER DEFAULT 5
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_count INTEGER;
+    v_client_id BIGINT;
+BEGIN
+    PERFORM 1 FROM accounts WHERE id = p_account_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('success', false, 'code', 'account_not_found',
+                                  'error', 'Account not found');
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM clients WHERE email = p_email) THEN
+        RETURN jsonb_build_object('success', false, 'code', 'duplicate_email',
+                                  'error', 'A client with this email already exists');
+    END IF;
+
+    SELECT COUNT(*) INTO v_count FROM account_clients WHERE account_id = p_account_id;
+    IF v_count >= p_max_clients THEN
+        RETURN jsonb_build_object('success', false, 'code', 'limit_reached',
+                                  'error', format('Account already has maximum number of clients (%s)', p_max_clients));
+    END IF;
+
+    INSERT INTO clients (name, email, renewal_date, status)
+    VALUES (p_name, p_email, p_renewal_date, 'active')
+    RETURNING id INTO v_client_id;
+
+    INSERT INTO account_clients (account_id, client_id) VALUES (p_account_id, v_client_id);
+    RETURN jsonb_build_object('success', true, 'client_id', v_client_id);
+EXCEPTION
+    WHEN unique_violation THEN
+        RETURN jsonb_build_object('success', false, 'code', 'duplicate_email',
+                                  'error', 'A client with this email already exists');
+END;
+$$ language 'plpgsql';
+
+-- Link many clients at once (bulk client import). p_links is a JSON array of
+-- {"account_id", "client_id"}. Every affected account is locked once, in id
+-- order, so concurrent imports and links cannot exceed the limit or deadlock.
+-- Each account then takes its links in input order up to its remaining
+-- capacity, all inserted by one statement. The client ids left unlinked are
+-- reported back: over the limit (rejected_ids) or of a missing account
+-- (not_found_ids).
+CREATE OR REPLACE FUNCTION link_clients_to_accounts(
+    p_links JSONB,
+    p_max_clients INTEGER DEFAULT 5
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_linked BIGINT[];
+BEGIN
+    PERFORM 1 FROM accounts
+    WHERE id IN (SELECT (link->>'account_id')::BIGINT FROM jsonb_array_elements(p_links) AS link)
+    ORDER BY id
+    FOR UPDATE;
+
+    WITH requested AS (
+        SELECT (link->>'account_id')::BIGINT AS account_id, (link->>'client_id')::BIGINT AS client_id, position
+        FROM jsonb_array_elements(p_links) WITH ORDINALITY AS t(link, position)
+    ), ranked AS (
+        SELECT r.account_id, r.client_id,
+               row_number() OVER (PARTITION BY r.account_id ORDER BY r.position) AS n,
+               p_max_clients - (SELECT COUNT(*) FROM account_clients ac WHERE ac.account_id = a.id) AS remaining
+        FROM requested r
+        JOIN accounts a ON a.id = r.account_id
+    ), inserted AS (
+        INSERT INTO account_clients (account_id, client_id)
+        SELECT account_id, client_id FROM ranked WHERE n <= remaining
+        RETURNING client_id
+    )
+    SELECT COALESCE(array_agg(client_id ORDER BY client_id), '{}') INTO v_linked FROM inserted;
+
+    RETURN jsonb_build_object(
+        'linked_ids', to_jsonb(v_linked),
+        'rejected_ids', (SELECT COALESCE(jsonb_agg(client_id ORDER BY client_id), '[]'::jsonb)
+                         FROM jsonb_to_recordset(p_links) AS r(account_id BIGINT, client_id BIGINT)
+                         WHERE client_id <> ALL(v_linked)
+                           AND EXISTS (SELECT 1 FROM accounts WHERE id = r.account_id)),
+        'not_found_ids', (SELECT COALESCE(jsonb_agg(client_id ORDER BY client_id), '[]'::jsonb)
+                          FROM jsonb_to_recordset(p_links) AS r(account_id BIGINT, client_id BIGINT)
+                          WHERE NOT EXISTS (SELECT 1 FROM accounts WHERE id = r.account_id))
+    );
+END;
+$$ language 'plpgsql';
+
+-- Renewal queries (/renewals/*) filter on status and walk renewal_date in
+-- order, paging with a (renewal_date, id) keyset cursor.
+CREATE INDEX IF NOT EXISTS idx_clients_status_renewal_date ON clients(status, renewal_date, id);
+-- Lookups by status alone are served by the composite index
+DROP INDEX IF EXISTS idx_clients_status;
+
+-- One page of clients of a status whose renewal_date is in [p_from, p_before),
+-- after the (p_after_date, p_after_id) cursor. NULL bounds are open.
+CREATE OR REPLACE FUNCTION clients_by_renewal(
+    p_status TEXT,
+    p_from DATE,
+    p_before DATE,
+    p_after_date DATE DEFAULT NULL,
+    p_after_id BIGINT DEFAULT NULL,
+    p_limit INTEGER DEFAULT 100
+)
+RETURNS SETOF clients AS $$
+    SELECT * FROM clients
+    WHERE status = p_status
+      AND renewal_date >= COALESCE(p_from, '-infinity'::date)
+      AND renewal_date < COALESCE(p_before, 'infinity'::date)
+      AND (renewal_date, id) > (COALESCE(p_after_date, '-infinity'::date), COALESCE(p_after_id, 0))
+    ORDER BY renewal_date, id
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Clients of a status renewing in each of p_weeks weeks starting at p_from.
+-- Weeks without renewals are omitted.
+CREATE OR REPLACE FUNCTION renewal_week_counts(
+    p_status TEXT,
+    p_from DATE,
+    p_weeks INTEGER
+)
+RETURNS TABLE (week_start DATE, client_count BIGINT) AS $$
+    SELECT p_from + 7 * ((renewal_date - p_from) / 7), COUNT(*)
+    FROM clients
+    WHERE status = p_status
+      AND renewal_date >= p_from
+      AND renewal_date < p_from + 7 * p_weeks
+    GROUP BY 1
+    ORDER BY 1;
+$$ LANGUAGE sql STABLE;
+
+-- Renew many clients with one set-based UPDATE: either the ids in
+-- p_client_ids, or every p_status client due before p_due_before. Each gets
+-- p_renewal_date, or its current renewal_date (today if unset) pushed out by
+-- p_extend_months. Requested ids that matched no client are reported back.
+CREATE OR REPLACE FUNCTION renew_clients(
+    p_client_ids BIGINT[] DEFAULT NULL,
+    p_due_before DATE DEFAULT NULL,
+    p_status TEXT DEFAULT 'active',
+    p_renewal_date DATE DEFAULT NULL,
+    p_extend_months INTEGER DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    v_updated BIGINT[];
+BEGIN
+    IF p_client_ids IS NOT NULL THEN
+        WITH updated AS (
+            UPDATE clients
+            SET renewal_date = COALESCE(
+                p_renewal_date,
+                (COALESCE(renewal_date, CURRENT_DATE) + make_interval(months => p_extend_months))::date)
+            WHERE id = ANY(p_client_ids)
+            RETURNING id
+        )
+        SELECT COALESCE(array_agg(id ORDER BY id), '{}') INTO v_updated FROM updated;
+    ELSE
+        WITH updated AS (
+            UPDATE clients
+            SET renewal_date = COALESCE(
+                p_renewal_date,
+                (renewal_date + make_interval(months => p_extend_months))::date)
+            WHERE status = p_status AND renewal_date < p_due_before
+            RETURNING id
+        )
+        SELECT COALESCE(array_agg(id ORDER BY id), '{}') INTO v_updated FROM updated;
+    END IF;
+
+    RETURN jsonb_build_object(
+        'updated', cardinality(v_updated),
+        'updated_ids', to_jsonb(v_updated),
+        'failed_ids', (SELECT COALESCE(jsonb_agg(DISTINCT requested ORDER BY requested), '[]'::jsonb)
+                       FROM unnest(COALESCE(p_client_ids, '{}')) AS requested
+                       WHERE requested <> ALL(v_updated))
+    );
+END;
+$$ language 'plpgsql';
+
+-- Search (/search): trigram indexes serve both prefix (LIKE 'q%') and fuzzy
+-- (word similarity) matches on client name/email and account email.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_clients_name_trgm ON clients USING gin (lower(name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_clients_email_trgm ON clients USING gin (lower(email) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_accounts_email_trgm ON accounts USING gin (lower(email) gin_trgm_ops);
+
+-- One page of clients and/or accounts (p_kind: all, client, account) matching
+-- p_query. Prefix mode matches the start of an email, a name or any word of a
+-- name; fuzzy mode ranks by pg_trgm word similarity.
+CREATE OR REPLACE FUNCTION search_directory(
+    p_query TEXT,
+    p_fuzzy BOOLEAN DEFAULT FALSE,
+    p_kind TEXT DEFAULT 'all',
+    p_limit INTEGER DEFAULT 20,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (kind TEXT, id BIGINT, name TEXT, email TEXT, score REAL) AS $$
+#variable_conflict use_column
+DECLARE
+    v_query TEXT := lower(p_query);
+    v_prefix TEXT := replace(replace(replace(lower(p_query), '\', '\\'), '%', '\%'), '_', '\_') || '%';
+BEGIN
+    IF p_fuzzy THEN
+        RETURN QUERY
+        SELECT * FROM (
+            SELECT 'client'::text, c.id, c.name, c.email,
+                   GREATEST(word_similarity(v_query, lower(c.name)), word_similarity(v_query, lower(c.email)))
+            FROM clients c
+            WHERE p_kind IN ('all', 'client')
+              AND (v_query <% lower(c.name) OR v_query <% lower(c.email))
+            UNION ALL
+            SELECT 'account'::text, a.id, NULL::text, a.email, word_similarity(v_query, lower(a.email))
+            FROM accounts a
+            WHERE p_kind IN ('all', 'account') AND v_query <% lower(a.email)
+        ) AS matches (kind, id, name, email, score)
+        ORDER BY matches.score DESC, matches.email, matches.kind, matches.id
+        LIMIT p_limit OFFSET p_offset;
+    ELSE
+        RETURN QUERY
+        SELECT * FROM (
+            SELECT 'client'::text, c.id, c.name, c.email,
+                   (CASE WHEN lower(c.email) LIKE v_prefix OR lower(c.name) LIKE v_prefix
+                         THEN 1.0 ELSE 0.5 END)::real
+            FROM clients c
+            WHERE p_kind IN ('all', 'client')
+              AND (lower(c.email) LIKE v_prefix OR lower(c.name) LIKE v_prefix
+                   OR lower(c.name) LIKE '% ' || v_prefix)
+            UNION ALL
+            SELECT 'account'::text, a.id, NULL::text, a.email, 1.0::real
+            FROM accounts a
+            WHERE p_kind IN ('all', 'account') AND lower(a.email) LIKE v_prefix
+        ) AS matches (kind, id, name, email, score)
+        ORDER BY matches.score DESC, matches.email, matches.kind, matches.id
+        LIMIT p_limit OFFSET p_offset;
+    END IF;
+END;
+$$ language 'plpgsql' STABLE;
+
+-- Per-table version stamps for conditional GET (ETag / Last-Modified).
+-- A statement-level trigger bumps the row of the table it fires on, so the
+-- read endpoints can revalidate with one single-row-per-table query instead
+-- of fetching (and hashing) the rows they would return.
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT TIMEZONE('utc'::text, NOW()) NOT NULL
+);
+
+INSERT INTO table_versions (table_name)
+VALUES ('accounts'), ('clients'), ('account_clients')
+ON CONFLICT (table_name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_table_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, updated_at = TIMEZONE('utc'::text, NOW())
+    WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER bump_accounts_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON accounts
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+CREATE TRIGGER bump_clients_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON clients
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+CREATE TRIGGER bump_account_clients_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON account_clients
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
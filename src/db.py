@@ -1,61 +1,447 @@
-import psycopg2
-from psycopg2 import pool
 from config import Config
 import logging
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple, Any
+from datetime import date, datetime
+from decimal import Decimal
 from config import supabase
 
+try:
+    import psycopg2
+    from psycopg2 import pool
+    from psycopg2.extras import RealDictCursor
+except ImportError:  # Direct Postgres access is optional; Supabase is the default path
+    psycopg2 = None
+    pool = None
+    RealDictCursor = None
+
 logger = logging.getLogger(__name__)
 
+class PoolTimeout(Exception):
+    """Raised when no pooled database connection frees up in time"""
+
+
 class DatabasePool:
+    """Per-process pool of direct Postgres connections, safe to share between threads.
+
+    Borrow connections with ``with DatabasePool.connection() as conn:``. The
+    block is committed on success and rolled back on error; connections that
+    broke, outlived ``DB_POOL_MAX_LIFETIME`` or fail a ping after sitting idle
+    are replaced instead of being handed out again.
+    """
     _pool = None
-    
+    _pid = None
+    _lock = threading.Lock()
+    _slots = None  # one per connection, so borrowers wait instead of failing
+    # Keyed by the connection itself: an id() can be reused by a new connection
+    _created: 'weakref.WeakKeyDictionary[Any, float]' = weakref.WeakKeyDictionary()
+    _returned: 'weakref.WeakKeyDictionary[Any, float]' = weakref.WeakKeyDictionary()
+    # Pools inherited over fork: kept referenced so their sockets, which belong
+    # to the parent, are never closed (or terminated) from the child
+    _inherited: List[Any] = []
+
     @classmethod
     def get_pool(cls):
-        """Get or create a connection pool"""
-        if cls._pool is None:
+        """Get or create this process's connection pool"""
+        if pool is None:
+            raise RuntimeError("psycopg2 is not installed; direct database access is unavailable")
+        with cls._lock:
+            if cls._pool is None:
+                try:
+                    cls._pool = pool.ThreadedConnectionPool(
+                        Config.DB_POOL_MIN,
+                        Config.DB_POOL_MAX,
+                        Config.get_db_connection_string()
+                    )
+                    # DB_POOL_MIN connections are opened up front. putconn closes a
+                    # returned connection once minconn are idle, so without this a
+                    # burst above DB_POOL_MIN reconnects on every request.
+                    cls._pool.minconn = Config.DB_POOL_MAX
+                    cls._slots = threading.BoundedSemaphore(Config.DB_POOL_MAX)
+                    cls._pid = os.getpid()
+                    logger.info(f"Database connection pool created in pid {cls._pid} "
+                                f"(max {Config.DB_POOL_MAX} connections)")
+                except Exception as e:
+                    logger.error(f"Error creating connection pool: {e}")
+                    raise
+            return cls._pool
+
+    @classmethod
+    def _usable(cls, conn) -> bool:
+        """Check a connection before handing it out"""
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        created = cls._created.setdefault(conn, now)
+        if now - created > Config.DB_POOL_MAX_LIFETIME:
+            logger.info("Recycling database connection past its max lifetime")
+            return False
+        if now - cls._returned.get(conn, now) > Config.DB_POOL_VALIDATE_AFTER:
             try:
-                cls._pool = pool.SimpleConnectionPool(
-                    1,  # minconn
-                    20, # maxconn
-                    Config.get_db_connection_string()
-                )
-                logger.info("Database connection pool created successfully")
-            except Exception as e:
-                logger.error(f"Error creating connection pool: {e}")
-                raise
-        return cls._pool
-    
+                with conn.cursor() as cur:
+                    cur.execute('SELECT 1')
+                conn.rollback()
+            except psycopg2.Error as e:
+                logger.warning(f"Discarding stale database connection: {e}")
+                return False
+        return True
+
     @classmethod
-    def get_connection(cls):
-        """Get a connection from the pool"""
+    def _forget(cls, conn):
+        cls._created.pop(conn, None)
+        cls._returned.pop(conn, None)
+
+    @classmethod
+    def _discard(cls, db_pool, conn):
+        cls._forget(conn)
+        db_pool.putconn(conn, close=True)
+
+    @classmethod
+    def get_connection(cls, timeout: Optional[float] = None):
+        """Borrow a validated connection; pair with ``return_connection``"""
+        db_pool = cls.get_pool()
+        slots = cls._slots
+        timeout = Config.DB_POOL_TIMEOUT if timeout is None else timeout
+        if not slots.acquire(timeout=timeout):
+            raise PoolTimeout(f"No database connection available after {timeout}s")
         try:
-            return cls.get_pool().getconn()
+            # Every discard frees a slot in the pool, so this ends after at
+            # most one fresh connection per slot
+            for _ in range(Config.DB_POOL_MAX + 1):
+                conn = db_pool.getconn()
+                if cls._usable(conn):
+                    return conn
+                cls._discard(db_pool, conn)
+            raise PoolTimeout("Could not get a working database connection")
         except Exception as e:
+            slots.release()
             logger.error(f"Error getting connection from pool: {e}")
             raise
-    
+
     @classmethod
-    def return_connection(cls, conn):
-        """Return a connection to the pool"""
-        if conn:
-            try:
-                cls.get_pool().putconn(conn)
-            except Exception as e:
-                logger.error(f"Error returning connection to pool: {e}")
-                conn.close()
-    
+    def return_connection(cls, conn, discard: bool = False):
+        """Return a borrowed connection to the pool"""
+        if not conn:
+            return
+        db_pool, slots = cls._pool, cls._slots
+        if db_pool is None or cls._pid != os.getpid():
+            return  # Borrowed from a pool that was closed or belongs to another process
+        try:
+            if discard or conn.closed:
+                cls._discard(db_pool, conn)
+            else:
+                cls._returned[conn] = time.monotonic()
+                db_pool.putconn(conn)
+                if conn.closed:  # the pool already held as many idle connections as it keeps
+                    cls._forget(conn)
+        except Exception as e:
+            logger.error(f"Error returning connection to pool: {e}")
+            conn.close()
+        finally:
+            slots.release()
+
+    @classmethod
+    @contextmanager
+    def connection(cls, timeout: Optional[float] = None):
+        """Borrow a connection for the duration of a ``with`` block"""
+        conn = cls.get_connection(timeout)
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception as e:
+            discard = conn.closed or isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            if not discard:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+            raise
+        finally:
+            cls.return_connection(conn, discard=discard)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """Get idle/in-use connection counts for this process's pool"""
+        db_pool = cls._pool
+        idle = len(db_pool._pool) if db_pool is not None else 0
+        in_use = len(db_pool._used) if db_pool is not None else 0
+        return {
+            'pid': os.getpid(),
+            'initialized': db_pool is not None,
+            'open': idle + in_use,
+            'idle': idle,
+            'in_use': in_use,
+            'min_connections': Config.DB_POOL_MIN,
+            'max_connections': Config.DB_POOL_MAX,
+            'max_lifetime': Config.DB_POOL_MAX_LIFETIME
+        }
+
     @classmethod
     def close_pool(cls):
         """Close all connections in the pool"""
-        if cls._pool:
-            try:
-                cls._pool.closeall()
-                cls._pool = None
-                logger.info("Database connection pool closed")
-            except Exception as e:
-                logger.error(f"Error closing connection pool: {e}")
+        with cls._lock:
+            if cls._pool:
+                try:
+                    cls._pool.closeall()
+                    logger.info("Database connection pool closed")
+                except Exception as e:
+                    logger.error(f"Error closing connection pool: {e}")
+                finally:
+                    cls._pool = None
+                    cls._created.clear()
+                    cls._returned.clear()
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        if cls._pool is not None:
+            cls._inherited.append(cls._pool)
+        cls._pool = None
+        cls._pid = None
+        cls._slots = None
+        cls._created = weakref.WeakKeyDictionary()
+        cls._returned = weakref.WeakKeyDictionary()
+        cls._lock = threading.Lock()
+
+
+# gunicorn preload_app forks after import: each worker opens its own connections
+os.register_at_fork(after_in_child=DatabasePool._after_fork_in_child)
+
+
+def _jsonable(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a database row like the PostgREST JSON the routes are written against"""
+    for key, value in row.items():
+        if isinstance(value, (datetime, date)):
+            row[key] = value.isoformat()
+        elif isinstance(value, Decimal):
+            row[key] = float(value)
+    return row
+
+
+# Accounts with their linked clients embedded, in one PostgREST request.
+# A requested account that does not exist is simply absent from the result.
+ACCOUNT_CLIENTS_EMBED = 'id, account_clients(clients(id, name, email, renewal_date))'
+TABLE_VERSIONS_COLUMNS = 'table_name, version, updated_at'
+
+
+def clients_by_account(accounts: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+    """Flatten ``ACCOUNT_CLIENTS_EMBED`` rows into ``{account_id: [client, ...]}``"""
+    return {
+        account['id']: sorted(
+            (relation['clients'] for relation in account.get('account_clients') or []
+             if relation.get('clients')),
+            key=lambda client: client['id']
+        )
+        for account in accounts
+    }
+
+
+class PostgrestBackend:
+    """Reads through the Supabase REST API (one HTTP request per query)"""
+    name = 'postgrest'
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client or supabase
+
+    def ping(self):
+        """Cheapest query that proves the API and database answer"""
+        self.client.table('accounts').select('id').limit(1).execute()
+
+    def accounts_with_client_counts(self) -> List[Dict[str, Any]]:
+        """Accounts with ``account_clients: [{"count": N}]`` embedded"""
+        return self.client.table('accounts').select('*, account_clients(count)').execute().data
+
+    def clients(self) -> List[Dict[str, Any]]:
+        return self.client.table('clients').select('*').execute().data
+
+    def clients_page(self, after_id: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        query = self.client.table('clients').select('*').order('id').limit(limit)
+        if after_id is not None:
+            query = query.gt('id', after_id)
+        return query.execute().data
+
+    def client_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        result = self.client.table('clients').select('*').eq('email', email).execute()
+        return result.data[0] if result.data else None
+
+    def table_versions(self) -> List[Dict[str, Any]]:
+        """Per-table version stamps bumped by the triggers in database/schema.sql"""
+        return self.client.table('table_versions').select(TABLE_VERSIONS_COLUMNS).execute().data
+
+    def emails_page(self, table: str, after_id: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        """``id`` and ``email`` of accounts or clients, in id order"""
+        query = self.client.table(table).select('id, email').order('id').limit(limit)
+        if after_id is not None:
+            query = query.gt('id', after_id)
+        return query.execute().data
+
+    def account_clients(self, account_id: int) -> Optional[List[Dict[str, Any]]]:
+        """Clients linked to an account, or None if the account does not exist"""
+        return self.clients_for_accounts([account_id]).get(account_id)
+
+    def clients_for_accounts(self, account_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Clients of each existing account in ``account_ids``, from one embedded query"""
+        accounts = self.client.table('accounts').select(
+            ACCOUNT_CLIENTS_EMBED
+        ).in_('id', list(account_ids)).execute().data
+        return clients_by_account(accounts)
+
+    def clients_by_renewal(self, status: str, start: Optional[date], before: Optional[date],
+                           after: Optional[Tuple[date, int]], limit: int) -> List[Dict[str, Any]]:
+        """Clients with ``start <= renewal_date < before`` ordered by (renewal_date, id), after the cursor"""
+        # postgrest-py cannot express the composite keyset filter, so this is a SQL function
+        return self.client.rpc('clients_by_renewal', {
+            'p_status': status,
+            'p_from': start.isoformat() if start else None,
+            'p_before': before.isoformat() if before else None,
+            'p_after_date': after[0].isoformat() if after else None,
+            'p_after_id': after[1] if after else None,
+            'p_limit': limit
+        }).execute().data
+
+    def renewal_week_counts(self, status: str, start: date, weeks: int) -> List[Dict[str, Any]]:
+        """``{'week_start', 'client_count'}`` for each week from ``start`` with any renewals"""
+        return self.client.rpc('renewal_week_counts', {
+            'p_status': status, 'p_from': start.isoformat(), 'p_weeks': weeks
+        }).execute().data
+
+    def search(self, query: str, fuzzy: bool, kind: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+        """``{'kind', 'id', 'name', 'email', 'score'}`` matches, best first (pg_trgm indexes)"""
+        return self.client.rpc('search_directory', {
+            'p_query': query, 'p_fuzzy': fuzzy, 'p_kind': kind, 'p_limit': limit, 'p_offset': offset
+        }).execute().data
+
+
+class PostgresBackend:
+    """Reads over pooled direct Postgres connections, skipping the HTTP hop"""
+    name = 'postgres'
+
+    def _fetch(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        with DatabasePool.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(sql, params)
+                return [_jsonable(dict(row)) for row in cur.fetchall()]
+
+    def ping(self):
+        self._fetch("SELECT 1 AS ok")
+
+    def accounts_with_client_counts(self) -> List[Dict[str, Any]]:
+        """Accounts with ``account_clients: [{"count": N}]`` embedded"""
+        accounts = self._fetch(
+            "SELECT a.*, (SELECT COUNT(*) FROM account_clients ac WHERE ac.account_id = a.id) "
+            "AS client_count FROM accounts a ORDER BY a.id"
+        )
+        for account in accounts:
+            account['account_clients'] = [{'count': account.pop('client_count')}]
+        return accounts
+
+    def clients(self) -> List[Dict[str, Any]]:
+        return self._fetch("SELECT * FROM clients ORDER BY id")
+
+    def clients_page(self, after_id: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        if after_id is None:
+            return self._fetch("SELECT * FROM clients ORDER BY id LIMIT %s", (limit,))
+        return self._fetch("SELECT * FROM clients WHERE id > %s ORDER BY id LIMIT %s", (after_id, limit))
+
+    def client_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        rows = self._fetch("SELECT * FROM clients WHERE email = %s LIMIT 1", (email,))
+        return rows[0] if rows else None
+
+    def table_versions(self) -> List[Dict[str, Any]]:
+        """Per-table version stamps bumped by the triggers in database/schema.sql"""
+        return self._fetch(f"SELECT {TABLE_VERSIONS_COLUMNS} FROM table_versions")
+
+    def emails_page(self, table: str, after_id: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        """``id`` and ``email`` of accounts or clients, in id order"""
+        if table not in ('accounts', 'clients'):
+            raise ValueError(f'No email column in {table}')
+        return self._fetch(
+            f"SELECT id, email FROM {table} WHERE id > %s ORDER BY id LIMIT %s",
+            (after_id if after_id is not None else 0, limit)
+        )
+
+    def account_clients(self, account_id: int) -> Optional[List[Dict[str, Any]]]:
+        """Clients linked to an account, or None if the account does not exist"""
+        return self.clients_for_accounts([account_id]).get(account_id)
+
+    def clients_for_accounts(self, account_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Clients of each existing account in ``account_ids``, from one query"""
+        # The account rows are kept even when they have no clients
+        rows = self._fetch(
+            "SELECT a.id AS account_id, c.id, c.name, c.email, c.renewal_date FROM accounts a "
+            "LEFT JOIN account_clients ac ON ac.account_id = a.id "
+            "LEFT JOIN clients c ON c.id = ac.client_id "
+            "WHERE a.id = ANY(%s) ORDER BY a.id, c.id",
+            (list(account_ids),)
+        )
+        result: Dict[int, List[Dict[str, Any]]] = {}
+        for row in rows:
+            clients = result.setdefault(row.pop('account_id'), [])
+            if row['id'] is not None:
+                clients.append(row)
+        return result
+
+    def clients_by_renewal(self, status: str, start: Optional[date], before: Optional[date],
+                           after: Optional[Tuple[date, int]], limit: int) -> List[Dict[str, Any]]:
+        """Clients with ``start <= renewal_date < before`` ordered by (renewal_date, id), after the cursor"""
+        # Every condition is a range on idx_clients_status_renewal_date (status, renewal_date, id)
+        conditions, params = ["status = %s"], [status]
+        if start is not None:
+            conditions.append("renewal_date >= %s")
+            params.append(start)
+        else:
+            conditions.append("renewal_date IS NOT NULL")
+        if before is not None:
+            conditions.append("renewal_date < %s")
+            params.append(before)
+        if after is not None:
+            conditions.append("(renewal_date, id) > (%s, %s)")
+            params.extend(after)
+        return self._fetch(
+            f"SELECT * FROM clients WHERE {' AND '.join(conditions)} ORDER BY renewal_date, id LIMIT %s",
+            tuple(params) + (limit,)
+        )
+
+    def renewal_week_counts(self, status: str, start: date, weeks: int) -> List[Dict[str, Any]]:
+        """``{'week_start', 'client_count'}`` for each week from ``start`` with any renewals"""
+        return self._fetch(
+            "SELECT %s::date + 7 * ((renewal_date - %s::date) / 7) AS week_start, COUNT(*) AS client_count "
+            "FROM clients WHERE status = %s AND renewal_date >= %s AND renewal_date < %s::date + 7 * %s "
+            "GROUP BY 1 ORDER BY 1",
+            (start, start, status, start, start, weeks)
+        )
+
+    def search(self, query: str, fuzzy: bool, kind: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+        """``{'kind', 'id', 'name', 'email', 'score'}`` matches, best first (pg_trgm indexes)"""
+        return self._fetch("SELECT * FROM search_directory(%s, %s, %s, %s, %s)",
+                           (query, fuzzy, kind, limit, offset))
+
+
+_backends = {
+    PostgrestBackend.name: PostgrestBackend,
+    PostgresBackend.name: PostgresBackend
+}
+_backend = None
+
+
+def get_backend():
+    """Get the read backend selected by ``Config.DATABASE_BACKEND``"""
+    global _backend
+    if _backend is None or _backend.name != Config.DATABASE_BACKEND:
+        try:
+            _backend = _backends[Config.DATABASE_BACKEND]()
+        except KeyError:
+            raise ValueError(f"Unknown DATABASE_BACKEND {Config.DATABASE_BACKEND!r}, "
+                             f"expected one of {sorted(_backends)}")
+    return _backend
 
 class Database:
     @staticmethod
@@ -70,14 +456,35 @@ class Database:
 
     @staticmethod
     def get_clients() -> List[Dict[str, Any]]:
-        """Get all clients from Supabase."""
+        """Get all clients through the configured backend."""
         try:
-            response = supabase.table('clients').select('*').execute()
-            return response.data
+            return get_backend().clients()
         except Exception as e:
             print(f"Error fetching clients: {str(e)}")
             return []
 
+    @staticmethod
+    def get_clients_page(after_id: Optional[int] = None,
+                         limit: int = Config.CLIENTS_PAGE_SIZE) -> List[Dict[str, Any]]:
+        """Get one page of clients ordered by id, starting after ``after_id``.
+
+        Unlike the other helpers this raises on errors, so a failed page is
+        never mistaken for the end of the table.
+        """
+        return get_backend().clients_page(after_id, limit)
+
+    @staticmethod
+    def iter_client_pages(page_size: int = Config.CLIENTS_PAGE_SIZE,
+                          after_id: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Yield clients page by page using keyset pagination on id."""
+        while True:
+            page = Database.get_clients_page(after_id, page_size)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            after_id = page[-1]['id']
+
     @staticmethod
     def add_account(email: str, password: str) -> Optional[Dict[str, Any]]:
         """Add a new account to Supabase."""
@@ -127,15 +534,14 @@ class Database:
 
     @staticmethod
     def link_client_to_account(client_id: int, account_id: int) -> bool:
-        """Link a client to an account in Supabase."""
+        """Link a client to an account in Supabase (limit enforced in the database)."""
         try:
-            data = {
-                'client_id': client_id,
-                'account_id': account_id,
-                'created_at': datetime.utcnow().isoformat()
-            }
-            response = supabase.table('account_clients').insert(data).execute()
-            return bool(response.data)
+            response = supabase.rpc('link_client_to_account', {
+                'p_account_id': account_id,
+                'p_client_id': client_id,
+                'p_max_clients': Config.MAX_CLIENTS_PER_ACCOUNT
+            }).execute()
+            return bool(response.data and response.data.get('success'))
         except Exception as e:
             print(f"Error linking client to account: {str(e)}")
             return False
@@ -152,10 +558,9 @@ class Database:
 
     @staticmethod
     def get_account_clients(account_id: int) -> List[Dict[str, Any]]:
-        """Get all clients linked to an account from Supabase."""
+        """Get all clients linked to an account through the configured backend."""
         try:
-            response = supabase.table('account_clients').select('clients(*)').eq('account_id', account_id).execute()
-            return [item['clients'] for item in response.data]
+            return get_backend().account_clients(account_id) or []
         except Exception as e:
             print(f"Error fetching account clients: {str(e)}")
             return []
@@ -175,20 +580,18 @@ class Database:
 
     @staticmethod
     def check_client_exists(email: str) -> bool:
-        """Check if a client exists in Supabase."""
+        """Check if a client exists through the configured backend."""
         try:
-            response = supabase.table('clients').select('id').eq('email', email).execute()
-            return bool(response.data)
+            return get_backend().client_by_email(email) is not None
         except Exception as e:
             print(f"Error checking client existence: {str(e)}")
             return False
 
     @staticmethod
     def get_client_by_email(email: str) -> Optional[Dict[str, Any]]:
-        """Get a client by email from Supabase."""
+        """Get a client by email through the configured backend."""
         try:
-            response = supabase.table('clients').select('*').eq('email', email).execute()
-            return response.data[0] if response.data else None
+            return get_backend().client_by_email(email)
         except Exception as e:
             print(f"Error fetching client by email: {str(e)}")
             return None 
\ No newline at end of file
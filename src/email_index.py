@@ -0,0 +1,294 @@
+"""
+In-process index of account and client emails for duplicate checks.
+
+Each table gets a Bloom filter built from all of its emails plus an exact set
+of the emails this process wrote since that build (so additions never push the
+filter past the size it was built for). A hit only means "possibly taken" and
+the caller falls through to Supabase as before. Until the first load has
+finished every email counts as possibly taken.
+
+Every filter is stamped with its table's ``table_versions`` version, read
+before the emails were. Any write to the table, by any worker or outside the
+app, bumps that version (see database/schema.sql). ``definitely_absent``
+therefore answers "not taken" only while the filter's stamp is the table's
+current version; otherwise the caller asks the database. The current version
+is the one conditional GET uses (``conditional_get.table_versions``), so the
+same staleness window applies: none with ``CACHE_BACKEND=sqlite``, up to
+``CONDITIONAL_GET_VERSION_TTL`` seconds for another worker's write with the
+in-memory cache.
+
+One daemon thread per worker loads the emails at startup, then checks the
+stamps every ``EMAIL_INDEX_REFRESH`` seconds and reloads the tables whose
+stamp moved (unstamped tables are always reloaded). ``might_exist`` ignores
+the stamp: it only skips the duplicate check before an insert, where the
+unique constraints catch what it missed (``is_unique_violation``) and the
+caller reports the duplicate as if the check had found it.
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+TABLES = ('accounts', 'clients')
+RETRY_DELAY = 30  # seconds before retrying a failed load
+MIN_CAPACITY = 1024  # small tables still get a filter that is mostly zero bits
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, sized for ``capacity`` items at ``error_rate``"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.count = 0
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, item: str) -> Iterator[int]:
+        # Double hashing: k positions from the two halves of one 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.bits
+
+    def add(self, item: str):
+        array = self._array
+        for position in self._positions(item):
+            array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        array = self._array
+        return all(array[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._array)
+
+    def expected_error_rate(self) -> float:
+        """False-positive rate for the items added so far"""
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+
+def _load_emails(table: str) -> Iterator[str]:
+    from db import get_backend
+    backend = get_backend()
+    after_id = None
+    while True:
+        rows = backend.emails_page(table, after_id, Config.EMAIL_INDEX_PAGE_SIZE)
+        for row in rows:
+            if row['email']:
+                yield row['email']
+        if len(rows) < Config.EMAIL_INDEX_PAGE_SIZE:
+            return
+        after_id = rows[-1]['id']
+
+
+def _load_versions() -> Dict[str, Optional[int]]:
+    """The tables' current version stamps, read from the database"""
+    from db import get_backend
+    return {row['table_name']: row.get('version') for row in get_backend().table_versions()}
+
+
+class EmailIndex:
+    def __init__(self, enabled: bool = Config.EMAIL_INDEX_ENABLED,
+                 refresh: float = Config.EMAIL_INDEX_REFRESH,
+                 error_rate: float = Config.EMAIL_INDEX_ERROR_RATE):
+        self.enabled = enabled
+        self.refresh = refresh
+        self.error_rate = error_rate
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # Threads do not survive fork: every worker loads its own index
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._filters: Dict[str, BloomFilter] = {}
+        self._versions: Dict[str, Optional[int]] = {}
+        self._added: Dict[str, set] = {table: set() for table in TABLES}
+        self._pending: Optional[Dict[str, set]] = None
+        self.loaded_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.counters = {'negatives': 0, 'fallthroughs': 0, 'stale': 0, 'loads': 0, 'load_errors': 0}
+
+    def load(self, tables: Iterable[str] = TABLES, versions: Optional[Dict[str, Optional[int]]] = None):
+        """Rebuild the filters of ``tables`` from the database; writes made meanwhile are kept.
+
+        ``versions`` are the stamps read before the load, as ``_load_versions``
+        returns them; without them the filters are unstamped.
+        """
+        tables = list(tables)
+        versions = versions or {}
+        start = time.perf_counter()
+        with self._lock:
+            self._pending = {table: set() for table in tables}
+        try:
+            filters = {}
+            for table in tables:
+                emails = list(_load_emails(table))
+                bloom = BloomFilter(max(len(emails), MIN_CAPACITY), self.error_rate)
+                for email in emails:
+                    bloom.add(email)
+                filters[table] = bloom
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._filters.update(filters)
+            self._added.update(self._pending)
+            for table in tables:
+                self._versions[table] = versions.get(table)
+            self._pending = None
+            self.loaded_at = time.monotonic()
+            self.load_seconds = round(time.perf_counter() - start, 3)
+            self.counters['loads'] += 1
+
+    def refresh_stale(self):
+        """Reload the tables whose stamp moved since their filter was built"""
+        versions = _load_versions()
+        with self._lock:
+            stale = [table for table in TABLES
+                     if table not in self._filters or versions.get(table) is None
+                     or self._versions.get(table) != versions.get(table)]
+        if stale:
+            self.load(stale, versions)
+
+    def add(self, table: str, *emails: str):
+        """Record emails written by this process"""
+        with self._lock:
+            for email in emails:
+                self._added[table].add(email)
+                if self._pending is not None:
+                    self._pending[table].add(email)
+
+    def might_exist(self, table: str, email: str) -> bool:
+        """False if ``email`` was not in ``table`` when the filter was built,
+        nor written by this process since; a hint for a pre-insert check only"""
+        with self._lock:
+            bloom = self._filters.get(table) if self.enabled else None
+            possible = bloom is None or email in self._added[table] or email in bloom
+            self.counters['fallthroughs' if possible else 'negatives'] += 1
+        return possible
+
+    def definitely_absent(self, table: str, email: str, version: Optional[int]) -> bool:
+        """True only if ``email`` is not in ``table`` at ``version``, its current stamp"""
+        with self._lock:
+            bloom = self._filters.get(table) if self.enabled else None
+            current = bloom is not None and version is not None and self._versions.get(table) == version
+            absent = current and email not in self._added[table] and email not in bloom
+            self.counters['negatives' if absent else 'fallthroughs'] += 1
+            if bloom is not None and not current:
+                self.counters['stale'] += 1
+        return absent
+
+    def _run(self):
+        delay = 0.0
+        while not self._stop.wait(delay):
+            try:
+                self.refresh_stale()
+            except Exception as e:
+                with self._lock:
+                    self.counters['load_errors'] += 1
+                logger.error(f"Loading the email index failed: {e}")
+                delay = RETRY_DELAY
+                continue
+            if self.refresh <= 0:
+                return
+            delay = self.refresh
+
+    def ensure_started(self):
+        """Start this process's loader thread; never blocks on the database"""
+        if self._thread is not None or not self.enabled:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._stop = threading.Event()
+            thread = threading.Thread(target=self._run, name='email-index', daemon=True)
+            thread.start()
+            self._thread = thread
+        logger.info(f"Email index loader started in pid {os.getpid()}")
+
+    def stop(self):
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            if thread.is_alive():
+                thread.join(timeout=1)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tables = {
+                table: {
+                    'emails': bloom.count,
+                    'added_since_load': len(self._added[table]),
+                    'version': self._versions.get(table),
+                    'bits': bloom.bits,
+                    'hashes': bloom.hashes,
+                    'bytes': bloom.size_bytes,
+                    'expected_false_positive_rate': round(bloom.expected_error_rate(), 6)
+                }
+                for table, bloom in self._filters.items()
+            }
+            return {
+                'enabled': self.enabled,
+                'loaded': self.loaded_at is not None,
+                'age_seconds': round(time.monotonic() - self.loaded_at, 3) if self.loaded_at else None,
+                'load_seconds': self.load_seconds,
+                'tables': tables,
+                **self.counters
+            }
+
+    def init_app(self, app):
+        """Start loading in each worker as soon as it serves its first request"""
+        @app.before_request
+        def start_email_index():
+            self.ensure_started()
+
+
+def is_unique_violation(error: Exception) -> bool:
+    """Whether a failed write hit a unique constraint (SQLSTATE 23505)"""
+    return getattr(error, 'code', None) == '23505' or 'duplicate key' in str(error)
+
+
+def filter_possible(table: str, emails: Iterable[str]) -> list:
+    """The emails that may already exist in ``table`` (definite negatives dropped)"""
+    return [email for email in emails if email_index.might_exist(table, email)]
+
+
+def known_absent(table: str, email: str, versions: Optional[Dict[str, Dict[str, Any]]] = None) -> bool:
+    """Whether the index proves ``email`` is not in ``table`` right now.
+
+    ``versions`` are the current stamps as ``conditional_get.table_versions``
+    returns them; they are read from there when not given. Without stamps
+    nothing is proven.
+    """
+    if not email_index.enabled:
+        return False
+    if versions is None:
+        from conditional_get import table_versions
+        try:
+            versions = table_versions()
+        except Exception as e:
+            logger.warning(f"Table versions unavailable, checking {email} in the database: {e}")
+            return False
+    return email_index.definitely_absent(table, email, (versions.get(table) or {}).get('version'))
+
+
+# Create a global instance
+email_index = EmailIndex()
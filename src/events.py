@@ -0,0 +1,361 @@
+"""
+Change feed behind the Server-Sent Events stream at ``/events``.
+
+Write routes publish a small event once their write has succeeded
+(``client_added``, ``clients_renewed``, ...) and the health prober publishes
+``health`` whenever the database status changes. Every open ``/events``
+stream receives them, so pages update in place instead of polling
+``/health/live`` every 30 seconds.
+
+``EVENTS_BACKEND=memory`` keeps the events in this process, which is enough
+for a single worker. ``sqlite`` (the default) appends them to a log file
+shared by all workers on the host, and one thread per worker with open
+streams reads new rows every ``EVENTS_POLL_INTERVAL`` seconds. A stream then
+sees writes handled by any worker, and since event ids come from that log a
+reconnect with ``Last-Event-ID`` may land on another worker without missing
+anything.
+
+Each process keeps the last ``EVENTS_BUFFER`` events for reconnects. A stream
+resuming from further back gets a ``reset`` event, and the page reloads its
+data.
+
+Pages only open the stream under ``SERVER_MODE=asgi``, where a stream waits
+on the event loop. A sync worker would be held by each viewer for the whole
+stream, so there the pages keep polling and ``/events`` answers 204, which
+tells a browser's EventSource not to reconnect. Events are published either
+way.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+Event = Tuple[int, str, Dict[str, Any]]  # (id, type, data)
+
+KEEPALIVE = ': keepalive\n\n'
+TRIM_EVERY = 100  # inserts between trims of the shared log
+
+
+class EventBus:
+    """Fan-out of change events to this process's streams, with a replay buffer"""
+    backend = 'memory'
+
+    def __init__(self, buffer_size: int = Config.EVENTS_BUFFER):
+        self.buffer_size = buffer_size
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._cond = threading.Condition()
+        self._events: Deque[Event] = deque()
+        self._listeners: List[Callable[[], None]] = []
+        # Every event with an id above the floor is still buffered
+        self._floor = 0
+        self.last_id = 0
+        self.streams = 0
+        self.counters = {'published': 0, 'resets': 0}
+
+    def _append(self, events: List[Event]):
+        # Caller holds self._cond
+        for event in events:
+            if len(self._events) >= self.buffer_size:
+                self._floor = self._events.popleft()[0]
+            self._events.append(event)
+        self.last_id = events[-1][0]
+        self._cond.notify_all()
+
+    def _notify_listeners(self):
+        for listener in list(self._listeners):
+            try:
+                listener()
+            except RuntimeError:
+                pass  # the listening event loop has already closed
+
+    def publish(self, event_type: str, data: Dict[str, Any]):
+        with self._cond:
+            self.counters['published'] += 1
+            self._append([(self.last_id + 1, event_type, data)])
+        self._notify_listeners()
+
+    def ensure_started(self):
+        """Nothing to start for the in-process bus"""
+
+    def read(self):
+        """Nothing to read for the in-process bus"""
+
+    def stop(self):
+        """Nothing to stop for the in-process bus"""
+
+    def since(self, last_id: int) -> Optional[List[Event]]:
+        """Events after ``last_id``, or None if some of them are no longer buffered"""
+        with self._cond:
+            return self._since(last_id)
+
+    def _since(self, last_id: int) -> Optional[List[Event]]:
+        if last_id == self.last_id:
+            return []
+        if last_id > self.last_id or last_id < self._floor:
+            self.counters['resets'] += 1
+            return None
+        return [event for event in self._events if event[0] > last_id]
+
+    def wait(self, last_id: int, timeout: float) -> Optional[List[Event]]:
+        """Like ``since``, but block up to ``timeout`` seconds for a new event"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.last_id != last_id, timeout)
+            return self._since(last_id)
+
+    def add_listener(self, listener: Callable[[], None]):
+        """Call ``listener`` (from the publishing thread) after each new event"""
+        with self._cond:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], None]):
+        with self._cond:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _stream_opened(self, delta: int):
+        with self._cond:
+            self.streams += delta
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'backend': self.backend,
+                'last_id': self.last_id,
+                'buffered': len(self._events),
+                'streams': self.streams,
+                **self.counters
+            }
+
+
+class SQLiteEventBus(EventBus):
+    """Event log in one SQLite file shared by every worker on the host"""
+    backend = 'sqlite'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, buffer_size: int = Config.EVENTS_BUFFER,
+                 poll_interval: float = Config.EVENTS_POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        super().__init__(buffer_size)
+
+    def _reset(self):
+        # Threads do not survive fork: every worker starts its own reader
+        super()._reset()
+        self._local = threading.local()
+        self._read_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        # Never reuse a connection inherited across fork
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(self.SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def publish(self, event_type: str, data: Dict[str, Any]):
+        conn = self._connect()
+        with conn:
+            event_id = conn.execute(
+                'INSERT INTO events (type, data, created_at) VALUES (?, ?, ?)',
+                (event_type, json.dumps(data, default=str), time.time())
+            ).lastrowid
+            if event_id % TRIM_EVERY == 0:
+                conn.execute('DELETE FROM events WHERE id <= ?', (event_id - self.buffer_size,))
+        with self._cond:
+            self.counters['published'] += 1
+        if self._thread is not None:
+            # This worker's own streams need not wait for the next poll
+            self.read()
+
+    def read(self):
+        """Buffer the events appended to the log (by any worker) since the last read"""
+        with self._read_lock:
+            rows = self._connect().execute(
+                'SELECT id, type, data FROM events WHERE id > ? ORDER BY id', (self.last_id,)
+            ).fetchall()
+            if not rows:
+                return
+            with self._cond:
+                self._append([(event_id, event_type, json.loads(data)) for event_id, event_type, data in rows])
+        self._notify_listeners()
+
+    def _prime(self):
+        # Start from the log's tail, so reconnects right after startup can still resume
+        conn = self._connect()
+        rows = conn.execute(
+            'SELECT id, type, data FROM events ORDER BY id DESC LIMIT ?', (self.buffer_size,)
+        ).fetchall()[::-1]
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+        with self._read_lock, self._cond:
+            self._events = deque((event_id, event_type, json.loads(data)) for event_id, event_type, data in rows)
+            self._floor = rows[0][0] - 1 if rows else last_id
+            self.last_id = last_id
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.read()
+            except sqlite3.Error as e:
+                logger.warning(f"Reading the event log failed: {e}")
+
+    def ensure_started(self):
+        """Start this process's log reader (on its first stream)"""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._prime()
+            self._stop = threading.Event()
+            thread = threading.Thread(target=self._run, name='event-log-reader', daemon=True)
+            thread.start()
+            self._thread = thread
+        logger.info(f"Event log reader started in pid {os.getpid()} (every {self.poll_interval}s)")
+
+    def stop(self):
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            if thread.is_alive():
+                thread.join(timeout=1)
+            self._thread = None
+
+
+def create_event_bus(config=Config) -> EventBus:
+    """Create the event bus selected by ``Config.EVENTS_BACKEND``"""
+    if config.EVENTS_BACKEND == 'memory':
+        return EventBus(config.EVENTS_BUFFER)
+    if config.EVENTS_BACKEND == 'sqlite':
+        return SQLiteEventBus(config.EVENTS_SQLITE_PATH, config.EVENTS_BUFFER, config.EVENTS_POLL_INTERVAL)
+    raise ValueError(f"Unknown EVENTS_BACKEND '{config.EVENTS_BACKEND}' (expected memory or sqlite)")
+
+
+def streaming_enabled(config=Config) -> bool:
+    """Whether pages should open ``/events`` (only the ASGI server streams without a worker per viewer)"""
+    return config.SERVER_MODE == 'asgi'
+
+
+def publish(event_type: str, **data: Any):
+    """Publish to the change feed; a failure is logged, never raised into the write"""
+    try:
+        event_bus.publish(event_type, data)
+    except Exception as e:
+        logger.warning(f"Publishing {event_type} failed: {e}")
+
+
+def format_event(event: Event) -> str:
+    event_id, event_type, data = event
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, separators=(',', ':'), default=str)}\n\n"
+
+
+def _reset_event(last_id: int) -> str:
+    return f"id: {last_id}\nevent: reset\ndata: {{}}\n\n"
+
+
+def _start(last_event_id: Optional[str], bus: EventBus) -> int:
+    bus.ensure_started()
+    # Catch up first: the id may come from a worker that published after our last poll
+    bus.read()
+    try:
+        return int(last_event_id)
+    except (TypeError, ValueError):
+        return bus.last_id  # a new stream only gets events from now on
+
+
+def stream(last_event_id: Optional[str] = None) -> Iterator[str]:
+    """The text of one ``/events`` response (WSGI).
+
+    Ends after ``EVENTS_STREAM_MAX_SECONDS`` so a sync worker is never held
+    past gunicorn's timeout; the browser reconnects with ``Last-Event-ID``.
+    """
+    bus = event_bus
+    last_id = _start(last_event_id, bus)
+    deadline = time.monotonic() + Config.EVENTS_STREAM_MAX_SECONDS
+    bus._stream_opened(1)
+    try:
+        yield f"retry: {Config.EVENTS_RETRY_MS}\n\n"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            events = bus.wait(last_id, min(Config.EVENTS_HEARTBEAT, remaining))
+            if events is None:
+                last_id = bus.last_id
+                yield _reset_event(last_id)
+            elif events:
+                last_id = events[-1][0]
+                yield ''.join(format_event(event) for event in events)
+            else:
+                yield KEEPALIVE
+    finally:
+        bus._stream_opened(-1)
+
+
+async def async_stream(last_event_id: Optional[str] = None) -> AsyncIterator[str]:
+    """The text of one ``/events`` response (ASGI); waits without holding a thread"""
+    bus = event_bus
+    last_id = _start(last_event_id, bus)
+    deadline = time.monotonic() + Config.EVENTS_STREAM_MAX_SECONDS
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+
+    def listener():
+        loop.call_soon_threadsafe(wake.set)
+
+    bus.add_listener(listener)
+    bus._stream_opened(1)
+    try:
+        yield f"retry: {Config.EVENTS_RETRY_MS}\n\n"
+        while True:
+            wake.clear()
+            events = bus.since(last_id)
+            if events is None:
+                last_id = bus.last_id
+                yield _reset_event(last_id)
+                continue
+            if events:
+                last_id = events[-1][0]
+                yield ''.join(format_event(event) for event in events)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(wake.wait(), min(Config.EVENTS_HEARTBEAT, remaining))
+            except asyncio.TimeoutError:
+                yield KEEPALIVE
+    finally:
+        bus.remove_listener(listener)
+        bus._stream_opened(-1)
+
+
+# Create a global instance
+event_bus = create_event_bus()
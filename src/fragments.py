@@ -0,0 +1,149 @@
+"""
+Rendered-row cache for the dashboard tables.
+
+Every table row (an account row, the ``<option>`` entries of the link form,
+a client card) is rendered once by its macro in ``templates/_rows.html`` and
+kept per worker. The key is the row's id plus the fields the row displays.
+Per-row work such as formatting ``created_at`` happens in that one render.
+A table is then the join of its cached rows, and only new or changed rows
+are rendered.
+
+A whole table body is also kept under the data version it was rendered for
+(see ``dashboard.load_dashboard``). While the version is unchanged, a request
+reuses the body without even looking at its rows. Bodies with an unknown
+version are never reused.
+
+Rows are evicted least recently used beyond ``FRAGMENT_CACHE_MAX_ROWS``. An
+account row is about 1.5 KiB.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from flask import current_app
+from markupsafe import Markup
+
+from config import Config
+from dashboard import DashboardData, format_timestamp
+
+ROWS_TEMPLATE = '_rows.html'
+
+# Fields each fragment displays; a row is re-rendered when one of them changes
+ACCOUNT_ROW_FIELDS = ('email', 'status', 'client_count', 'created_at')
+ACCOUNT_OPTION_FIELDS = ('email',)
+CLIENT_OPTION_FIELDS = ('name', 'email')
+CLIENT_CARD_FIELDS = ('name', 'email', 'phone', 'renewal_date', 'next_renewal_date', 'account_count', 'created_at')
+
+
+class FragmentCache:
+    """Per-worker cache of rendered rows and of whole table bodies"""
+
+    def __init__(self, max_rows: int = 250000, enabled: bool = True):
+        self.max_rows = max_rows
+        self.enabled = enabled
+        self._rows: 'OrderedDict[Tuple[str, Any], Tuple[tuple, str]]' = OrderedDict()
+        self._bodies: Dict[str, Tuple[Hashable, Markup]] = {}
+        self._lock = threading.Lock()
+        self.row_hits = 0
+        self.row_renders = 0
+        self.body_hits = 0
+        self.body_renders = 0
+        self.evictions = 0
+
+    def render(self, name: str, rows: Iterable[Dict[str, Any]], render_row: Callable[[Dict[str, Any]], str],
+               fields: Sequence[str], version: Optional[Hashable] = None) -> Markup:
+        """The rendered ``rows`` of fragment ``name``, joined.
+
+        ``render_row`` is only called for rows that are new or whose
+        ``fields`` changed since they were last rendered.
+        """
+        if not self.enabled:
+            return Markup(''.join(render_row(row) for row in rows))
+
+        if version is not None:
+            with self._lock:
+                cached = self._bodies.get(name)
+                if cached is not None and cached[0] == version:
+                    self.body_hits += 1
+                    return cached[1]
+
+        keyed = [((name, row.get('id')), tuple(row.get(field) for field in fields), row) for row in rows]
+        with self._lock:
+            found = [self._rows.get(key) for key, _, _ in keyed]
+
+        parts: List[str] = []
+        rendered = []
+        for (key, fingerprint, row), cached in zip(keyed, found):
+            if cached is not None and cached[0] == fingerprint:
+                parts.append(cached[1])
+                continue
+            html = str(render_row(row))
+            parts.append(html)
+            rendered.append((key, (fingerprint, html)))
+
+        body = Markup(''.join(parts))
+        with self._lock:
+            for key, _, _ in keyed:
+                if key in self._rows:
+                    self._rows.move_to_end(key)
+            self._rows.update(rendered)
+            while len(self._rows) > self.max_rows:
+                self._rows.popitem(last=False)
+                self.evictions += 1
+            self.row_hits += len(keyed) - len(rendered)
+            self.row_renders += len(rendered)
+            self.body_renders += 1
+            if version is not None:
+                self._bodies[name] = (version, body)
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self._bodies.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        looked_up = self.row_hits + self.row_renders
+        return {
+            'enabled': self.enabled,
+            'rows': len(self._rows),
+            'max_rows': self.max_rows,
+            'bodies': len(self._bodies),
+            'row_hits': self.row_hits,
+            'row_renders': self.row_renders,
+            'row_hit_ratio': round(self.row_hits / looked_up, 4) if looked_up else None,
+            'body_hits': self.body_hits,
+            'body_renders': self.body_renders,
+            'evictions': self.evictions
+        }
+
+
+def _macros():
+    """The compiled macros of ``_rows.html`` (Jinja keeps the module with the template)"""
+    return current_app.jinja_env.get_template(ROWS_TEMPLATE).module
+
+
+def dashboard_fragments(data: DashboardData) -> Dict[str, Markup]:
+    """The rendered account table and link-form options of ``index.html``"""
+    macros = _macros()
+
+    def account_row(account):
+        return macros.account_row(account, format_timestamp(account.get('created_at')))
+
+    return {
+        'account_rows': fragment_cache.render('account_rows', data.accounts, account_row,
+                                              ACCOUNT_ROW_FIELDS, data.version),
+        'account_options': fragment_cache.render('account_options', data.accounts, macros.account_option,
+                                                 ACCOUNT_OPTION_FIELDS, data.version),
+        'client_options': fragment_cache.render('client_options', data.clients, macros.client_option,
+                                                CLIENT_OPTION_FIELDS, data.version)
+    }
+
+
+def client_cards(clients: Iterable[Dict[str, Any]]) -> Markup:
+    """The client cards of one ``clients.html`` page"""
+    return fragment_cache.render('client_cards', clients, _macros().client_card, CLIENT_CARD_FIELDS)
+
+
+# Create a global instance
+fragment_cache = FragmentCache(max_rows=Config.FRAGMENT_CACHE_MAX_ROWS, enabled=Config.FRAGMENT_CACHE_ENABLED)
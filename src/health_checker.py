@@ -1,12 +1,46 @@
 import logging
-import psycopg2
 from datetime import datetime, timedelta
 from config import Config
+from db import DatabasePool, RealDictCursor
 from route_manager import route_manager
 
 logger = logging.getLogger(__name__)
 
+# One catalog lookup per check. Row counts come from the planner statistics
+# (pg_class.reltuples, or pg_stat_user_tables.n_live_tup before the first
+# ANALYZE) instead of a full-scan COUNT(*). Index columns are listed in key
+# order, so the leading column tells which lookups an index can serve.
+TABLES_QUERY = """
+    SELECT t.name AS table_name,
+           c.oid IS NOT NULL AS table_exists,
+           CASE WHEN c.reltuples > 0 THEN c.reltuples::bigint
+                ELSE COALESCE(s.n_live_tup, 0) END AS estimated_rows,
+           COALESCE(
+               json_agg(json_build_object(
+                   'name', i.relname,
+                   'definition', pg_get_indexdef(i.oid),
+                   'columns', ARRAY(
+                       SELECT a.attname
+                       FROM unnest(x.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+                       JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+                       ORDER BY k.ord
+                   )
+               ) ORDER BY i.relname) FILTER (WHERE i.oid IS NOT NULL),
+               '[]'
+           ) AS indexes
+    FROM unnest(%s::text[]) AS t(name)
+    LEFT JOIN pg_class c ON c.relname = t.name
+        AND c.relkind IN ('r', 'p')
+        AND c.relnamespace = 'public'::regnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    LEFT JOIN pg_index x ON x.indrelid = c.oid
+    LEFT JOIN pg_class i ON i.oid = x.indexrelid
+    GROUP BY t.name, c.oid, c.reltuples, s.n_live_tup
+"""
+
 class HealthChecker:
+    tables_to_check = ['clients', 'accounts', 'account_clients']
+
     def __init__(self):
         self.db_status = {
             'status': 'unknown',
@@ -15,7 +49,8 @@ class HealthChecker:
             'connection_time': None,
             'tables': {}
         }
-        self.cache_duration = timedelta(minutes=5)  # Cache health check results for 5 minutes
+        # Cache health check results (5 minutes by default)
+        self.cache_duration = timedelta(seconds=Config.HEALTH_CHECK_CACHE_TIMEOUT)
         self.start_time = datetime.now()  # Track application start time
 
     def check_database(self, force=False):
@@ -26,58 +61,40 @@ class HealthChecker:
                 return self.db_status
 
         start_time = datetime.now()
-        conn = None
         try:
-            # Test database connection
-            conn = psycopg2.connect(**Config.DB_CONFIG)
-            cur = conn.cursor()
+            # Borrow a pooled connection instead of opening one per check
+            with DatabasePool.connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    # Quick connection test
+                    cur.execute('SELECT 1')
+                    latency = (datetime.now() - start_time).total_seconds()
+
+                    # Table existence, row estimates and indexes in one catalog query
+                    cur.execute(TABLES_QUERY, (self.tables_to_check,))
+                    tables_status = {}
+                    for row in cur.fetchall():
+                        if row['table_exists']:
+                            tables_status[row['table_name']] = {
+                                'exists': True,
+                                'row_count': row['estimated_rows'],
+                                'row_count_estimated': True,
+                                'indexes': row['indexes']
+                            }
+                        else:
+                            tables_status[row['table_name']] = {
+                                'exists': False,
+                                'error': f"Table '{row['table_name']}' does not exist"
+                            }
 
-            # Quick connection test
-            cur.execute('SELECT 1')
-            
-            # Update status with basic info first
             self.db_status = {
                 'status': 'healthy',
                 'last_check': datetime.now(),
                 'error': None,
-                'connection_time': (datetime.now() - start_time).total_seconds(),
-                'latency': (datetime.now() - start_time).total_seconds() * 1000  # in milliseconds
+                'connection_time': latency,
+                'latency': latency * 1000,  # in milliseconds
+                'tables': tables_status
             }
 
-            # Only do detailed checks if forced or cache expired
-            if force or not self.db_status['last_check']:
-                # Check if all required tables exist and their row counts
-                tables_to_check = ['clients', 'accounts', 'client_accounts']
-                tables_status = {}
-
-                for table in tables_to_check:
-                    # Check if table exists
-                    cur.execute("""
-                        SELECT EXISTS (
-                            SELECT FROM information_schema.tables 
-                            WHERE table_schema = 'public' 
-                            AND table_name = %s
-                        )
-                    """, (table,))
-                    exists = cur.fetchone()[0]
-
-                    if exists:
-                        # Get row count
-                        cur.execute(f"SELECT COUNT(*) FROM {table}")
-                        row_count = cur.fetchone()[0]
-                        
-                        tables_status[table] = {
-                            'exists': True,
-                            'row_count': row_count
-                        }
-                    else:
-                        tables_status[table] = {
-                            'exists': False,
-                            'error': f"Table '{table}' does not exist"
-                        }
-
-                self.db_status['tables'] = tables_status
-
         except Exception as e:
             error_msg = str(e)
             logger.error(f"Database health check failed: {error_msg}")
@@ -86,13 +103,9 @@ class HealthChecker:
                 'last_check': datetime.now(),
                 'error': error_msg,
                 'connection_time': (datetime.now() - start_time).total_seconds() if start_time else None,
-                'latency': None
+                'latency': None,
+                'tables': {}
             }
-        finally:
-            if 'cur' in locals():
-                cur.close()
-            if conn:
-                conn.close()
 
         return self.db_status
 
@@ -130,25 +143,18 @@ class HealthChecker:
         if db_status['status'] == 'healthy':
             for table_name, table_info in db_status['tables'].items():
                 if table_info['exists']:
-                    # Check for missing indexes on foreign keys
-                    if table_name == 'client_accounts':
-                        has_client_id_index = any('client_id' in idx['definition'] 
-                                                for idx in table_info['indexes'])
-                        has_account_id_index = any('account_id' in idx['definition'] 
-                                                 for idx in table_info['indexes'])
-                        
-                        if not has_client_id_index:
-                            recommendations.append({
-                                'type': 'index',
-                                'priority': 'high',
-                                'message': f"Add index on {table_name}.client_id for better query performance"
-                            })
-                        if not has_account_id_index:
-                            recommendations.append({
-                                'type': 'index',
-                                'priority': 'high',
-                                'message': f"Add index on {table_name}.account_id for better query performance"
-                            })
+                    # Check for missing indexes on foreign keys: an index only
+                    # serves lookups on its leading column
+                    if table_name == 'account_clients':
+                        leading = {idx['columns'][0] for idx in table_info['indexes'] if idx['columns']}
+
+                        for column in ('client_id', 'account_id'):
+                            if column not in leading:
+                                recommendations.append({
+                                    'type': 'index',
+                                    'priority': 'high',
+                                    'message': f"Add index on {table_name}.{column} for better query performance"
+                                })
 
                     # Check for large tables that might need archiving
                     row_count = table_info['row_count']
@@ -161,14 +167,13 @@ class HealthChecker:
 
         # Route recommendations
         route_status = route_manager.generate_report()
-        for route in route_status.get('routes', []):
-            stats = route.get('stats', {})
-            error_rate = (stats.get('failed_calls', 0) / stats.get('total_calls', 1)) * 100
+        for endpoint, route in route_status.get('routes', {}).items():
+            error_rate = (route.get('failed_calls', 0) / max(route.get('total_calls', 0), 1)) * 100
             if error_rate > 5:  # More than 5% error rate
                 recommendations.append({
                     'type': 'reliability',
                     'priority': 'high',
-                    'message': f"High error rate ({error_rate:.1f}%) on route {route['endpoint']}"
+                    'message': f"High error rate ({error_rate:.1f}%) on route {endpoint}"
                 })
 
         return recommendations
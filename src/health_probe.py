@@ -0,0 +1,185 @@
+"""
+Background database health prober.
+
+Each worker process runs one daemon thread that probes the database every
+``HEALTH_PROBE_INTERVAL`` seconds (randomly jittered so workers do not probe
+in lockstep). The health endpoints answer from the last result held in
+memory instead of querying Supabase per request, report how old that result
+is, and switch to ``degraded`` once it is older than ``HEALTH_STALE_AFTER``.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import Config
+import events
+from route_manager import route_manager
+
+logger = logging.getLogger(__name__)
+
+
+def _probe_database():
+    from db import get_backend
+    get_backend().ping()
+
+
+class HealthProber:
+    def __init__(self, probe: Callable[[], Any] = _probe_database,
+                 interval: float = Config.HEALTH_PROBE_INTERVAL,
+                 jitter: float = Config.HEALTH_PROBE_JITTER,
+                 stale_after: Optional[float] = Config.HEALTH_STALE_AFTER):
+        self.probe = probe
+        self.interval = interval
+        self.jitter = jitter
+        self.stale_after = stale_after if stale_after else interval * 3
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # Threads do not survive fork: every worker starts its own prober
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = datetime.now()
+        self.state: Dict[str, Any] = {
+            'status': 'unknown',
+            'checked_at': None,
+            'checked_monotonic': None,
+            'latency_ms': None,
+            'error': None,
+            'consecutive_failures': 0
+        }
+
+    def probe_once(self) -> Dict[str, Any]:
+        """Run the probe now and record the result"""
+        start = time.perf_counter()
+        try:
+            self.probe()
+            status, error = 'healthy', None
+        except Exception as e:
+            status, error = 'unhealthy', str(e)
+            logger.error(f"Database health probe failed: {e}")
+        latency_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        with self._lock:
+            previous = self.state['status']
+            failures = self.state['consecutive_failures'] + 1 if error else 0
+            self.state = {
+                'status': status,
+                'checked_at': datetime.utcnow(),
+                'checked_monotonic': time.monotonic(),
+                'latency_ms': latency_ms,
+                'error': error,
+                'consecutive_failures': failures
+            }
+            state = dict(self.state)
+        # Pages on /events refresh their status indicator on transitions only
+        if previous not in ('unknown', status):
+            events.publish('health', status=status, previous=previous,
+                           checked_at=state['checked_at'].isoformat(), error=error)
+        return state
+
+    def _next_delay(self) -> float:
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _run(self):
+        # Spread the first probe of each worker over one interval
+        delay = random.uniform(0, self.interval)
+        while not self._stop.wait(delay):
+            self.probe_once()
+            delay = self._next_delay()
+
+    def ensure_started(self):
+        """Start the prober thread of this process, probing once inline the first time"""
+        if self._thread is not None or self.interval <= 0:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            if self.state['checked_at'] is None:
+                self.probe_once()
+            self._stop = threading.Event()
+            thread = threading.Thread(target=self._run, name='health-prober', daemon=True)
+            thread.start()
+            self._thread = thread
+        logger.info(f"Health prober started in pid {os.getpid()} (every ~{self.interval}s)")
+
+    def stop(self):
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            if thread.is_alive():
+                thread.join(timeout=1)
+            self._thread = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the last probe result with its age; never queries the database
+        unless probing is disabled (``HEALTH_PROBE_INTERVAL=0``)"""
+        if self.interval <= 0:
+            self.probe_once()
+        else:
+            self.ensure_started()
+
+        with self._lock:
+            state = dict(self.state)
+        checked = state.pop('checked_monotonic')
+        age = time.monotonic() - checked if checked is not None else None
+        state['age_seconds'] = round(age, 3) if age is not None else None
+        state['stale'] = age is None or (self.interval > 0 and age > self.stale_after)
+        if state['stale'] and state['status'] == 'healthy':
+            state['status'] = 'degraded'
+        if state['checked_at'] is not None:
+            state['checked_at'] = state['checked_at'].isoformat()
+        return state
+
+    def uptime(self) -> str:
+        return str(timedelta(seconds=int((datetime.now() - self.started_at).total_seconds())))
+
+
+def health_payload() -> Tuple[Dict[str, Any], int]:
+    """Body and status code of ``/health`` and ``/health/database``"""
+    health = health_prober.snapshot()
+    payload = {
+        'status': health['status'],
+        'timestamp': datetime.utcnow().isoformat(),
+        'checked_at': health['checked_at'],
+        'age_seconds': health['age_seconds'],
+        'latency_ms': health['latency_ms']
+    }
+    if health['error']:
+        payload['error'] = health['error']
+    return payload, 503 if health['status'] == 'unhealthy' else 200
+
+
+def live_payload() -> Tuple[Dict[str, Any], int]:
+    """Body and status code of ``/health/live``"""
+    health = health_prober.snapshot()
+    payload = {
+        'status': 'error' if health['status'] == 'unhealthy' else health['status'],
+        'timestamp': datetime.now().isoformat(),
+        'services': {
+            'database': {
+                'status': health['status'],
+                'latency': health['latency_ms'],
+                'checked_at': health['checked_at'],
+                'age_seconds': health['age_seconds']
+            },
+            'application': {
+                'status': 'healthy',
+                'uptime': health_prober.uptime()
+            },
+            'routes': route_manager.summary()
+        }
+    }
+    if health['error']:
+        payload['error'] = health['error']
+    return payload, 500 if health['status'] == 'unhealthy' else 200
+
+
+# Create a global instance
+health_prober = HealthProber()
@@ -0,0 +1,247 @@
+"""
+Pooled, keep-alive HTTP transport for the Supabase PostgREST client.
+
+``install_pooled_transport`` makes the Supabase client build its PostgREST
+session on a tuned ``httpx`` connection pool, lazily and once per process:
+after a fork (gunicorn ``preload_app``) the child drops the inherited client
+and opens its own connections instead of sharing sockets with the master.
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from postgrest import AsyncPostgrestClient, SyncPostgrestClient
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TransportSettings:
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    connect_timeout: float = 5.0
+    read_timeout: float = 5.0
+    pool_timeout: float = 5.0
+    retries: int = 1
+
+    @classmethod
+    def from_config(cls, config) -> 'TransportSettings':
+        return cls(
+            max_connections=config.SUPABASE_POOL_SIZE,
+            max_keepalive_connections=config.SUPABASE_POOL_KEEPALIVE,
+            keepalive_expiry=config.SUPABASE_KEEPALIVE_EXPIRY,
+            http2=config.SUPABASE_HTTP2,
+            connect_timeout=config.SUPABASE_CONNECT_TIMEOUT,
+            read_timeout=config.SUPABASE_TIMEOUT,
+            pool_timeout=config.SUPABASE_POOL_TIMEOUT,
+            retries=config.SUPABASE_CONNECT_RETRIES
+        )
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout, pool=self.pool_timeout)
+
+    def use_http2(self) -> bool:
+        if not self.http2:
+            return False
+        try:
+            import h2  # noqa: F401
+            return True
+        except ImportError:
+            logger.warning("SUPABASE_HTTP2 is set but the h2 package is missing; using HTTP/1.1")
+            return False
+
+
+def pool_stats(transport: Any) -> Dict[str, Any]:
+    """Get open/idle/active connections and waiting requests of an httpx transport"""
+    pool = getattr(transport, '_pool', None)
+    if pool is None:
+        return {'open': 0, 'idle': 0, 'active': 0, 'waiting': 0}
+    connections = list(pool.connections)
+    idle = sum(1 for connection in connections if connection.is_idle())
+    # Requests queued in the pool that have not been handed a connection yet
+    waiting = sum(1 for status in list(getattr(pool, '_requests', []))
+                  if getattr(status, 'connection', None) is None)
+    return {
+        'open': len(connections),
+        'idle': idle,
+        'active': len(connections) - idle,
+        'waiting': waiting
+    }
+
+
+# Callbacks ``observer(request, response, seconds, error)`` run after every
+# PostgREST request (see metrics.py); ``response`` is None when it failed.
+_observers: List[Callable] = []
+
+
+def add_request_observer(observer: Callable):
+    _observers.append(observer)
+
+
+def describe_request(request: httpx.Request) -> Tuple[str, str]:
+    """Get the (table or function, operation) a PostgREST request targets"""
+    path = request.url.path.split('/rest/v1/', 1)[-1].strip('/')
+    if path.startswith('rpc/'):
+        return path[4:], 'rpc'
+    if request.method == 'POST':
+        prefer = request.headers.get('prefer', '')
+        return path, 'upsert' if 'resolution=merge-duplicates' in prefer else 'insert'
+    operations = {'GET': 'select', 'HEAD': 'select', 'PATCH': 'update', 'DELETE': 'delete'}
+    return path, operations.get(request.method, request.method.lower())
+
+
+def _notify(request, response, seconds, error):
+    for observer in _observers:
+        try:
+            observer(request, response, seconds, error)
+        except Exception as e:
+            logger.warning(f"Request observer failed: {e}")
+
+
+class ObservedTransport(httpx.BaseTransport):
+    """Times each request of the wrapped transport for the registered observers"""
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not _observers:
+            return self.transport.handle_request(request)
+        start = time.perf_counter()
+        try:
+            response = self.transport.handle_request(request)
+        except Exception as e:
+            _notify(request, None, time.perf_counter() - start, e)
+            raise
+        _notify(request, response, time.perf_counter() - start, None)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncObservedTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of :class:`ObservedTransport`"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not _observers:
+            return await self.transport.handle_async_request(request)
+        start = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception as e:
+            _notify(request, None, time.perf_counter() - start, e)
+            raise
+        _notify(request, response, time.perf_counter() - start, None)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class PooledPostgrestClient(SyncPostgrestClient):
+    """SyncPostgrestClient whose session runs on a tuned connection pool"""
+
+    def __init__(self, base_url: str, *, settings: TransportSettings, **kwargs):
+        self.settings = settings
+        self.transport = httpx.HTTPTransport(
+            limits=settings.limits(), http2=settings.use_http2(), retries=settings.retries
+        )
+        super().__init__(base_url, **kwargs)
+
+    def create_session(self, base_url, headers, timeout) -> httpx.Client:
+        return httpx.Client(
+            base_url=base_url,
+            headers=headers,
+            timeout=self.settings.timeout(),
+            transport=ObservedTransport(self.transport)
+        )
+
+
+class PooledAsyncPostgrestClient(AsyncPostgrestClient):
+    """AsyncPostgrestClient whose session runs on a tuned connection pool"""
+
+    def __init__(self, base_url: str, *, settings: TransportSettings, **kwargs):
+        self.settings = settings
+        self.transport = httpx.AsyncHTTPTransport(
+            limits=settings.limits(), http2=settings.use_http2(), retries=settings.retries
+        )
+        super().__init__(base_url, **kwargs)
+
+    def create_session(self, base_url, headers, timeout) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=self.settings.timeout(),
+            transport=AsyncObservedTransport(self.transport)
+        )
+
+
+class _TransportRegistry:
+    """Tracks the pooled PostgREST client of the current process"""
+
+    def __init__(self):
+        self.client: Optional[PooledPostgrestClient] = None
+        self.pid: Optional[int] = None
+        self.lock = threading.Lock()
+
+
+_registry = _TransportRegistry()
+
+
+def install_pooled_transport(supabase_client, settings: TransportSettings):
+    """Route ``supabase_client.postgrest`` through a pooled per-process session"""
+
+    def init_postgrest_client(rest_url, headers, schema, timeout=None):
+        with _registry.lock:
+            _registry.client = PooledPostgrestClient(
+                rest_url, settings=settings, headers=headers, schema=schema
+            )
+            _registry.pid = os.getpid()
+            logger.info(f"Supabase HTTP pool created in pid {_registry.pid} "
+                        f"(max {settings.max_connections} connections)")
+            return _registry.client
+
+    # supabase.Client builds its PostgREST client lazily through this hook
+    supabase_client._init_postgrest_client = init_postgrest_client
+
+    def after_fork_in_child():
+        # Sockets inherited from the parent must not be shared; rebuild lazily
+        supabase_client._postgrest = None
+        _registry.client = None
+        _registry.pid = None
+        _registry.lock = threading.Lock()
+
+    os.register_at_fork(after_in_child=after_fork_in_child)
+
+
+def transport_stats(settings: Optional[TransportSettings] = None) -> Dict[str, Any]:
+    """Get pool statistics for this process's Supabase connections"""
+    client = _registry.client
+    stats = pool_stats(client.transport) if client is not None else pool_stats(None)
+    stats['pid'] = os.getpid()
+    stats['initialized'] = client is not None
+    if settings is not None:
+        stats.update({
+            'max_connections': settings.max_connections,
+            'max_keepalive_connections': settings.max_keepalive_connections,
+            'keepalive_expiry': settings.keepalive_expiry,
+            'http2': settings.http2
+        })
+    return stats
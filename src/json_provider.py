@@ -0,0 +1,82 @@
+"""
+Optional orjson-backed JSON provider for Flask.
+
+``JSON_PROVIDER=orjson`` replaces Flask's stdlib encoder with orjson for
+``jsonify``, ``app.json.dumps`` (the client streams and the ASGI handlers) and
+request parsing. Responses match the default provider: keys are sorted,
+dates are HTTP dates, Decimal and UUID become strings, dataclasses become
+dicts, and the body is compact outside debug mode. Two things differ.
+Non-ASCII characters are written as UTF-8 instead of ``\\u`` escapes, and
+``dumps`` is compact too, so the streamed exports lose the spaces after
+their separators. Anything orjson refuses, such as integers wider than 64
+bits, falls back to the stdlib encoder. Without orjson installed the default
+provider stays in place.
+"""
+import logging
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider
+
+from config import Config
+
+try:
+    import orjson
+except ImportError:  # Optional; the stdlib encoder is the default
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider serializing with orjson"""
+
+    def _options(self, indent: bool = False) -> int:
+        # Dates and dataclasses go through ``default`` so they match the stdlib provider
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        indent = kwargs.pop('indent', None)
+        kwargs.pop('separators', None)
+        if kwargs:
+            return super().dumps(obj, indent=indent, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._options(bool(indent))).decode()
+        except TypeError:
+            return super().dumps(obj, indent=indent)
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            # The stdlib parser also accepts NaN/Infinity; it raises for truly invalid input
+            return super().loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        try:
+            # Straight to bytes, skipping the str round trip of dumps()
+            body = orjson.dumps(obj, default=self.default,
+                                option=self._options(indent) | orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_app(app, provider: str = Config.JSON_PROVIDER):
+    """Install the JSON provider selected by ``Config.JSON_PROVIDER``"""
+    if provider == 'stdlib':
+        return
+    if provider != 'orjson':
+        raise ValueError(f"Unknown JSON_PROVIDER '{provider}' (expected stdlib or orjson)")
+    if orjson is None:
+        logger.warning("JSON_PROVIDER=orjson but orjson is not installed; using the stdlib encoder")
+        return
+    app.json = OrjsonProvider(app)
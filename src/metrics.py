@@ -0,0 +1,122 @@
+"""
+Prometheus metrics in OpenMetrics text format, combined across gunicorn workers.
+
+With ``PROMETHEUS_MULTIPROC_DIR`` set (gunicorn.conf.py does this) every
+worker writes its samples to per-process files in that directory and
+``/metrics`` merges them, so a single scrape covers all workers no matter
+which one answers it. Without it (``flask run``, tests) the in-process
+registry is served.
+"""
+import logging
+import os
+import time
+from typing import Optional, Tuple
+
+from flask import g, request
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+from prometheus_client.openmetrics.exposition import CONTENT_TYPE_LATEST, generate_latest
+
+from cache import cache
+from config import Config
+from http_transport import add_request_observer, describe_request
+from password_hasher import password_hasher
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BCRYPT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+HTTP_REQUESTS = Counter(
+    'lokiplus_http_requests', 'HTTP requests served', ['endpoint', 'method', 'status']
+)
+HTTP_LATENCY = Histogram(
+    'lokiplus_http_request_duration_seconds', 'Time to produce a response', ['endpoint'],
+    buckets=LATENCY_BUCKETS
+)
+SUPABASE_LATENCY = Histogram(
+    'lokiplus_supabase_request_duration_seconds', 'PostgREST round trips until response headers',
+    ['table', 'operation', 'status'], buckets=LATENCY_BUCKETS
+)
+CACHE_EVENTS = Counter(
+    'lokiplus_cache_events', 'Read-through cache hits, misses, evictions, expirations and invalidations',
+    ['event']
+)
+CACHE_ENTRIES = Gauge(
+    'lokiplus_cache_entries', 'Entries in the cache as seen by each worker', multiprocess_mode='liveall'
+)
+BCRYPT_LATENCY = Histogram(
+    'lokiplus_bcrypt_duration_seconds', 'bcrypt work including queueing for the hashing pool',
+    ['operation'], buckets=BCRYPT_BUCKETS
+)
+BCRYPT_REJECTED = Counter(
+    'lokiplus_bcrypt_rejected', 'Hashing requests refused because the queue was full'
+)
+
+GAUGE_INTERVAL = 1.0  # seconds between cache size refreshes per worker
+_gauges_updated = 0.0
+
+
+def observe_request(endpoint: str, method: str, status: int, seconds: float):
+    """Record one served request (also used by the async handlers in asgi.py)"""
+    HTTP_REQUESTS.labels(endpoint, method, str(status)).inc()
+    HTTP_LATENCY.labels(endpoint).observe(seconds)
+    update_gauges()
+
+
+def _observe_supabase(http_request, response, seconds, error):
+    table, operation = describe_request(http_request)
+    status = str(response.status_code) if response is not None else 'error'
+    SUPABASE_LATENCY.labels(table, operation, status).observe(seconds)
+
+
+def update_gauges(force: bool = False):
+    """Refresh gauges read from other components, at most once per GAUGE_INTERVAL"""
+    global _gauges_updated
+    now = time.monotonic()
+    if not force and now - _gauges_updated < GAUGE_INTERVAL:
+        return
+    _gauges_updated = now
+    try:
+        CACHE_ENTRIES.set(cache.stats()['size'])
+    except Exception as e:
+        logger.warning(f"Could not read cache size: {e}")
+
+
+def init_app(app):
+    """Count and time every request of ``app`` and hook the cache, hasher and Supabase transport"""
+    if not Config.METRICS_ENABLED:
+        return
+
+    def start_timer():
+        g._metrics_started = time.perf_counter()
+
+    def record_response(response):
+        started = g.pop('_metrics_started', None)
+        if started is not None and request.endpoint != 'static':
+            observe_request(request.endpoint or 'unmatched', request.method,
+                            response.status_code, time.perf_counter() - started)
+        return response
+
+    app.before_request(start_timer)
+    app.after_request(record_response)
+
+    cache.on_event = lambda event, amount: CACHE_EVENTS.labels(event).inc(amount)
+    password_hasher.on_timing = lambda operation, seconds: BCRYPT_LATENCY.labels(operation).observe(seconds)
+    password_hasher.on_reject = BCRYPT_REJECTED.inc
+    add_request_observer(_observe_supabase)
+
+
+def collect_registry(path: Optional[str] = None):
+    """Registry merging every worker's samples, or this process's registry"""
+    path = path or os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if not path:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=path)
+    return registry
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Get the OpenMetrics exposition body and its content type"""
+    update_gauges(force=True)
+    return generate_latest(collect_registry()), CONTENT_TYPE_LATEST
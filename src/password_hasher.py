@@ -0,0 +1,231 @@
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import bcrypt
+
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; the slots are then per process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class HasherBusy(Exception):
+    """Raised when every hashing slot is taken; callers should answer 503"""
+
+    def __init__(self, retry_after: int):
+        super().__init__('Password hashing queue is full')
+        self.retry_after = retry_after
+
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+# Every HashSlots, reset by one fork hook instead of a hook per instance
+_instances: "weakref.WeakSet[HashSlots]" = weakref.WeakSet()
+
+
+class HashSlots:
+    """A host-wide limit on bcrypt operations running at once.
+
+    Slot ``i`` is an exclusive ``flock`` on ``<directory>/slot-<i>.lock``, so
+    every gunicorn worker on the host draws from the same ``count`` slots,
+    and the kernel frees a slot if its worker dies. ``flock`` locks belong
+    to an open file, which the threads of a process share, so each slot also
+    has a thread lock. Without ``fcntl`` the slots only limit this process.
+    """
+
+    def __init__(self, count: int, directory: str):
+        self.count = count
+        self.directory = directory
+        self._reset()
+        _instances.add(self)
+
+    def _reset(self):
+        # The parent's open files (and the locks on them) are not this process's
+        self._files: Dict[int, int] = {}
+        self._locks = [threading.Lock() for _ in range(self.count)]
+        self._open_lock = threading.Lock()
+
+    def _file(self, slot: int) -> int:
+        with self._open_lock:
+            if slot not in self._files:
+                os.makedirs(self.directory, exist_ok=True)
+                self._files[slot] = os.open(os.path.join(self.directory, f'slot-{slot}.lock'),
+                                            os.O_RDWR | os.O_CREAT, 0o600)
+            return self._files[slot]
+
+    def acquire(self) -> Optional[int]:
+        """Take a free slot without waiting; None when all are taken"""
+        for slot in range(self.count):
+            if not self._locks[slot].acquire(blocking=False):
+                continue
+            if fcntl is None:
+                return slot
+            try:
+                fcntl.flock(self._file(slot), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return slot
+            except BlockingIOError:
+                self._locks[slot].release()
+            except OSError as e:
+                # An unusable lock directory must not block sign-ups
+                logger.warning(f"Hashing slot {slot} unavailable, limiting this process only: {e}")
+                return slot
+        return None
+
+    def release(self, slot: int):
+        if fcntl is not None and slot in self._files:
+            fcntl.flock(self._files[slot], fcntl.LOCK_UN)
+        self._locks[slot].release()
+
+
+def _after_fork_in_child():
+    for slots in list(_instances):
+        slots._reset()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class PasswordHasher:
+    """bcrypt hashing with host-wide backpressure.
+
+    At most ``max_pending`` bcrypt operations run at once across all workers
+    on the host (see :class:`HashSlots`). Beyond that :class:`HasherBusy` is
+    raised instead of piling more CPU work onto the host. A single hash
+    runs in the calling thread. bcrypt releases the GIL, so handing it to
+    another thread and waiting would gain nothing. ``hash_many`` spreads a
+    batch over a pool of ``pool_size`` threads; ``pool_size=0`` hashes the
+    batch in the calling thread.
+    """
+
+    def __init__(self, rounds: int = 12, pool_size: int = 2, max_pending: int = 8,
+                 timeout: float = 30, retry_after: int = 5, slots_dir: str = Config.BCRYPT_SLOTS_DIR):
+        self.rounds = rounds
+        self.pool_size = pool_size
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = HashSlots(max_pending, slots_dir)
+        self._stats = {'hashed': 0, 'verified': 0, 'rejected': 0, 'total_time': 0.0}
+        self._seconds_per_hash: Optional[float] = None
+        # Optional hooks (see metrics.py): ``on_timing(operation, seconds)``, ``on_reject()``
+        self.on_timing: Optional[Callable[[str, float], None]] = None
+        self.on_reject: Optional[Callable[[], None]] = None
+
+    def _get_executor(self) -> Optional[ThreadPoolExecutor]:
+        if self.pool_size <= 0:
+            return None
+        with self._lock:
+            # Threads do not survive fork; each gunicorn worker gets its own pool
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='bcrypt')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, operation: str, func, *args):
+        slot = self._slots.acquire()
+        if slot is None:
+            with self._lock:
+                self._stats['rejected'] += 1
+            if self.on_reject is not None:
+                self.on_reject()
+            raise HasherBusy(self.retry_after)
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._slots.release(slot)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._stats['total_time'] += elapsed
+            if self.on_timing is not None:
+                self.on_timing(operation, elapsed)
+
+    def seconds_per_hash(self) -> float:
+        """Time one hash takes at ``rounds`` on this host (measured once per process)"""
+        if self._seconds_per_hash is None:
+            start = time.perf_counter()
+            _hashpw(b'calibration', self.rounds)
+            self._seconds_per_hash = time.perf_counter() - start
+        return self._seconds_per_hash
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured cost factor"""
+        hashed = self._run('hash', _hashpw, password.encode('utf-8'), self.rounds)
+        with self._lock:
+            self._stats['hashed'] += 1
+        return hashed.decode('utf-8')
+
+    def hash_many(self, passwords: List[str]) -> List[str]:
+        """Hash a batch of passwords, spread over the thread pool.
+
+        The batch takes a single slot, so a bulk import cannot starve
+        interactive requests of more than one slot.
+        """
+        if not passwords:
+            return []
+        encoded = [password.encode('utf-8') for password in passwords]
+        hashed = self._run('hash_many', self._hash_batch, encoded)
+        with self._lock:
+            self._stats['hashed'] += len(passwords)
+        return [value.decode('utf-8') for value in hashed]
+
+    def _hash_batch(self, encoded: List[bytes]) -> List[bytes]:
+        executor = self._get_executor()
+        if executor is None:
+            return [_hashpw(password, self.rounds) for password in encoded]
+        return list(executor.map(_hashpw, encoded, [self.rounds] * len(encoded),
+                                 timeout=self.timeout * len(encoded)))
+
+    def verify(self, password: str, hashed: str) -> bool:
+        """Verify a password against its hash"""
+        result = self._run('verify', _checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+        with self._lock:
+            self._stats['verified'] += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hashing counters and pool settings"""
+        with self._lock:
+            stats = dict(self._stats)
+        operations = stats['hashed'] + stats['verified']
+        stats.update({
+            'rounds': self.rounds,
+            'pool_size': self.pool_size,
+            'max_pending': self.max_pending,
+            'host_wide': fcntl is not None,
+            'avg_time': stats['total_time'] / operations if operations else None
+        })
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# Create a global instance
+password_hasher = PasswordHasher(
+    rounds=Config.BCRYPT_ROUNDS,
+    pool_size=Config.BCRYPT_POOL_SIZE,
+    max_pending=Config.BCRYPT_MAX_PENDING,
+    retry_after=Config.BCRYPT_RETRY_AFTER
+)
@@ -0,0 +1,223 @@
+"""
+Flask-Limiter storage shared by every gunicorn worker on the host.
+
+The default ``memory://`` storage keeps counters per worker, so each worker
+enforced the full limit on its own and the counters of every client IP that
+ever called stayed in memory. ``SQLiteStorage`` keeps them in one WAL-mode
+SQLite file instead (``sqlite:///path/to/file``), which also makes it a
+drop-in stand-in for Redis in tests and single-host deployments.
+
+It supports the fixed-window and sliding-window-counter strategies. Every
+counter carries an expiry; expired rows are swept at most once per
+``sweep_interval`` seconds per worker, so idle client IPs do not accumulate.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from math import floor
+from typing import Any, Dict, Optional, Tuple
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """Rate limit counters in a local SQLite file shared by all workers.
+
+    Connections are opened lazily per process and thread (as in
+    ``cache.SQLiteCache``), so a limiter created before gunicorn forks is safe
+    to use in the workers. Each acquisition runs in one ``BEGIN IMMEDIATE``
+    transaction, so concurrent workers never both take the last slot.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS ratelimit_counters (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_ratelimit_counters_expires_at
+            ON ratelimit_counters(expires_at);
+    """
+
+    def __init__(self, uri: Optional[str] = None, wrap_exceptions: bool = False,
+                 sweep_interval: Optional[float] = None, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        # sqlite:///tmp/limits.sqlite3 -> /tmp/limits.sqlite3
+        self.path = uri.split('://', 1)[1] if uri and '://' in uri else uri
+        if not self.path:
+            raise ValueError(f"SQLite rate limit storage needs a file path, got '{uri}'")
+        self.sweep_interval = float(Config.RATELIMIT_SWEEP_INTERVAL if sweep_interval is None else sweep_interval)
+        self._local = threading.local()
+        self._swept_at = 0.0
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        # Never reuse a connection inherited across fork; transactions are explicit
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(self.SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _transaction(self, conn: sqlite3.Connection):
+        conn.execute('BEGIN IMMEDIATE')
+        return _Transaction(conn)
+
+    def _read(self, conn: sqlite3.Connection, key: str, now: float) -> int:
+        row = conn.execute(
+            'SELECT value FROM ratelimit_counters WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _add(self, conn: sqlite3.Connection, key: str, expiry: float, amount: int, now: float) -> int:
+        # An expired row restarts from ``amount`` with a fresh expiry, as if it had been swept
+        return conn.execute(
+            'INSERT INTO ratelimit_counters (key, value, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET '
+            'value = CASE WHEN expires_at <= ? THEN excluded.value ELSE value + excluded.value END, '
+            'expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END '
+            'RETURNING value',
+            (key, amount, now + expiry, now, now)
+        ).fetchone()[0]
+
+    def _maybe_sweep(self, conn: sqlite3.Connection, now: float):
+        if now - self._swept_at < self.sweep_interval:
+            return
+        self._swept_at = now
+        removed = conn.execute('DELETE FROM ratelimit_counters WHERE expires_at <= ?', (now,)).rowcount
+        if removed:
+            logger.debug(f"Swept {removed} expired rate limit counters")
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        conn = self._connect()
+        now = time.time()
+        with self._transaction(conn):
+            value = self._add(conn, key, expiry, amount, now)
+            self._maybe_sweep(conn, now)
+        return value
+
+    def get(self, key: str) -> int:
+        return self._read(self._connect(), key, time.time())
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._connect().execute(
+            'SELECT expires_at FROM ratelimit_counters WHERE key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        try:
+            self._connect().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        conn = self._connect()
+        with self._transaction(conn):
+            return conn.execute('DELETE FROM ratelimit_counters').rowcount
+
+    def clear(self, key: str) -> None:
+        self._connect().execute('DELETE FROM ratelimit_counters WHERE key = ?', (key,))
+
+    def _window(self, conn: sqlite3.Connection, key: str, expiry: int,
+                now: float) -> Tuple[int, float, int, float]:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._read(conn, previous_key, now)
+        current_count = self._read(conn, current_key, now)
+        # Same arithmetic as limits' MemoryStorage: time left until the previous window stops counting
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        conn = self._connect()
+        now = time.time()
+        with self._transaction(conn):
+            previous_count, previous_ttl, current_count, _ = self._window(conn, key, expiry, now)
+            if floor(previous_count * previous_ttl / expiry + current_count) + amount > limit:
+                return False
+            # The current window's counter is still read as the previous one for another window
+            self._add(conn, self.sliding_window_keys(key, expiry, now)[1], 2 * expiry, amount, now)
+            self._maybe_sweep(conn, now)
+        return True
+
+    def get_sliding_window(self, key: str, expiry: int) -> Tuple[int, float, int, float]:
+        return self._window(self._connect(), key, expiry, time.time())
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        for window_key in self.sliding_window_keys(key, expiry, time.time()):
+            self.clear(window_key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Tracked keys and the storage they take, in total and per key"""
+        conn = self._connect()
+        now = time.time()
+        keys, key_bytes = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(key AS BLOB))), 0) '
+            'FROM ratelimit_counters WHERE expires_at > ?', (now,)
+        ).fetchone()
+        expired = conn.execute(
+            'SELECT COUNT(*) FROM ratelimit_counters WHERE expires_at <= ?', (now,)
+        ).fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        used_pages = (conn.execute('PRAGMA page_count').fetchone()[0]
+                      - conn.execute('PRAGMA freelist_count').fetchone()[0])
+        file_bytes = used_pages * page_size
+        rows = keys + expired
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'keys': keys,
+            'expired_pending_sweep': expired,
+            'file_bytes': file_bytes,
+            # Key text plus the two numeric columns, then what the B-tree pages cost per row
+            'payload_bytes_per_key': round(key_bytes / keys + 16, 1) if keys else 0,
+            'bytes_per_key': round(file_bytes / rows, 1) if rows else 0,
+        }
+
+
+class _Transaction:
+    """Commit on success, roll back on error, for a connection in autocommit mode"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+def storage_stats(storage) -> Dict[str, Any]:
+    """``stats()`` of the limiter's storage, or what can be told about other backends"""
+    if isinstance(storage, SQLiteStorage):
+        return storage.stats()
+    stats = {'backend': type(storage).__name__}
+    counters = getattr(storage, 'storage', None)
+    if isinstance(counters, dict):
+        # limits' MemoryStorage: per-worker counters only
+        stats['keys'] = len(counters)
+    return stats
@@ -0,0 +1,133 @@
+"""
+Renewal queries: clients due within N days, overdue clients and weekly counts.
+
+``renewal_date`` is when a client's subscription runs out. Each query is a
+range over ``idx_clients_status_renewal_date (status, renewal_date, id)``
+(see database/schema.sql), paged with a ``<renewal_date>,<id>`` keyset
+cursor, so the database returns just the rows on the page instead of the
+whole clients table. Bulk renewals (``/renew_clients``) are validated here
+and run as one set-based UPDATE in the ``renew_clients`` SQL function.
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from config import Config
+from db import get_backend
+
+Cursor = Tuple[date, int]
+
+
+def _today() -> date:
+    return datetime.utcnow().date()
+
+
+def week_start(day: date) -> date:
+    """Monday of the week ``day`` falls in"""
+    return day - timedelta(days=day.weekday())
+
+
+def _parse_date(value: Any, name: str) -> date:
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f'{name} must be a YYYY-MM-DD date')
+
+
+def bulk_renewal_params(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate a bulk renewal request into ``renew_clients`` arguments; raises ValueError.
+
+    The request names the clients with either ``client_ids`` or ``due_before``
+    (plus an optional ``status``, default ``active``), and the new date with
+    either ``renewal_date`` or ``extend_months``.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    if ('client_ids' in data) == ('due_before' in data):
+        raise ValueError('Provide either client_ids or due_before')
+    if ('renewal_date' in data) == ('extend_months' in data):
+        raise ValueError('Provide either renewal_date or extend_months')
+
+    params = {'p_client_ids': None, 'p_due_before': None, 'p_status': data.get('status', 'active'),
+              'p_renewal_date': None, 'p_extend_months': None}
+    if 'client_ids' in data:
+        client_ids = data['client_ids']
+        if (not isinstance(client_ids, list) or not client_ids
+                or not all(isinstance(i, int) and not isinstance(i, bool) for i in client_ids)):
+            raise ValueError('client_ids must be a non-empty list of integers')
+        if len(client_ids) > Config.RENEW_MAX_CLIENT_IDS:
+            raise ValueError(f'At most {Config.RENEW_MAX_CLIENT_IDS} client_ids per request')
+        params['p_client_ids'] = client_ids
+    else:
+        params['p_due_before'] = _parse_date(data['due_before'], 'due_before').isoformat()
+
+    if 'renewal_date' in data:
+        params['p_renewal_date'] = _parse_date(data['renewal_date'], 'renewal_date').isoformat()
+    else:
+        months = data['extend_months']
+        if not isinstance(months, int) or isinstance(months, bool) or not 1 <= months <= 120:
+            raise ValueError('extend_months must be an integer between 1 and 120')
+        params['p_extend_months'] = months
+    return params
+
+
+def parse_cursor(value: Optional[str]) -> Optional[Cursor]:
+    """Parse a ``YYYY-MM-DD,<id>`` cursor; raises ValueError if malformed"""
+    if value in (None, ''):
+        return None
+    try:
+        day, client_id = value.split(',', 1)
+        return date.fromisoformat(day), int(client_id)
+    except ValueError:
+        raise ValueError('Parameter after must be a <renewal_date>,<id> cursor')
+
+
+def format_cursor(client: Dict[str, Any]) -> str:
+    return f"{str(client['renewal_date'])[:10]},{client['id']}"
+
+
+def _page(status: str, start: Optional[date], before: Optional[date],
+          after: Optional[Cursor], limit: int) -> Dict[str, Any]:
+    clients = get_backend().clients_by_renewal(status, start, before, after, limit)
+    return {
+        'status': 'success',
+        'clients': clients,
+        'next_cursor': format_cursor(clients[-1]) if len(clients) == limit else None,
+        'limit': limit
+    }
+
+
+def due_clients(days: int, status: str = 'active', after: Optional[Cursor] = None,
+                limit: int = Config.CLIENTS_PAGE_SIZE, today: Optional[date] = None) -> Dict[str, Any]:
+    """Clients whose renewal date is between today and ``days`` days from now, soonest first"""
+    today = today or _today()
+    until = today + timedelta(days=days)
+    payload = _page(status, today, until + timedelta(days=1), after, limit)
+    payload.update({'from': today.isoformat(), 'to': until.isoformat()})
+    return payload
+
+
+def overdue_clients(status: str = 'active', after: Optional[Cursor] = None,
+                    limit: int = Config.CLIENTS_PAGE_SIZE, today: Optional[date] = None) -> Dict[str, Any]:
+    """Clients whose renewal date has passed, longest overdue first"""
+    today = today or _today()
+    payload = _page(status, None, today, after, limit)
+    payload['before'] = today.isoformat()
+    return payload
+
+
+def weekly_counts(weeks: int, status: str = 'active', today: Optional[date] = None) -> Dict[str, Any]:
+    """Renewals per week (Monday to Sunday) for ``weeks`` weeks from the current one"""
+    start = week_start(today or _today())
+    counts = {
+        str(row['week_start'])[:10]: row['client_count']
+        for row in get_backend().renewal_week_counts(status, start, weeks)
+    }
+    buckets = []
+    for n in range(weeks):
+        monday = (start + timedelta(weeks=n)).isoformat()
+        buckets.append({'week_start': monday, 'clients': counts.get(monday, 0)})
+    return {
+        'status': 'success',
+        'weeks': buckets,
+        'total': sum(bucket['clients'] for bucket in buckets)
+    }
@@ -1,36 +1,211 @@
 import logging
-from datetime import datetime, timedelta
+import threading
+from bisect import bisect_left
+from datetime import datetime
 from functools import wraps
-from flask import request, current_app
+from typing import Any, Dict, List, Optional
+from flask import request, current_app, g
 import time
 
+from config import Config
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class RouteManager:
+# Log-spaced latency buckets: 0.1ms up to ~105s, four per doubling, so a
+# percentile read from a bucket bound is within ~19% of the true value.
+BUCKET_BOUNDS = tuple(0.0001 * 2 ** (i / 4) for i in range(81))
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (seconds in, milliseconds out)"""
+    __slots__ = ('counts', 'count', 'total', 'max')
+
     def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)  # last bucket: overflow
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        for i, value in enumerate(other.counts):
+            if value:
+                self.counts[i] += value
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Upper bound of the bucket holding the ``pct`` percentile, capped at the max"""
+        if not self.count:
+            return None
+        rank = pct / 100 * self.count
+        seen = 0
+        for i, value in enumerate(self.counts):
+            seen += value
+            if seen >= rank and value:
+                bound = BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        def ms(seconds):
+            return round(seconds * 1000, 3) if seconds is not None else None
+        return {
+            'count': self.count,
+            'mean_ms': ms(self.total / self.count) if self.count else None,
+            'p50_ms': ms(self.percentile(50)),
+            'p90_ms': ms(self.percentile(90)),
+            'p99_ms': ms(self.percentile(99)),
+            'max_ms': ms(self.max) if self.count else None
+        }
+
+
+class RollingHistogram:
+    """Ring of per-slot histograms; any window up to ``horizon`` seconds can be merged on read"""
+
+    def __init__(self, horizon: float, slot_seconds: float):
+        self.slot_seconds = slot_seconds
+        self.size = max(1, int(horizon // slot_seconds))
+        self.slots = [LatencyHistogram() for _ in range(self.size)]
+        self.epochs = [-1] * self.size
+
+    def record(self, seconds: float, now: float):
+        epoch = int(now // self.slot_seconds)
+        index = epoch % self.size
+        if self.epochs[index] != epoch:
+            # Slot last used a full ring ago: start it over
+            self.slots[index] = LatencyHistogram()
+            self.epochs[index] = epoch
+        self.slots[index].record(seconds)
+
+    def window(self, seconds: float, now: float) -> LatencyHistogram:
+        current = int(now // self.slot_seconds)
+        oldest = current - min(self.size, max(1, int(seconds // self.slot_seconds))) + 1
+        merged = LatencyHistogram()
+        for epoch, histogram in zip(self.epochs, self.slots):
+            if oldest <= epoch <= current:
+                merged.merge(histogram)
+        return merged
+
+
+def _window_label(seconds: float) -> str:
+    return f"{int(seconds // 60)}m" if seconds % 60 == 0 else f"{int(seconds)}s"
+
+
+class RouteStats:
+    """Counters and latency histograms of one endpoint, updated under its own lock"""
+
+    def __init__(self, windows: List[float], slot_seconds: float):
+        self.lock = threading.Lock()
+        self.windows = windows
+        self.total_calls = 0
+        self.failed_calls = 0
+        self.status = 'healthy'
+        self.last_check = None
+        self.last_error = None
+        self.lifetime = LatencyHistogram()
+        self.recent = RollingHistogram(max(windows), slot_seconds)
+
+    def record(self, seconds: float, failed: bool = False, error: Optional[str] = None):
+        now = time.monotonic()
+        with self.lock:
+            self.total_calls += 1
+            self.lifetime.record(seconds)
+            self.recent.record(seconds, now)
+            if failed:
+                self.failed_calls += 1
+                self.status = 'unhealthy'
+                self.last_error = error
+            else:
+                self.status = 'healthy'
+            self.last_check = datetime.now()
+
+    def report(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self.lock:
+            latency = {_window_label(window): self.recent.window(window, now).summary()
+                       for window in self.windows}
+            latency['all'] = self.lifetime.summary()
+            return {
+                'status': self.status,
+                'last_check': self.last_check,
+                'last_error': self.last_error,
+                'total_calls': self.total_calls,
+                'failed_calls': self.failed_calls,
+                'avg_response_time': self.lifetime.total / self.total_calls if self.total_calls else 0,
+                'latency': latency
+            }
+
+
+class RouteManager:
+    def __init__(self, windows: List[float] = Config.ROUTE_LATENCY_WINDOWS,
+                 slot_seconds: float = Config.ROUTE_LATENCY_SLOT):
         self.routes = {}
+        self.stats: Dict[str, RouteStats] = {}
+        self.windows = sorted(windows)
+        self.slot_seconds = slot_seconds
+        self.installed = False
+        self._lock = threading.Lock()
         self.start_time = datetime.now()
 
+    def _stats_for(self, endpoint: str) -> RouteStats:
+        stats = self.stats.get(endpoint)
+        if stats is None:
+            with self._lock:
+                stats = self.stats.get(endpoint)
+                if stats is None:
+                    stats = self.stats[endpoint] = RouteStats(self.windows, self.slot_seconds)
+        return stats
+
+    def record(self, endpoint: str, seconds: float, failed: bool = False, error: Optional[str] = None):
+        """Record one call of ``endpoint`` that took ``seconds``"""
+        self._stats_for(endpoint).record(seconds, failed, error)
+
+    def init_app(self, app):
+        """Time every request of ``app`` through request hooks.
+
+        Latency is measured up to the point the response is handed to the
+        server, so streamed bodies count only until their first chunk.
+        """
+        def start_timer():
+            g._route_started = time.perf_counter()
+
+        def record_response(response):
+            started = g.pop('_route_started', None)
+            if started is not None and request.endpoint != 'static':
+                failed = response.status_code >= 500
+                self.record(request.endpoint or 'unmatched', time.perf_counter() - started,
+                            failed, f"HTTP {response.status_code}" if failed else None)
+            return response
+
+        app.before_request(start_timer)
+        app.after_request(record_response)
+        self.installed = True
+
     def monitor(self, route=None, required_params=None, description=None):
-        """Decorator to monitor route performance and validate parameters"""
+        """Decorator to validate parameters and describe a route; its latency is
+        recorded by the request hooks, or by the decorator when none are installed"""
         def decorator(f):
             # Register the route
             endpoint = route or f.__name__
             self.routes[endpoint] = {
                 'description': description or f.__doc__ or 'No description',
-                'required_params': required_params or {},
-                'status': 'healthy',
-                'last_check': None,
-                'total_calls': 0,
-                'failed_calls': 0,
-                'avg_response_time': 0
+                'required_params': required_params or {}
             }
 
             @wraps(f)
             def wrapper(*args, **kwargs):
-                start_time = time.time()
+                start_time = time.perf_counter()
                 try:
                     # Validate required parameters
                     if required_params and request.method in required_params:
@@ -71,43 +246,43 @@ class RouteManager:
                                     raise ValueError(f"Parameter {param} must be a boolean")
                             
                     result = f(*args, **kwargs)
-                    
-                    # Update statistics
-                    self.routes[endpoint]['total_calls'] += 1
-                    response_time = time.time() - start_time
-                    avg_time = self.routes[endpoint]['avg_response_time']
-                    self.routes[endpoint]['avg_response_time'] = (
-                        (avg_time * (self.routes[endpoint]['total_calls'] - 1) + response_time) /
-                        self.routes[endpoint]['total_calls']
-                    )
-                    self.routes[endpoint]['status'] = 'healthy'
-                    self.routes[endpoint]['last_check'] = datetime.now()
-                    
+                    if not self.installed:
+                        self.record(endpoint, time.perf_counter() - start_time)
                     return result
-                    
+
                 except Exception as e:
-                    # Update error statistics
-                    self.routes[endpoint]['failed_calls'] += 1
-                    self.routes[endpoint]['status'] = 'unhealthy'
-                    self.routes[endpoint]['last_error'] = str(e)
-                    self.routes[endpoint]['last_check'] = datetime.now()
+                    if not self.installed:
+                        self.record(endpoint, time.perf_counter() - start_time, True, str(e))
                     logger.error(f"Route {endpoint} failed: {e}")
                     raise
-                    
+
             return wrapper
         return decorator
 
+    def summary(self) -> Dict[str, Any]:
+        """Healthy/total route counts without computing percentiles"""
+        statuses = [stats.status for stats in list(self.stats.values())]
+        healthy = statuses.count('healthy')
+        return {
+            'status': 'healthy' if healthy == len(statuses) else 'degraded',
+            'total': len(statuses),
+            'healthy': healthy
+        }
+
     def generate_report(self):
-        """Generate a report of all routes and their health status"""
+        """Generate a report of all routes, their health status and latency percentiles"""
         try:
-            total_routes = len(self.routes)
-            healthy_routes = sum(1 for r in self.routes.values() if r['status'] == 'healthy')
-            
+            routes = {}
+            for endpoint, stats in list(self.stats.items()):
+                routes[endpoint] = {**self.routes.get(endpoint, {}), **stats.report()}
+            total_routes = len(routes)
+            healthy_routes = sum(1 for r in routes.values() if r['status'] == 'healthy')
+
             return {
                 'status': 'healthy' if healthy_routes == total_routes else 'degraded',
                 'total': total_routes,
                 'healthy': healthy_routes,
-                'routes': self.routes
+                'routes': routes
             }
         except Exception as e:
             logger.error(f"Error generating route report: {e}")
@@ -120,4 +295,4 @@ class RouteManager:
             }
 
 # Create a global instance
-route_manager = RouteManager() 
\ No newline at end of file
+route_manager = RouteManager()
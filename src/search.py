@@ -0,0 +1,176 @@
+"""
+Search over client names and emails and account emails.
+
+The database path calls the ``search_directory`` SQL function, which is
+served by the pg_trgm GIN indexes in database/schema.sql. ``PrefixIndex`` is
+the in-process fallback: a sorted token list (prefix matches by bisection)
+plus a trigram posting list (fuzzy matches), built from the cached dashboard
+data. The index is rebuilt whenever the cached dashboard entry is reloaded,
+which happens after every write.
+"""
+import logging
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set
+
+from cache import cache, DASHBOARD_KEY, DASHBOARD_TAG
+from config import Config
+from conditional_get import versioned_key
+from dashboard import DASHBOARD_TABLES, load_dashboard
+from db import get_backend
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('all', 'client', 'account')
+_WORD = re.compile(r'[^\W_]+')
+
+
+def trigrams(word: str) -> Set[str]:
+    """pg_trgm style trigrams of one word: two spaces before, one after"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PrefixIndex:
+    """In-memory search index over accounts and clients.
+
+    Prefix lookups bisect a sorted list of (token, entry) pairs, where the
+    tokens are each lower-cased email, name and name word. Fuzzy lookups
+    count shared trigrams through a posting list and keep the words whose
+    similarity reaches ``threshold``.
+    """
+
+    def __init__(self, accounts: List[Dict[str, Any]], clients: List[Dict[str, Any]],
+                 threshold: float = 0.3):
+        self.threshold = threshold
+        self.entries = [
+            {'kind': 'client', 'id': c['id'], 'name': c.get('name'), 'email': c.get('email')}
+            for c in clients
+        ] + [
+            {'kind': 'account', 'id': a['id'], 'name': None, 'email': a.get('email')}
+            for a in accounts
+        ]
+        tokens = set()
+        words: Dict[str, Set[int]] = {}
+        for position, entry in enumerate(self.entries):
+            email = (entry['email'] or '').lower()
+            name = (entry['name'] or '').lower()
+            # Whole-string tokens rank above a match on a later word of the name
+            for token in {email, name} - {''}:
+                tokens.add((token, position, 1.0))
+            for word in name.split()[1:]:
+                tokens.add((word, position, 0.5))
+            for word in _WORD.findall(f"{name} {email}"):
+                words.setdefault(word, set()).add(position)
+        self.tokens = sorted(tokens)
+        self.words = words
+        self._postings: Optional[Dict[str, List[str]]] = None
+        self._sizes: Dict[str, int] = {}
+
+    def _trigram_postings(self) -> Dict[str, List[str]]:
+        # Built on the first fuzzy search only
+        if self._postings is None:
+            postings: Dict[str, List[str]] = {}
+            for word in self.words:
+                word_trigrams = trigrams(word)
+                self._sizes[word] = len(word_trigrams)
+                for trigram in word_trigrams:
+                    postings.setdefault(trigram, []).append(word)
+            self._postings = postings
+        return self._postings
+
+    def _prefix_scores(self, query: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+        for i in range(bisect_left(self.tokens, (query,)), len(self.tokens)):
+            token, position, score = self.tokens[i]
+            if not token.startswith(query):
+                break
+            scores[position] = max(score, scores.get(position, 0.0))
+        return scores
+
+    def _fuzzy_scores(self, query: str) -> Dict[int, float]:
+        postings = self._trigram_postings()
+        scores: Dict[int, float] = {}
+        for query_word in _WORD.findall(query) or [query]:
+            wanted = trigrams(query_word)
+            shared = Counter(word for trigram in wanted for word in postings.get(trigram, ()))
+            for word, count in shared.items():
+                # pg_trgm similarity: shared trigrams over all distinct trigrams of both words
+                score = count / (len(wanted) + self._sizes[word] - count)
+                if score < self.threshold:
+                    continue
+                for position in self.words[word]:
+                    scores[position] = max(score, scores.get(position, 0.0))
+        return scores
+
+    def search(self, query: str, fuzzy: bool = False, kind: str = 'all',
+               limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Matches ordered like ``search_directory``: score, then email, kind and id"""
+        query = query.lower()
+        scores = self._fuzzy_scores(query) if fuzzy else self._prefix_scores(query)
+        matches = [
+            dict(self.entries[position], score=round(score, 4))
+            for position, score in scores.items()
+            if kind == 'all' or self.entries[position]['kind'] == kind
+        ]
+        matches.sort(key=lambda m: (-m['score'], m['email'] or '', m['kind'], m['id']))
+        return matches[offset:offset + limit]
+
+
+_index: Optional[PrefixIndex] = None
+_index_source = None
+_index_lock = threading.Lock()
+
+
+def memory_index() -> PrefixIndex:
+    """The in-process index for the currently cached dashboard data"""
+    global _index, _index_source
+    data = cache.get_or_load(versioned_key(DASHBOARD_KEY, *DASHBOARD_TABLES), load_dashboard,
+                             tags=lambda data: [DASHBOARD_TAG])
+    with _index_lock:
+        if data is not _index_source:
+            _index = PrefixIndex(data.accounts, data.clients, Config.SEARCH_FUZZY_THRESHOLD)
+            _index_source = data
+        return _index
+
+
+def search(query: str, fuzzy: bool = False, kind: str = 'all',
+           limit: int = Config.SEARCH_PAGE_SIZE, offset: int = 0) -> Dict[str, Any]:
+    """Search clients and accounts; raises ValueError for invalid arguments"""
+    query = (query or '').strip()
+    if len(query) < Config.SEARCH_MIN_LENGTH:
+        raise ValueError(f'Query must be at least {Config.SEARCH_MIN_LENGTH} characters')
+    if kind not in KINDS:
+        raise ValueError(f"Parameter kind must be one of {', '.join(KINDS)}")
+    if limit < 1 or offset < 0:
+        raise ValueError('Parameter limit must be positive and offset not negative')
+    if offset >= Config.SEARCH_MAX_RESULTS:
+        raise ValueError(f'Results are capped at {Config.SEARCH_MAX_RESULTS}')
+    limit = min(limit, Config.SEARCH_MAX_RESULTS - offset)
+
+    source = Config.SEARCH_BACKEND
+    if source == 'memory':
+        results = memory_index().search(query, fuzzy, kind, limit, offset)
+    else:
+        try:
+            results = get_backend().search(query, fuzzy, kind, limit, offset)
+            source = 'database'
+        except Exception as e:
+            if source != 'auto':
+                raise
+            logger.warning(f"Database search failed, using the in-process index: {e}")
+            results = memory_index().search(query, fuzzy, kind, limit, offset)
+            source = 'memory'
+
+    end = offset + len(results)
+    return {
+        'status': 'success',
+        'query': query,
+        'mode': 'fuzzy' if fuzzy else 'prefix',
+        'source': source,
+        'results': results,
+        'next_offset': end if len(results) == limit and end < Config.SEARCH_MAX_RESULTS else None,
+        'limit': limit
+    }
@@ -8,7 +8,8 @@ const API_ENDPOINTS = {
     healthLive: `${API_URL}/health/live`,
     accounts: `${API_URL}/accounts`,
     clients: `${API_URL}/clients`,
-    accountClients: `${API_URL}/account-clients`
+    accountClients: `${API_URL}/account-clients`,
+    events: `${API_URL}/events`
 };
 
 // Status check configuration
@@ -0,0 +1,58 @@
+// Change feed client for /events (Server-Sent Events).
+//
+// Only one tab per browser keeps the stream open: the tabs elect a leader with
+// the Web Locks API and the leader forwards every event to the others over a
+// BroadcastChannel. When the leader closes, its lock is released and the next
+// tab takes over. Browsers without these APIs open a stream per tab.
+const LokiEvents = (function() {
+    const EVENT_TYPES = [
+        'account_added', 'account_updated', 'account_deleted', 'accounts_imported',
+        'client_added', 'client_linked', 'client_unlinked', 'clients_renewed', 'clients_imported',
+        'health', 'reset'
+    ];
+    const handlers = {};
+
+    function on(type, handler) {
+        (handlers[type] = handlers[type] || []).push(handler);
+    }
+
+    function dispatch(type, data) {
+        (handlers[type] || []).forEach(handler => {
+            try {
+                handler(data);
+            } catch (error) {
+                console.error(`Error handling ${type} event:`, error);
+            }
+        });
+    }
+
+    // The browser reconnects on its own (sending Last-Event-ID) whenever the server ends the stream
+    function openStream(deliver) {
+        const source = new EventSource('/events');
+        EVENT_TYPES.forEach(type => {
+            source.addEventListener(type, event => deliver(type, JSON.parse(event.data)));
+        });
+        return source;
+    }
+
+    function start() {
+        if (!('EventSource' in window)) {
+            return;
+        }
+        if (!('locks' in navigator) || !('BroadcastChannel' in window)) {
+            openStream(dispatch);
+            return;
+        }
+        const channel = new BroadcastChannel('lokiplus-events');
+        channel.onmessage = message => dispatch(message.data.type, message.data.data);
+        // Held until the tab closes
+        navigator.locks.request('lokiplus-events', () => new Promise(() => {
+            openStream((type, data) => {
+                dispatch(type, data);
+                channel.postMessage({type, data});
+            });
+        }));
+    }
+
+    return {on, start};
+})();
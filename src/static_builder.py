@@ -2,6 +2,8 @@ import os
 from flask import Flask, render_template
 from flask.testing import FlaskClient
 from app import app, supabase
+from dashboard import DashboardData, load_dashboard_data
+from fragments import dashboard_fragments
 import shutil
 from pathlib import Path
 from datetime import datetime
@@ -18,26 +20,10 @@ def get_mock_data():
     
     try:
         # Try to get real data from Supabase
-        accounts_response = supabase.table('accounts').select('*').execute()
-        clients_response = supabase.table('clients').select('*').execute()
+        accounts, clients = load_dashboard_data(supabase)
         
-        mock_data['accounts'] = accounts_response.data
-        mock_data['clients'] = clients_response.data
-        
-        # Get client count for each account
-        for account in mock_data['accounts']:
-            count_result = supabase.table('account_clients').select(
-                'id', count='exact'
-            ).eq('account_id', account['id']).execute()
-            account['client_count'] = count_result.count or 0
-            
-            # Format the created_at date
-            if account.get('created_at'):
-                try:
-                    created_at = datetime.fromisoformat(account['created_at'].replace('Z', '+00:00'))
-                    account['created_at'] = created_at.strftime('%Y-%m-%d %H:%M:%S')
-                except Exception as e:
-                    account['created_at'] = account['created_at']
+        mock_data['accounts'] = accounts
+        mock_data['clients'] = clients
     except Exception as e:
         print(f"Warning: Could not fetch real data, using empty mock data: {e}")
         mock_data['db_error'] = True
@@ -76,6 +62,7 @@ def create_static_site():
             'index.html',
             accounts=mock_data['accounts'],
             clients=mock_data['clients'],
+            fragments=dashboard_fragments(DashboardData(mock_data['accounts'], mock_data['clients'])),
             db_error=mock_data['db_error'],
             error=mock_data['error']
         )
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+# The app modules use flat imports (PYTHONPATH=src in production)
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+# config.py builds the Supabase client at import time, so it needs credentials
+os.environ.setdefault('SUPABASE_URL', 'https://example.supabase.co')
+os.environ.setdefault('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiJ9.e30.test')
+
+from tests.fake_supabase import FakeSupabase  # noqa: E402
+
+
+@pytest.fixture
+def fake_db():
+    """An empty in-memory Supabase stand-in"""
+    return FakeSupabase({'accounts': [], 'clients': [], 'account_clients': []})
+
+
+@pytest.fixture
+def app_client(fake_db, monkeypatch):
+    """Flask test client with every module's Supabase client swapped for ``fake_db``"""
+    import config
+    import app as app_module
+    from cache import cache
+    from health_probe import health_prober
+    from email_index import email_index
+    import events
+    from fragments import fragment_cache
+
+    real_client = config.supabase
+    for module in list(sys.modules.values()):
+        if getattr(module, 'supabase', None) is real_client and module is not config:
+            monkeypatch.setattr(module, 'supabase', fake_db)
+    monkeypatch.setattr(app_module.limiter, 'enabled', False)
+    # Tests seed fake_db directly, behind the index's back; test_email_index turns it on
+    monkeypatch.setattr(email_index, 'enabled', False)
+    # A fresh in-process change feed per test instead of the host-wide log
+    monkeypatch.setattr(events, 'event_bus', events.EventBus(buffer_size=100))
+    app_module.app.config['TESTING'] = True
+    cache.clear()
+    fragment_cache.clear()
+    yield app_module.app.test_client()
+    cache.clear()
+    fragment_cache.clear()
+    # Forget the probe results (and stop the thread) taken against this fake_db
+    health_prober.stop()
+    health_prober._reset()
+    email_index.stop()
+    email_index._reset()
@@ -0,0 +1,530 @@
+"""
+In-memory stand-in for the Supabase client used by the tests and benchmarks.
+
+Only the subset of the PostgREST query builder the app relies on is
+implemented. Every ``execute()`` / ``rpc()`` call counts as one round trip so
+tests can assert on the number of requests a code path makes.
+"""
+import asyncio
+import copy
+import datetime
+import re
+import threading
+import time
+
+# Tables with a bump_table_version trigger (see database/schema.sql)
+VERSIONED_TABLES = {'accounts', 'clients', 'account_clients'}
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _singular(table):
+    return table[:-1] if table.endswith('s') else table
+
+
+def _split_columns(columns):
+    """Split a select string on top-level commas"""
+    parts, depth, current = [], 0, ''
+    for char in columns:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == ',' and depth == 0:
+            parts.append(current.strip())
+            current = ''
+        else:
+            current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _coerce(value, sample):
+    """Coerce filter values the way PostgREST would compare them"""
+    if isinstance(sample, bool) or sample is None or value is None:
+        return value
+    if isinstance(sample, int) and not isinstance(value, int):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+    if isinstance(sample, str) and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table_name = table
+        self.operation = None
+        self.columns = '*'
+        self.count_mode = None
+        self.payload = None
+        self.filters = []
+        self.order_by = []
+        self.limit_value = None
+        self.offset_value = 0
+
+    # Operations
+    def select(self, columns='*', count=None):
+        self.operation = self.operation or 'select'
+        self.columns = columns
+        self.count_mode = count
+        return self
+
+    def insert(self, rows):
+        self.operation = 'insert'
+        self.payload = rows
+        return self
+
+    def upsert(self, rows, on_conflict=None):
+        self.operation = 'upsert'
+        self.payload = rows
+        self.on_conflict = on_conflict or 'id'
+        return self
+
+    def update(self, values):
+        self.operation = 'update'
+        self.payload = values
+        return self
+
+    def delete(self):
+        self.operation = 'delete'
+        return self
+
+    # Filters
+    def _filter(self, column, op, value):
+        self.filters.append((column, op, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column, value):
+        return self._filter(column, 'neq', value)
+
+    def gt(self, column, value):
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column, value):
+        return self._filter(column, 'gte', value)
+
+    def lt(self, column, value):
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column, value):
+        return self._filter(column, 'lte', value)
+
+    def in_(self, column, values):
+        return self._filter(column, 'in', list(values))
+
+    def is_(self, column, value):
+        return self._filter(column, 'is', value)
+
+    def ilike(self, column, pattern):
+        return self._filter(column, 'ilike', pattern)
+
+    def like(self, column, pattern):
+        return self._filter(column, 'like', pattern)
+
+    def match(self, query):
+        for column, value in query.items():
+            self.eq(column, value)
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, size):
+        self.limit_value = size
+        return self
+
+    def range(self, start, end):
+        self.offset_value = start
+        self.limit_value = end - start + 1
+        return self
+
+    # Execution
+    def _matches(self, row):
+        for column, op, value in self.filters:
+            actual = row.get(column)
+            if op == 'in':
+                if actual not in [_coerce(v, actual) for v in value]:
+                    return False
+                continue
+            if op == 'is':
+                if actual is not value:
+                    return False
+                continue
+            if op in ('like', 'ilike'):
+                regex = '^' + re.escape(value).replace('%', '.*').replace('_', '.') + '$'
+                flags = re.IGNORECASE if op == 'ilike' else 0
+                if actual is None or not re.match(regex, str(actual), flags):
+                    return False
+                continue
+            value = _coerce(value, actual)
+            if op == 'eq' and actual != value:
+                return False
+            if op == 'neq' and actual == value:
+                return False
+            if actual is None and op in ('gt', 'gte', 'lt', 'lte'):
+                return False
+            if op == 'gt' and not actual > value:
+                return False
+            if op == 'gte' and not actual >= value:
+                return False
+            if op == 'lt' and not actual < value:
+                return False
+            if op == 'lte' and not actual <= value:
+                return False
+        return True
+
+    def _embed(self, row, name, inner):
+        table = self.db.tables.setdefault(name, [])
+        fk_back = f"{_singular(self.table_name)}_id"
+        fk_forward = f"{_singular(name)}_id"
+        if table and fk_back in table[0] or (not table and fk_forward not in row):
+            related = [r for r in table if r.get(fk_back) == row.get('id')]
+            if inner.strip() == 'count':
+                return [{'count': len(related)}]
+            return [self._project(name, r, inner) for r in related]
+        target = next((r for r in table if r.get('id') == row.get(fk_forward)), None)
+        return self._project(name, target, inner) if target else None
+
+    def _project(self, table, row, columns):
+        query = FakeQuery(self.db, table)
+        result = {}
+        for column in _split_columns(columns):
+            embedded = re.match(r'^(\w+)(?:!inner)?\((.*)\)$', column, re.DOTALL)
+            if column == '*':
+                result.update(copy.deepcopy(row))
+            elif embedded:
+                result[embedded.group(1)] = query._embed(row, embedded.group(1), embedded.group(2))
+            else:
+                result[column] = copy.deepcopy(row.get(column))
+        return result
+
+    def _apply_unique(self, table, row):
+        for column in self.db.unique.get(self.table_name, ()):
+            columns = column if isinstance(column, tuple) else (column,)
+            for existing in table:
+                if all(existing.get(c) == row.get(c) for c in columns):
+                    raise Exception(f'duplicate key value violates unique constraint on {self.table_name}')
+
+    def execute(self, blocking=True):
+        self.db.round_trip(self.table_name, self.operation, sleep=blocking)
+        with self.db.lock:
+            table = self.db.tables.setdefault(self.table_name, [])
+            if self.operation in ('insert', 'upsert', 'update', 'delete'):
+                self.db.bump_version(self.table_name)
+            if self.operation in ('insert', 'upsert'):
+                rows = self.payload if isinstance(self.payload, list) else [self.payload]
+                inserted = []
+                staged = []
+                for row in rows:
+                    row = dict(row)
+                    if self.operation == 'upsert':
+                        existing = next((r for r in table
+                                         if r.get(self.on_conflict) == row.get(self.on_conflict)), None)
+                        if existing is not None:
+                            existing.update(row)
+                            inserted.append(copy.deepcopy(existing))
+                            continue
+                    # A multi-row insert is one statement: all rows or none
+                    self._apply_unique(table + staged, row)
+                    staged.append(row)
+                for row in staged:
+                    row.setdefault('id', self.db.next_id(self.table_name))
+                    table.append(row)
+                    inserted.append(copy.deepcopy(row))
+                return FakeResponse(inserted)
+
+            matched = [row for row in table if self._matches(row)]
+            if self.operation == 'update':
+                for row in matched:
+                    row.update(self.payload)
+                return FakeResponse(copy.deepcopy(matched))
+            if self.operation == 'delete':
+                self.db.tables[self.table_name] = [row for row in table if row not in matched]
+                self.db.cascade(self.table_name, [row['id'] for row in matched])
+                return FakeResponse(copy.deepcopy(matched))
+
+            for column, desc in reversed(self.order_by):
+                matched.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+            count = len(matched) if self.count_mode else None
+            matched = matched[self.offset_value:]
+            if self.limit_value is not None:
+                matched = matched[:self.limit_value]
+            data = [self._project(self.table_name, row, self.columns) for row in matched]
+            return FakeResponse(data, count)
+
+
+# Python equivalents of the plpgsql functions in database/schema.sql.
+# FakeSupabase.rpc runs them under the fake's lock, like a transaction.
+
+def _fn_link_client_to_account(db, p_account_id, p_client_id, p_max_clients=5):
+    account_id, client_id = int(p_account_id), int(p_client_id)
+    if not any(r['id'] == account_id for r in db.tables.get('accounts', [])):
+        return {'success': False, 'code': 'account_not_found', 'error': 'Account not found'}
+    if not any(r['id'] == client_id for r in db.tables.get('clients', [])):
+        return {'success': False, 'code': 'client_not_found', 'error': 'Client not found'}
+    links = db.tables.setdefault('account_clients', [])
+    if any(r['account_id'] == account_id and r['client_id'] == client_id for r in links):
+        return {'success': False, 'code': 'already_linked',
+                'error': 'Client is already linked to this account'}
+    if sum(1 for r in links if r['account_id'] == account_id) >= p_max_clients:
+        return {'success': False, 'code': 'limit_reached',
+                'error': f'Account already has maximum number of clients ({p_max_clients})'}
+    links.append({'id': db.next_id('account_clients'), 'account_id': account_id, 'client_id': client_id})
+    db.bump_version('account_clients')
+    return {'success': True}
+
+
+def _fn_create_client_for_account(db, p_account_id, p_name, p_email, p_renewal_date, p_max_clients=5):
+    account_id = int(p_account_id)
+    if not any(r['id'] == account_id for r in db.tables.get('accounts', [])):
+        return {'success': False, 'code': 'account_not_found', 'error': 'Account not found'}
+    clients = db.tables.setdefault('clients', [])
+    if any(r.get('email') == p_email for r in clients):
+        return {'success': False, 'code': 'duplicate_email',
+                'error': 'A client with this email already exists'}
+    links = db.tables.setdefault('account_clients', [])
+    if sum(1 for r in links if r['account_id'] == account_id) >= p_max_clients:
+        return {'success': False, 'code': 'limit_reached',
+                'error': f'Account already has maximum number of clients ({p_max_clients})'}
+    client_id = db.next_id('clients')
+    clients.append({'id': client_id, 'name': p_name, 'email': p_email,
+                    'renewal_date': p_renewal_date, 'status': 'active'})
+    links.append({'id': db.next_id('account_clients'), 'account_id': account_id, 'client_id': client_id})
+    db.bump_version('clients', 'account_clients')
+    return {'success': True, 'client_id': client_id}
+
+
+def _fn_link_clients_to_accounts(db, p_links, p_max_clients=5):
+    accounts = {r['id'] for r in db.tables.get('accounts', [])}
+    links = db.tables.setdefault('account_clients', [])
+    remaining = {account_id: p_max_clients - sum(1 for r in links if r['account_id'] == account_id)
+                 for account_id in accounts}
+    linked, rejected, not_found = [], [], []
+    for link in p_links:
+        account_id, client_id = int(link['account_id']), int(link['client_id'])
+        if account_id not in accounts:
+            not_found.append(client_id)
+        elif remaining[account_id] <= 0:
+            rejected.append(client_id)
+        else:
+            remaining[account_id] -= 1
+            linked.append(client_id)
+            links.append({'id': db.next_id('account_clients'), 'account_id': account_id, 'client_id': client_id})
+    if linked:
+        db.bump_version('account_clients')
+    return {'linked_ids': sorted(linked), 'rejected_ids': sorted(rejected), 'not_found_ids': sorted(not_found)}
+
+
+def _fn_clients_by_renewal(db, p_status, p_from, p_before, p_after_date=None, p_after_id=None,
+                           p_limit=100):
+    # ISO dates compare correctly as strings
+    cursor = (p_after_date or '', int(p_after_id or 0))
+    rows = [r for r in db.tables.get('clients', [])
+            if r.get('status') == p_status and r.get('renewal_date')
+            and (p_from is None or r['renewal_date'] >= p_from)
+            and (p_before is None or r['renewal_date'] < p_before)
+            and (r['renewal_date'], r['id']) > cursor]
+    rows.sort(key=lambda r: (r['renewal_date'], r['id']))
+    return copy.deepcopy(rows[:p_limit])
+
+
+def _fn_renewal_week_counts(db, p_status, p_from, p_weeks):
+    start = datetime.date.fromisoformat(p_from)
+    counts = {}
+    for r in db.tables.get('clients', []):
+        if r.get('status') != p_status or not r.get('renewal_date'):
+            continue
+        offset = (datetime.date.fromisoformat(r['renewal_date']) - start).days
+        if 0 <= offset < 7 * p_weeks:
+            week = (start + datetime.timedelta(days=7 * (offset // 7))).isoformat()
+            counts[week] = counts.get(week, 0) + 1
+    return [{'week_start': week, 'client_count': n} for week, n in sorted(counts.items())]
+
+
+def _add_months(day, months):
+    """``date + interval 'N months'`` as Postgres does it: clamped to the last day of the month"""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    following = datetime.date(year + month // 12, month % 12 + 1, 1)
+    return day.replace(year=year, month=month, day=min(day.day, (following - datetime.timedelta(days=1)).day))
+
+
+def _fn_renew_clients(db, p_client_ids=None, p_due_before=None, p_status='active', p_renewal_date=None,
+                      p_extend_months=None):
+    def renewed(current):
+        if p_renewal_date is not None:
+            return p_renewal_date
+        start = datetime.date.fromisoformat(current) if current else datetime.date.today()
+        return _add_months(start, p_extend_months).isoformat()
+
+    updated = []
+    for row in db.tables.get('clients', []):
+        if p_client_ids is not None:
+            selected = row['id'] in p_client_ids
+        else:
+            selected = (row.get('status') == p_status and row.get('renewal_date')
+                        and row['renewal_date'] < p_due_before)
+        if selected:
+            row['renewal_date'] = renewed(row.get('renewal_date'))
+            updated.append(row['id'])
+    updated.sort()
+    db.bump_version('clients')
+    return {'updated': len(updated), 'updated_ids': updated,
+            'failed_ids': sorted(set(p_client_ids or ()) - set(updated))}
+
+
+def _fn_search_directory(db, p_query, p_fuzzy=False, p_kind='all', p_limit=20, p_offset=0):
+    query = p_query.lower()
+
+    def trigrams(word):
+        padded = f"  {word} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def score(name, email):
+        name, email = (name or '').lower(), (email or '').lower()
+        if p_fuzzy:
+            # word_similarity approximated by the best matching word
+            wanted = trigrams(query)
+            best = 0.0
+            for word in re.findall(r'[^\W_]+', f"{name} {email}"):
+                shared = len(wanted & trigrams(word))
+                best = max(best, shared / len(wanted | trigrams(word)))
+            return best if best >= 0.3 else None
+        if email.startswith(query) or (name and name.startswith(query)):
+            return 1.0
+        if any(word.startswith(query) for word in name.split()[1:]):
+            return 0.5
+        return None
+
+    matches = []
+    for kind, table in (('client', 'clients'), ('account', 'accounts')):
+        if p_kind not in ('all', kind):
+            continue
+        for row in db.tables.get(table, []):
+            name = row.get('name') if kind == 'client' else None
+            found = score(name, row.get('email'))
+            if found is not None:
+                matches.append({'kind': kind, 'id': row['id'], 'name': name,
+                                'email': row.get('email'), 'score': round(found, 4)})
+    matches.sort(key=lambda m: (-m['score'], m['email'] or '', m['kind'], m['id']))
+    return matches[p_offset:p_offset + p_limit]
+
+
+class FakeSupabase:
+    """Minimal Supabase client backed by Python lists"""
+
+    def __init__(self, tables=None, latency=0.0):
+        self.tables = {name: [dict(row) for row in rows] for name, rows in (tables or {}).items()}
+        self.unique = {
+            'accounts': ['email'],
+            'clients': ['email'],
+            'account_clients': [('account_id', 'client_id')],
+        }
+        self.functions = {
+            'link_client_to_account': _fn_link_client_to_account,
+            'create_client_for_account': _fn_create_client_for_account,
+            'link_clients_to_accounts': _fn_link_clients_to_accounts,
+            'clients_by_renewal': _fn_clients_by_renewal,
+            'renewal_week_counts': _fn_renewal_week_counts,
+            'renew_clients': _fn_renew_clients,
+            'search_directory': _fn_search_directory,
+        }
+        self.latency = latency
+        self.calls = []
+        self.lock = threading.RLock()
+        self._ids = {}
+
+    def next_id(self, table):
+        current = self._ids.get(table)
+        if current is None:
+            current = max((row.get('id', 0) for row in self.tables.get(table, [])), default=0)
+        self._ids[table] = current + 1
+        return current + 1
+
+    def round_trip(self, table, operation, sleep=True):
+        self.calls.append((table, operation))
+        if self.latency and sleep:
+            time.sleep(self.latency)
+
+    def cascade(self, table, ids):
+        fk = f"{_singular(table)}_id"
+        for name, rows in list(self.tables.items()):
+            if rows and fk in rows[0]:
+                self.tables[name] = [row for row in rows if row.get(fk) not in ids]
+                self.bump_version(name)
+
+    def bump_version(self, *tables):
+        """What the bump_table_version statement triggers do"""
+        versions = self.tables.setdefault('table_versions', [])
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        for table in set(tables) & VERSIONED_TABLES:
+            row = next((r for r in versions if r['table_name'] == table), None)
+            if row is None:
+                row = {'table_name': table, 'version': 0}
+                versions.append(row)
+            row['version'] += 1
+            row['updated_at'] = now
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        db = self
+
+        class _Call:
+            def execute(self):
+                db.round_trip(name, 'rpc')
+                with db.lock:
+                    return FakeResponse(db.functions[name](db, **(params or {})))
+        return _Call()
+
+    def reset_calls(self):
+        self.calls = []
+
+
+class FakeAsyncQuery:
+    """Async view of a FakeQuery; latency is awaited instead of slept"""
+
+    def __init__(self, query):
+        self._query = query
+
+    def __getattr__(self, name):
+        method = getattr(self._query, name)
+
+        def builder(*args, **kwargs):
+            method(*args, **kwargs)
+            return self
+        return builder
+
+    async def execute(self):
+        if self._query.db.latency:
+            await asyncio.sleep(self._query.db.latency)
+        return self._query.execute(blocking=False)
+
+
+class FakeAsyncPostgrest:
+    """Stand-in for postgrest.AsyncPostgrestClient backed by a FakeSupabase"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def from_(self, table):
+        return FakeAsyncQuery(FakeQuery(self.db, table))
+
+    table = from_
+
+    async def aclose(self):
+        pass
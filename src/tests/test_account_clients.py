@@ -0,0 +1,75 @@
+import pytest
+
+from cache import account_clients_key, cache
+from config import Config
+
+
+@pytest.fixture
+def linked(fake_db):
+    fake_db.tables.update({
+        'accounts': [{'id': 1, 'email': 'a@example.com'}, {'id': 2, 'email': 'b@example.com'},
+                     {'id': 3, 'email': 'c@example.com'}],
+        'clients': [{'id': i, 'name': f'Client {i}', 'email': f'c{i}@example.com', 'renewal_date': '2025-01-01'}
+                    for i in range(10, 14)],
+        'account_clients': [{'id': 1, 'account_id': 1, 'client_id': 11},
+                            {'id': 2, 'account_id': 1, 'client_id': 10},
+                            {'id': 3, 'account_id': 2, 'client_id': 12}],
+    })
+    return fake_db
+
+
+def client_ids(clients):
+    return [client['id'] for client in clients]
+
+
+def test_many_accounts_in_one_round_trip(app_client, linked):
+    linked.reset_calls()
+
+    payload = app_client.get('/account_clients?ids=1,2,3,404').get_json()
+
+    assert {account_id: client_ids(clients) for account_id, clients in payload['accounts'].items()} == {
+        '1': [10, 11], '2': [12], '3': []
+    }
+    assert payload['missing'] == [404]
+    assert linked.calls == [('table_versions', 'select'), ('accounts', 'select')]
+
+
+def test_single_account_is_one_round_trip(app_client, linked):
+    linked.reset_calls()
+
+    assert client_ids(app_client.get('/account_clients/1').get_json()['clients']) == [10, 11]
+    assert app_client.get('/account_clients/404').status_code == 404
+    assert linked.calls == [('table_versions', 'select'), ('accounts', 'select'), ('accounts', 'select')]
+
+
+def test_only_uncached_accounts_are_loaded(app_client, linked):
+    app_client.get('/account_clients/1')
+    linked.reset_calls()
+
+    app_client.get('/account_clients?ids=1,2')
+    assert linked.calls == [('accounts', 'select')]
+    assert cache.get(account_clients_key(2)) is not None
+
+    linked.reset_calls()
+    app_client.get('/account_clients?ids=2,1')
+    assert linked.calls == []
+
+
+def test_unchanged_responses_revalidate_with_304(app_client, linked):
+    first = app_client.get('/account_clients?ids=1,2')
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    assert app_client.get('/account_clients?ids=1,2', headers={'If-None-Match': etag}).status_code == 304
+
+    app_client.post('/link_client', json={'client_id': 13, 'account_id': 2})
+    changed = app_client.get('/account_clients?ids=1,2', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert client_ids(changed.get_json()['accounts']['2']) == [12, 13]
+
+
+@pytest.mark.parametrize('query', ['', '?ids=', '?ids=1,x', '?ids=1,2,3'])
+def test_ids_are_validated(app_client, linked, monkeypatch, query):
+    monkeypatch.setattr(Config, 'ACCOUNT_CLIENTS_MAX_IDS', 2)
+
+    assert app_client.get(f'/account_clients{query}').status_code == 400
@@ -0,0 +1,166 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from tests.fake_supabase import FakeAsyncPostgrest
+
+
+@pytest.fixture
+def asgi_app(app_client, fake_db, monkeypatch):
+    import asgi
+    monkeypatch.setattr(asgi, '_async_client', FakeAsyncPostgrest(fake_db))
+    fake_db.tables['accounts'] = [{'id': 1, 'email': 'a@example.com'}]
+    fake_db.tables['clients'] = [{'id': 10, 'name': 'C', 'email': 'c@example.com', 'renewal_date': '2025-01-01'}]
+    fake_db.tables['account_clients'] = [{'id': 1, 'account_id': 1, 'client_id': 10}]
+    return asgi.app
+
+
+def request(app, method, url, **kwargs):
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await client.request(method, url, **kwargs)
+    return asyncio.run(send())
+
+
+def test_async_handlers_use_async_client(asgi_app, fake_db):
+    assert request(asgi_app, 'GET', '/health').json()['status'] == 'healthy'
+    assert request(asgi_app, 'GET', '/account_clients/1').json()['clients'][0]['id'] == 10
+    assert request(asgi_app, 'GET', '/account_clients/2').status_code == 404
+    assert request(asgi_app, 'POST', '/check_client', json={'email': 'c@example.com'}).json()['exists']
+    page = request(asgi_app, 'GET', '/clients?format=json&limit=5').json()
+    assert [c['id'] for c in page['clients']] == [10] and page['next_cursor'] is None
+
+
+def test_async_reads_revalidate_with_304(asgi_app, fake_db):
+    for url in ['/clients?format=json', '/account_clients/1', '/health']:
+        etag = request(asgi_app, 'GET', url).headers['etag']
+        fake_db.reset_calls()
+
+        assert request(asgi_app, 'GET', url, headers={'If-None-Match': etag}).status_code == 304
+        assert fake_db.calls == []
+
+
+def test_other_routes_fall_back_to_flask(asgi_app, fake_db):
+    response = request(asgi_app, 'GET', '/clients')  # HTML view
+
+    assert response.status_code == 200
+    assert 'c@example.com' in response.text
+    assert request(asgi_app, 'POST', '/link_client',
+                   json={'client_id': 10, 'account_id': 1}).status_code == 400
+
+
+def test_cors_header_for_allowed_origins(asgi_app):
+    response = request(asgi_app, 'GET', '/health', headers={'Origin': 'https://lokiplus.netlify.app'})
+
+    assert response.headers['access-control-allow-origin'] == 'https://lokiplus.netlify.app'
+
+
+def test_one_worker_overlaps_database_calls(asgi_app, fake_db):
+    fake_db.latency = 0.05
+
+    async def burst():
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            # Distinct emails, so every request is a cache miss that queries the database
+            return await asyncio.gather(*(client.post('/check_client', json={'email': f'{i}@example.com'})
+                                          for i in range(20)))
+
+    start = time.perf_counter()
+    responses = asyncio.run(burst())
+
+    assert all(r.status_code == 200 for r in responses)
+    assert time.perf_counter() - start < 20 * fake_db.latency / 2
+
+
+def test_event_stream_is_served_without_a_thread(asgi_app, monkeypatch):
+    import events
+    from config import Config
+    monkeypatch.setattr(Config, 'EVENTS_STREAM_MAX_SECONDS', 0.2)
+    monkeypatch.setattr(Config, 'EVENTS_HEARTBEAT', 0.05)
+    events.publish('client_linked', account_id=1, client_id=10)
+
+    response = request(asgi_app, 'GET', '/events', headers={'Last-Event-ID': '0'})
+
+    assert response.headers['content-type'].startswith('text/event-stream')
+    assert 'id: 1\nevent: client_linked\ndata: {"account_id":1,"client_id":10}\n\n' in response.text
+    assert events.event_bus.stats()['streams'] == 0
+
+
+def test_async_handlers_compress_large_bodies(asgi_app, fake_db):
+    fake_db.tables['clients'] = [{'id': i, 'name': f'Client {i}', 'email': f'client{i}@example.com',
+                                  'renewal_date': '2025-01-01'} for i in range(1, 201)]
+
+    response = request(asgi_app, 'GET', '/clients?format=json&limit=200',
+                       headers={'Accept-Encoding': 'gzip', 'Origin': 'https://lokiplus.netlify.app'})
+
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.headers['vary'] == 'Origin, Accept-Encoding'
+    assert len(response.json()['clients']) == 200  # httpx decodes it
+
+
+def test_query_arguments_are_parsed_like_flask(asgi_app, app_client, fake_db):
+    from asgi import Request
+    query = b'limit=5&limit=7&after=&q=a%20b&q=%FF'
+    with app_client.application.test_request_context('/clients?' + query.decode('latin-1')) as ctx:
+        flask_args = ctx.request.args
+    args = Request({'method': 'GET', 'path': '/clients', 'query_string': query}, b'').args
+    assert args == flask_args
+    assert (args['limit'], args['after'], args.getlist('q')) == ('5', '', ['a b', '%FF'])
+
+    # Same URL, same page and validators under both servers
+    fake_db.bump_version('clients')
+    url, headers = '/clients?format=json&limit=5&limit=7&after=', {'Accept': 'application/json'}
+    async_response, sync_response = request(asgi_app, 'GET', url, headers=headers), app_client.get(url, headers=headers)
+    assert async_response.json()['limit'] == sync_response.get_json()['limit'] == 5
+    assert async_response.headers['etag'] == sync_response.headers['etag']
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    from app import limiter
+    monkeypatch.setattr(limiter, 'enabled', True)
+    limiter.reset()
+    yield limiter
+    limiter.reset()
+
+
+def test_async_handlers_share_flask_rate_limits(asgi_app, app_client, fake_db, limited):
+    # The default 50 per hour of /check_client, spent through Flask
+    for _ in range(50):
+        app_client.post('/check_client', json={'email': 'c@example.com'})
+    fake_db.reset_calls()
+
+    response = request(asgi_app, 'POST', '/check_client', json={'email': 'c@example.com'})
+
+    assert 'Too Many Requests' in response.text
+    assert fake_db.calls == []
+
+
+def test_async_handlers_are_timed_per_flask_endpoint(asgi_app, monkeypatch):
+    from route_manager import route_manager
+    monkeypatch.setattr(route_manager, 'stats', {})
+
+    request(asgi_app, 'GET', '/account_clients/1')
+
+    assert route_manager.generate_report()['routes']['get_account_clients']['total_calls'] == 1
+
+
+def test_sqlite_cache_is_read_off_the_event_loop(asgi_app, monkeypatch, tmp_path):
+    import threading
+    import asgi
+    from cache import SQLiteCache
+    shared = SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    threads = set()
+    real_get = shared.get
+
+    def get(key, default=None):
+        threads.add(threading.current_thread())
+        return real_get(key, default)
+    monkeypatch.setattr(shared, 'get', get)
+    monkeypatch.setattr(asgi, 'cache', shared)
+
+    assert request(asgi_app, 'GET', '/account_clients/1').status_code == 200
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,132 @@
+import io
+
+from bulk_import import import_accounts, import_clients
+from password_hasher import PasswordHasher
+
+
+def test_account_import_checks_duplicates_once_per_batch(fake_db):
+    fake_db.tables['accounts'] = [{'id': 1, 'email': 'taken@example.com', 'password': 'x'}]
+    rows = [
+        {'email': 'new1@example.com', 'password': 'Secret123'},
+        {'email': 'taken@example.com', 'password': 'Secret123'},
+        {'email': 'new1@example.com', 'password': 'Secret123'},
+        {'email': 'bad-email', 'password': 'Secret123'},
+        {'email': 'new2@example.com', 'password': 'weak'},
+        {'email': 'new3@example.com', 'password': 'Secret123'},
+    ]
+
+    report = import_accounts(rows, batch_size=3, client=fake_db,
+                             hasher=PasswordHasher(rounds=4, pool_size=0))
+
+    assert [r['status'] for r in report['results']] == [
+        'created', 'duplicate', 'duplicate', 'invalid', 'invalid', 'created']
+    assert report['summary'] == {'created': 2, 'duplicate': 2, 'invalid': 2}
+    # Two batches: one duplicate check and one insert each
+    assert fake_db.calls == [('accounts', 'select'), ('accounts', 'insert')] * 2
+
+
+def test_client_import_enforces_per_account_limit_in_bulk(fake_db):
+    fake_db.tables['accounts'] = [{'id': 1, 'email': 'a@example.com'}, {'id': 2, 'email': 'b@example.com'}]
+    fake_db.tables['clients'] = [{'id': i, 'email': f'old{i}@example.com'} for i in range(1, 4)]
+    fake_db.tables['account_clients'] = [{'id': i, 'account_id': 1, 'client_id': i} for i in range(1, 4)]
+    rows = [{'name': f'C{i}', 'email': f'c{i}@example.com', 'account_id': 1, 'renewal_date': '2025-01-01'}
+            for i in range(4)]
+    rows.append({'name': 'X', 'email': 'x@example.com', 'account_id': 99, 'renewal_date': '2025-01-01'})
+    rows.append({'name': 'Y', 'email': 'old1@example.com', 'account_id': 2, 'renewal_date': '2025-01-01'})
+
+    report = import_clients(rows, batch_size=10, client=fake_db)
+
+    assert [r['status'] for r in report['results']] == [
+        'created', 'created', 'rejected', 'rejected', 'invalid', 'duplicate']
+    linked = [r for r in fake_db.tables['account_clients'] if r['account_id'] == 1]
+    assert len(linked) == 5
+    # Rows over the limit are rejected before the insert; the inserted ones link with one RPC
+    assert fake_db.calls == [('clients', 'select'), ('accounts', 'select'), ('clients', 'insert'),
+                             ('link_clients_to_accounts', 'rpc')]
+
+
+def test_client_import_links_through_the_rpc_limit(fake_db):
+    fake_db.tables['accounts'] = [{'id': 1, 'email': 'a@example.com'}]
+    rows = [{'name': f'C{i}', 'email': f'c{i}@example.com', 'account_id': 1, 'renewal_date': '2025-01-01'}
+            for i in range(3)]
+    link = fake_db.functions['link_clients_to_accounts']
+
+    def concurrent_import(db, **params):
+        # Another import left room for one client after this one read the count
+        while sum(1 for r in db.tables['account_clients'] if r['account_id'] == 1) < 4:
+            db.tables['account_clients'].append({'id': db.next_id('account_clients'), 'account_id': 1,
+                                                 'client_id': 0})
+        return link(db, **params)
+    fake_db.functions['link_clients_to_accounts'] = concurrent_import
+
+    report = import_clients(rows, client=fake_db)
+
+    assert [r['status'] for r in report['results']] == ['created', 'rejected', 'rejected']
+    # Only the rejected clients are rolled back
+    assert [c['email'] for c in fake_db.tables['clients']] == ['c0@example.com']
+
+
+def test_failed_rollback_keeps_the_batch_results(fake_db, monkeypatch):
+    fake_db.tables['accounts'] = [{'id': 1, 'email': 'a@example.com'}]
+    fake_db.functions['link_clients_to_accounts'] = lambda db, **params: 1 / 0
+    real_table = fake_db.table
+
+    def table(name):
+        query = real_table(name)
+        if name == 'clients':
+            query.delete = lambda: (_ for _ in ()).throw(RuntimeError('database is locked'))
+        return query
+    monkeypatch.setattr(fake_db, 'table', table)
+
+    report = import_clients([{'name': 'C', 'email': 'c@example.com', 'account_id': 1,
+                              'renewal_date': '2025-01-01'}], client=fake_db)
+
+    assert report['results'][0]['status'] == 'error'
+    assert report['results'][0]['error'] == 'division by zero'
+
+
+def test_busy_hasher_answers_503_instead_of_row_errors(app_client, monkeypatch):
+    from password_hasher import HasherBusy, password_hasher
+    from route_manager import route_manager
+
+    def busy(passwords):
+        raise HasherBusy(7)
+    monkeypatch.setattr(password_hasher, 'hash_many', busy)
+    monkeypatch.setattr(route_manager, 'stats', {})  # keep the shed request out of other tests' error rates
+
+    response = app_client.post('/import/accounts', json=[{'email': 'a@example.com', 'password': 'Secret123'}])
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '7'
+
+
+def test_csv_upload_endpoint(app_client, fake_db):
+    fake_db.tables['accounts'] = [{'id': 1, 'email': 'a@example.com'}]
+    csv_body = 'name,email,account_id,renewal_date\nC1,c1@example.com,1,2025-01-01\n'
+
+    response = app_client.post('/import/clients?batch_size=50',
+                               data={'file': (io.BytesIO(csv_body.encode()), 'clients.csv')},
+                               content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert response.get_json()['summary'] == {'created': 1}
+    assert fake_db.tables['clients'][0]['email'] == 'c1@example.com'
+
+
+def test_upload_validation(app_client):
+    assert app_client.post('/import/accounts', data='nope', content_type='text/plain').status_code == 400
+    assert app_client.post('/import/accounts?batch_size=0', json=[]).status_code == 400
+
+
+def test_account_import_limit_follows_the_hash_cost(app_client, monkeypatch):
+    from config import Config
+    from password_hasher import password_hasher
+    monkeypatch.setattr(Config, 'IMPORT_HASH_BUDGET', 1)
+    monkeypatch.setattr(password_hasher, 'seconds_per_hash', lambda: 0.5)
+    monkeypatch.setattr(password_hasher, 'pool_size', 1)
+    rows = [{'email': f'a{i}@example.com', 'password': 'Secret123'} for i in range(3)]
+
+    response = app_client.post('/import/accounts', json=rows)
+
+    assert response.status_code == 413
+    assert response.get_json()['error'] == 'Too many rows (3), the limit is 2'
@@ -0,0 +1,205 @@
+import os
+import sqlite3
+import time
+
+import pytest
+
+from cache import TTLCache, SQLiteCache, cache, create_cache, account_clients_key, client_tag, account_tag
+
+
+def test_lru_eviction_and_counters():
+    lru = TTLCache(max_entries=2, ttl=60)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    assert lru.get('a') == 1  # 'b' is now least recently used
+    lru.set('c', 3)
+
+    assert lru.get('b') is None
+    assert lru.get('c') == 3
+    stats = lru.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['size']) == (2, 1, 1, 2)
+    assert stats['hit_ratio'] == pytest.approx(2 / 3, abs=1e-4)
+
+
+def test_entries_expire_after_ttl():
+    ttl_cache = TTLCache(ttl=0.01)
+    ttl_cache.set('a', 1)
+    time.sleep(0.02)
+
+    assert ttl_cache.get('a') is None
+    assert ttl_cache.stats()['expirations'] == 1
+
+
+def test_get_or_load_does_not_cache_failures():
+    loader_cache = TTLCache()
+
+    def failing():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        loader_cache.get_or_load('k', failing)
+    assert loader_cache.get_or_load('k', lambda: 'ok') == 'ok'
+    assert loader_cache.get_or_load('k', failing) == 'ok'
+
+
+def test_delete_tag_drops_only_tagged_entries():
+    tag_cache = TTLCache()
+    tag_cache.set('x', 1, tags=['t1'])
+    tag_cache.set('y', 2, tags=['t1', 't2'])
+    tag_cache.set('z', 3, tags=['t2'])
+
+    tag_cache.delete_tag('t1')
+
+    assert tag_cache.get('x') is None and tag_cache.get('y') is None
+    assert tag_cache.get('z') == 3
+
+
+@pytest.fixture
+def seeded(app_client, fake_db):
+    fake_db.tables.update({
+        'accounts': [{'id': 1, 'email': 'a@example.com'}, {'id': 2, 'email': 'b@example.com'}],
+        'clients': [{'id': 10, 'name': 'C', 'email': 'c@example.com', 'renewal_date': '2025-01-01'}],
+        'account_clients': [{'id': 1, 'account_id': 1, 'client_id': 10}],
+    })
+    return app_client
+
+
+def test_reads_are_served_from_cache(seeded, fake_db):
+    seeded.get('/account_clients/1')
+    seeded.get('/clients?format=json')
+    fake_db.reset_calls()
+
+    assert seeded.get('/account_clients/1').get_json()['clients'][0]['id'] == 10
+    seeded.get('/clients?format=json')
+    assert fake_db.calls == []
+
+
+def test_writes_invalidate_affected_keys_only(seeded, fake_db):
+    seeded.get('/account_clients/1')
+    seeded.get('/account_clients/2')
+
+    seeded.post('/link_client', json={'client_id': 10, 'account_id': 2})
+
+    assert cache.get(account_clients_key(1)) is not None
+    assert cache.get(account_clients_key(2)) is None
+    assert [c['id'] for c in seeded.get('/account_clients/2').get_json()['clients']] == [10]
+
+
+def test_writes_drop_stamped_entries_by_tag(seeded, fake_db):
+    fake_db.bump_version('accounts', 'clients', 'account_clients')
+    seeded.get('/account_clients/1')
+    seeded.get('/account_clients/2')
+    stamped = [key for key in cache._entries if key.startswith(account_clients_key(2) + '@')]
+    assert stamped
+
+    seeded.post('/link_client', json={'client_id': 10, 'account_id': 2})
+
+    assert all(cache.get(key) is None for key in stamped)
+    assert cache._tags.get(account_tag(1))
+
+
+def test_renewal_invalidates_entries_containing_the_client(seeded, fake_db):
+    seeded.get('/account_clients/1')
+    seeded.get('/clients?format=json')
+
+    seeded.post('/renew_client', json={'client_id': 10, 'renewal_date': '2026-01-01'})
+
+    assert cache._tags.get(client_tag(10)) is None
+    assert seeded.get('/clients?format=json').get_json()['clients'][0]['renewal_date'] == '2026-01-01'
+
+
+@pytest.fixture
+def shared_cache(tmp_path):
+    return SQLiteCache(str(tmp_path / 'cache.sqlite3'), max_entries=2, ttl=60)
+
+
+def test_sqlite_backend_shares_entries_between_instances(shared_cache):
+    other_worker = SQLiteCache(shared_cache.path, max_entries=2, ttl=60)
+    shared_cache.set('dashboard', ([{'id': 1}], []), tags=['client:1'])
+
+    assert other_worker.get('dashboard') == ([{'id': 1}], [])
+    other_worker.delete_tag('client:1')
+    assert shared_cache.get('dashboard') is None
+    assert shared_cache.stats()['hits'] == 1
+
+
+def test_sqlite_backend_evicts_least_recently_used(shared_cache):
+    shared_cache.TOUCH_FRACTION = 0  # record every read time
+    shared_cache.set('a', 1)
+    time.sleep(0.001)
+    shared_cache.set('b', 2)
+    time.sleep(0.001)
+    shared_cache.get('a')
+    time.sleep(0.001)
+    shared_cache.set('c', 3)
+
+    assert shared_cache.get('b') is None
+    assert shared_cache.get('a') == 1
+    stats = shared_cache.stats()
+    assert (stats['evictions'], stats['size'], stats['backend']) == (1, 2, 'sqlite')
+
+
+def test_sqlite_reads_do_not_wait_for_the_write_lock(shared_cache):
+    shared_cache.set('a', 1)
+    writer = sqlite3.connect(shared_cache.path, isolation_level=None)
+    writer.execute('BEGIN IMMEDIATE')  # another worker holds the write lock
+    try:
+        start = time.monotonic()
+        assert shared_cache.get('a') == 1
+        assert shared_cache.get('b') is None
+        assert time.monotonic() - start < 1
+    finally:
+        writer.execute('ROLLBACK')
+
+
+def test_sqlite_counters_are_flushed_from_each_worker(shared_cache):
+    other_worker = SQLiteCache(shared_cache.path, max_entries=2, ttl=60, flush_interval=0)
+    shared_cache.set('a', 1)
+    shared_cache.get('a')
+    other_worker.get('a')
+    other_worker.get('b')
+
+    # Both workers' lookups, whether flushed on a read or by stats() itself
+    stats = shared_cache.stats()
+    assert (stats['hits'], stats['misses']) == (2, 1)
+
+
+def test_sqlite_backend_survives_fork(shared_cache):
+    shared_cache.set('a', 1)
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if shared_cache.get('a') == 1 else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_backend_is_selected_by_config(tmp_path):
+    class SharedConfig:
+        CACHE_BACKEND = 'sqlite'
+        CACHE_SQLITE_PATH = str(tmp_path / 'c.sqlite3')
+        CACHE_MAX_ENTRIES = 10
+        CACHE_TTL = 5
+        CACHE_ENABLED = True
+
+    assert isinstance(create_cache(SharedConfig), SQLiteCache)
+    SharedConfig.CACHE_BACKEND = 'memory'
+    assert isinstance(create_cache(SharedConfig), TTLCache)
+    SharedConfig.CACHE_BACKEND = 'redis'
+    with pytest.raises(ValueError):
+        create_cache(SharedConfig)
+
+
+def test_sqlite_backend_logs_invalidation_failures(shared_cache, monkeypatch, caplog):
+    shared_cache.set('a', 1, tags=['client:1'])
+
+    def locked(*args):
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(shared_cache, '_connect', locked)
+    shared_cache.delete('a')
+    shared_cache.delete_tag('client:1')
+    shared_cache.clear()
+    assert shared_cache.stats()['size'] is None
+
+    assert [record.levelname for record in caplog.records] == ['WARNING'] * 4
+    assert 'database is locked' in caplog.records[0].getMessage()
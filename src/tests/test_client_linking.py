@@ -0,0 +1,91 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from config import Config
+
+
+@pytest.fixture
+def account_with_clients(fake_db):
+    fake_db.tables['accounts'] = [{'id': 1, 'email': 'a@example.com'}]
+    fake_db.tables['clients'] = [{'id': i, 'name': f'C{i}', 'email': f'c{i}@example.com'}
+                                 for i in range(1, 21)]
+    return fake_db
+
+
+def test_link_client_is_one_round_trip(app_client, account_with_clients):
+    account_with_clients.reset_calls()
+
+    response = app_client.post('/link_client', json={'client_id': 1, 'account_id': 1})
+
+    assert response.get_json() == {'success': True}
+    assert account_with_clients.calls == [('link_client_to_account', 'rpc')]
+
+
+def test_link_client_errors(app_client, account_with_clients):
+    app_client.post('/link_client', json={'client_id': 1, 'account_id': 1})
+
+    assert app_client.post('/link_client', json={'client_id': 1, 'account_id': 1}).status_code == 400
+    assert app_client.post('/link_client', json={'client_id': 1, 'account_id': 9}).status_code == 404
+
+
+def test_parallel_links_never_exceed_the_limit(app_client, account_with_clients):
+    # Latency widens the window a check-then-insert sequence would race in
+    account_with_clients.latency = 0.005
+    from app import app
+
+    def link(client_id):
+        with app.test_client() as client:
+            return client.post('/link_client', json={'client_id': client_id, 'account_id': 1}).status_code
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        statuses = list(pool.map(link, range(1, 21)))
+
+    assert statuses.count(200) == Config.MAX_CLIENTS_PER_ACCOUNT
+    assert statuses.count(400) == 20 - Config.MAX_CLIENTS_PER_ACCOUNT
+    assert len(account_with_clients.tables['account_clients']) == Config.MAX_CLIENTS_PER_ACCOUNT
+
+
+def test_add_client_creates_and_links_atomically(app_client, account_with_clients):
+    account_with_clients.reset_calls()
+
+    app_client.post('/add_client', data={'name': 'New', 'email': 'new@example.com',
+                                         'account_id': '1', 'renewal_date': '2025-01-01'})
+
+    assert account_with_clients.calls == [('create_client_for_account', 'rpc')]
+    new_client = account_with_clients.tables['clients'][-1]
+    assert new_client['email'] == 'new@example.com'
+    assert account_with_clients.tables['account_clients'][-1]['client_id'] == new_client['id']
+
+
+@pytest.mark.skipif(not os.getenv('TEST_DATABASE_URL'), reason='TEST_DATABASE_URL not set')
+def test_parallel_links_against_postgres():
+    """Runs the real plpgsql function; TEST_DATABASE_URL must point at a throwaway database"""
+    psycopg2 = pytest.importorskip('psycopg2')
+    schema = os.path.join(os.path.dirname(__file__), '..', 'database', 'schema.sql')
+    conn = psycopg2.connect(os.environ['TEST_DATABASE_URL'])
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(open(schema).read())
+        cur.execute("INSERT INTO accounts (email, password) VALUES ('a@example.com', 'x') RETURNING id")
+        account_id = cur.fetchone()[0]
+        cur.execute("INSERT INTO clients (name, email) SELECT 'C' || n, 'c' || n || '@example.com' "
+                    "FROM generate_series(1, 20) n RETURNING id")
+        client_ids = [row[0] for row in cur.fetchall()]
+    conn.close()
+
+    def link(client_id):
+        worker = psycopg2.connect(os.environ['TEST_DATABASE_URL'])
+        worker.autocommit = True
+        with worker.cursor() as cur:
+            cur.execute('SELECT link_client_to_account(%s, %s, %s)',
+                        (account_id, client_id, Config.MAX_CLIENTS_PER_ACCOUNT))
+            result = cur.fetchone()[0]
+        worker.close()
+        return result['success']
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        results = list(pool.map(link, client_ids))
+
+    assert results.count(True) == Config.MAX_CLIENTS_PER_ACCOUNT
@@ -0,0 +1,67 @@
+import json
+
+
+def seed_clients(fake_db, count):
+    fake_db.tables['clients'] = [
+        {'id': i, 'name': f'Client {i}', 'email': f'c{i}@example.com', 'renewal_date': '2025-01-01'}
+        for i in range(1, count + 1)
+    ]
+
+
+def test_json_pages_follow_cursor(app_client, fake_db):
+    seed_clients(fake_db, 5)
+
+    first = app_client.get('/clients?format=json&limit=2').get_json()
+    assert [c['id'] for c in first['clients']] == [1, 2]
+    assert first['next_cursor'] == 2
+
+    second = app_client.get(f"/clients?format=json&limit=2&after={first['next_cursor']}").get_json()
+    assert [c['id'] for c in second['clients']] == [3, 4]
+
+    last = app_client.get('/clients?format=json&limit=2&after=4').get_json()
+    assert [c['id'] for c in last['clients']] == [5]
+    assert last['next_cursor'] is None
+
+
+def test_limit_is_capped_and_validated(app_client, fake_db, monkeypatch):
+    from config import Config
+    monkeypatch.setattr(Config, 'CLIENTS_MAX_PAGE_SIZE', 3)
+    seed_clients(fake_db, 10)
+
+    assert len(app_client.get('/clients?format=json&limit=50').get_json()['clients']) == 3
+    assert app_client.get('/clients?format=json&after=abc').status_code == 400
+    assert app_client.get('/clients?format=json&limit=0').status_code == 400
+
+
+def test_ndjson_stream_fetches_page_by_page(app_client, fake_db):
+    seed_clients(fake_db, 7)
+    fake_db.reset_calls()
+
+    response = app_client.get('/clients?stream=ndjson&limit=3')
+    lines = response.get_data(as_text=True).splitlines()
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line)['id'] for line in lines] == list(range(1, 8))
+    assert fake_db.calls.count(('clients', 'select')) == 3
+
+
+def test_json_array_stream_is_valid_json(app_client, fake_db):
+    seed_clients(fake_db, 4)
+
+    response = app_client.get('/clients?stream=json&limit=2&after=1')
+
+    assert [c['id'] for c in json.loads(response.get_data(as_text=True))] == [2, 3, 4]
+    assert json.loads(app_client.get('/clients?stream=json').get_data(as_text=True)) == [
+        c for c in fake_db.tables['clients']
+    ]
+
+
+def test_html_renders_only_first_page(app_client, fake_db, monkeypatch):
+    from config import Config
+    monkeypatch.setattr(Config, 'CLIENTS_PAGE_SIZE', 2)
+    seed_clients(fake_db, 5)
+
+    html = app_client.get('/clients').get_data(as_text=True)
+
+    assert 'c1@example.com' in html and 'c2@example.com' in html
+    assert 'c3@example.com' not in html
@@ -0,0 +1,69 @@
+import gzip
+
+import pytest
+
+import compression
+from config import Config
+
+
+@pytest.fixture
+def clients(app_client, fake_db):
+    fake_db.tables['clients'] = [{'id': i, 'name': f'Client {i}', 'email': f'client{i}@example.com',
+                                  'renewal_date': '2025-01-01'} for i in range(1, 201)]
+    return app_client
+
+
+def test_large_json_is_gzipped_and_still_revalidates(clients):
+    plain = clients.get('/clients?format=json&limit=200')
+    response = clients.get('/clients?format=json&limit=200', headers={'Accept-Encoding': 'gzip, deflate'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()) == plain.get_data()
+    assert int(response.headers['Content-Length']) < len(plain.get_data()) / 4
+    assert response.headers['ETag'] == 'W/' + plain.headers['ETag']
+
+    revalidated = clients.get('/clients?format=json&limit=200', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert 'Content-Encoding' not in revalidated.headers
+
+
+@pytest.mark.parametrize('url,accept', [
+    ('/health', 'gzip'),  # below COMPRESSION_MIN_SIZE
+    ('/clients?format=json&limit=200', 'gzip;q=0, identity'),
+    ('/clients?format=json&limit=200', None),
+])
+def test_sent_as_is_when_small_or_not_accepted(clients, url, accept):
+    headers = {'Accept-Encoding': accept} if accept else {}
+
+    assert 'Content-Encoding' not in clients.get(url, headers=headers).headers
+
+
+def test_streamed_exports_are_compressed_incrementally(clients, monkeypatch):
+    monkeypatch.setattr(Config, 'COMPRESSION_STREAM_FLUSH', 1024)
+    plain = clients.get('/clients?stream=ndjson&limit=50').get_data()
+
+    response = clients.get('/clients?stream=ndjson&limit=50', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.is_streamed and 'Content-Length' not in response.headers
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.get_data()) == plain
+
+
+def test_event_streams_are_never_compressed(app_client, monkeypatch):
+    monkeypatch.setattr(Config, 'EVENTS_STREAM_MAX_SECONDS', 0)
+
+    response = app_client.get('/events', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_negotiation(monkeypatch):
+    assert compression.negotiate('gzip, deflate, br') == 'gzip'
+    assert compression.negotiate('*') == 'gzip'
+    assert compression.negotiate('deflate') is None
+
+    monkeypatch.setattr(compression, 'available_encodings', lambda: ['br', 'gzip'])
+    assert compression.negotiate('gzip, deflate, br') == 'br'
+    assert compression.negotiate('gzip, br;q=0.5') == 'gzip'
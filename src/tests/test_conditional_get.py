@@ -0,0 +1,105 @@
+import pytest
+
+import conditional_get
+from cache import cache
+
+
+@pytest.fixture
+def seeded(app_client, fake_db):
+    fake_db.tables.update({
+        'accounts': [{'id': 1, 'email': 'a@example.com'}],
+        'clients': [{'id': 10, 'name': 'C', 'email': 'c@example.com', 'renewal_date': '2025-01-01'}],
+        'account_clients': [{'id': 1, 'account_id': 1, 'client_id': 10}],
+    })
+    fake_db.bump_version('accounts', 'clients', 'account_clients')
+    return app_client
+
+
+@pytest.mark.parametrize('url', ['/', '/clients', '/clients?format=json', '/account_clients/1',
+                                 '/account_clients?ids=1', '/renewals/overdue', '/search?q=c@e'])
+def test_unchanged_reads_are_answered_304_without_fetching_rows(seeded, fake_db, url):
+    first = seeded.get(url)
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    cache.clear()
+    fake_db.reset_calls()
+    second = seeded.get(url, headers={'If-None-Match': first.headers['ETag']})
+
+    assert second.status_code == 304
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert fake_db.calls == [('table_versions', 'select')]
+
+
+def test_writes_change_the_etag(seeded):
+    etag = seeded.get('/clients?format=json').headers['ETag']
+
+    seeded.post('/renew_client', json={'client_id': 10, 'renewal_date': '2026-01-01'})
+
+    response = seeded.get('/clients?format=json', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['clients'][0]['renewal_date'] == '2026-01-01'
+
+
+def test_each_representation_has_its_own_etag(seeded):
+    etags = {seeded.get(url).headers['ETag'] for url in
+             ['/clients', '/clients?format=json', '/clients?format=json&limit=5']}
+
+    assert len(etags) == 3
+
+
+def test_if_modified_since_uses_the_stamp_time(seeded):
+    last_modified = seeded.get('/account_clients/1').headers['Last-Modified']
+
+    assert seeded.get('/account_clients/1', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+
+def test_pending_flash_messages_are_never_hidden_by_304(seeded):
+    etag = seeded.get('/').headers['ETag']
+
+    seeded.post('/add_account', data={'email': 'not-an-email', 'password': 'Secret123'})
+    response = seeded.get('/', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert 'Invalid email format' in response.get_data(as_text=True)
+
+
+def test_missing_version_table_serves_unconditionally(seeded, monkeypatch):
+    def missing_table():
+        raise Exception('relation "table_versions" does not exist')
+    monkeypatch.setattr(conditional_get, 'load_table_versions', missing_table)
+
+    response = seeded.get('/clients?format=json', headers={'If-None-Match': '"anything"'})
+
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+
+
+def test_health_gets_weak_etags_that_follow_status_only(seeded, monkeypatch):
+    from health_probe import health_prober, live_payload
+    seeded.get('/health/live')  # registers the route in the live payload's route summary
+    first = seeded.get('/health/live')
+    assert first.headers['ETag'].startswith('W/')
+
+    health_prober.probe_once()  # new checked_at and latency, same status
+    assert seeded.get('/health/live', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    monkeypatch.setattr(health_prober, 'probe', lambda: 1 / 0)
+    health_prober.probe_once()
+    unhealthy, _ = live_payload()
+    assert conditional_get.payload_etag(unhealthy) not in first.headers['ETag']
+
+
+def test_cached_bodies_follow_writes_from_other_workers(seeded, fake_db):
+    first = seeded.get('/clients?format=json')
+
+    # Another worker renews the client: the stamps move, this worker's page cache does not know
+    fake_db.tables['clients'][0]['renewal_date'] = '2026-01-01'
+    fake_db.bump_version('clients')
+    cache.delete(conditional_get.TABLE_VERSIONS_KEY)  # the stamps' short TTL has run out
+
+    second = seeded.get('/clients?format=json', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.get_json()['clients'][0]['renewal_date'] == '2026-01-01'
+    assert seeded.get('/clients?format=json',
+                      headers={'If-None-Match': second.headers['ETag']}).status_code == 304
@@ -0,0 +1,27 @@
+from dashboard import load_dashboard_data
+from tests.fake_supabase import FakeSupabase
+
+
+def make_db(num_accounts):
+    accounts = [{'id': i, 'email': f'a{i}@example.com',
+                 'created_at': '2024-01-02T03:04:05Z'} for i in range(1, num_accounts + 1)]
+    clients = [{'id': i, 'name': f'c{i}', 'email': f'c{i}@example.com'} for i in range(1, 4)]
+    relations = [{'id': i, 'account_id': 1, 'client_id': i} for i in range(1, 4)]
+    return FakeSupabase({'accounts': accounts, 'clients': clients, 'account_clients': relations})
+
+
+def test_client_counts_come_from_embedded_aggregate():
+    accounts, clients = load_dashboard_data(make_db(2))
+
+    counts = {a['id']: a['client_count'] for a in accounts}
+    assert counts == {1: 3, 2: 0}
+    assert len(clients) == 3
+    assert all('account_clients' not in a for a in accounts)
+    assert accounts[0]['created_at'] == '2024-01-02T03:04:05Z'  # formatted when the row is rendered
+
+
+def test_round_trips_do_not_grow_with_accounts():
+    for num_accounts in (1, 50, 500):
+        db = make_db(num_accounts)
+        load_dashboard_data(db)
+        assert len(db.calls) == 2
@@ -0,0 +1,226 @@
+import os
+import threading
+from datetime import date, datetime
+
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+from psycopg2 import extensions
+
+from config import Config
+from db import DatabasePool, PoolTimeout, PostgresBackend, get_backend
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=()):
+        if self.conn.broken:
+            self.conn.closed = 2
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+        self.conn.statements.append(sql)
+        self.rows = list(self.conn.results.pop(0)) if self.conn.results else []
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeInfo:
+    transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeConnection:
+    opened = []
+
+    def __init__(self, dsn, **kwargs):
+        self.dsn = dsn
+        self.closed = 0
+        self.broken = False
+        self.info = FakeInfo()
+        self.statements = []
+        self.results = []
+        self.commits = 0
+        self.rollbacks = 0
+        FakeConnection.opened.append(self)
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    FakeConnection.opened = []
+    monkeypatch.setattr(psycopg2, 'connect', FakeConnection)
+    monkeypatch.setattr(Config, 'DATABASE_URL', 'postgresql://test/test')
+    monkeypatch.setattr(Config, 'DB_POOL_MIN', 1)
+    monkeypatch.setattr(Config, 'DB_POOL_MAX', 2)
+    monkeypatch.setattr(Config, 'DB_POOL_TIMEOUT', 0.05)
+    DatabasePool.close_pool()
+    yield DatabasePool
+    DatabasePool.close_pool()
+
+
+def test_connection_string_from_parts(monkeypatch):
+    monkeypatch.setattr(Config, 'DATABASE_URL', None)
+    monkeypatch.setattr(Config, 'DB_HOST', 'db.example.com')
+    monkeypatch.setattr(Config, 'DB_PASSWORD', "it's secret")
+    dsn = Config.get_db_connection_string()
+    assert "host='db.example.com'" in dsn
+    assert "password='it\\'s secret'" in dsn
+
+    monkeypatch.setattr(Config, 'DB_HOST', None)
+    with pytest.raises(ValueError):
+        Config.get_db_connection_string()
+
+
+def test_checkout_commits_and_reuses_connection(fake_pool):
+    with fake_pool.connection() as conn:
+        first = conn
+    with fake_pool.connection() as conn:
+        assert conn is first
+    assert first.commits == 2
+    assert fake_pool.stats()['idle'] == 1
+
+
+def test_error_rolls_back_and_keeps_connection(fake_pool):
+    with pytest.raises(ValueError):
+        with fake_pool.connection() as conn:
+            raise ValueError('bad input')
+    assert conn.rollbacks == 1 and not conn.closed
+    with fake_pool.connection() as again:
+        assert again is conn
+
+
+def test_broken_connection_is_discarded(fake_pool):
+    with pytest.raises(psycopg2.OperationalError):
+        with fake_pool.connection() as conn:
+            conn.broken = True
+            conn.cursor().execute('SELECT 1')
+    with fake_pool.connection() as fresh:
+        assert fresh is not conn
+    assert conn.closed
+
+
+def test_idle_connection_is_validated_on_borrow(fake_pool, monkeypatch):
+    monkeypatch.setattr(Config, 'DB_POOL_VALIDATE_AFTER', 0)
+    with fake_pool.connection() as conn:
+        pass
+    conn.broken = True  # e.g. the server restarted while the connection sat idle
+    with fake_pool.connection() as fresh:
+        assert fresh is not conn
+    with fake_pool.connection() as pinged:
+        assert pinged is fresh
+    assert fresh.statements == ['SELECT 1']
+
+
+def test_connection_recycled_after_max_lifetime(fake_pool, monkeypatch):
+    with fake_pool.connection() as conn:
+        pass
+    monkeypatch.setattr(Config, 'DB_POOL_MAX_LIFETIME', 0)
+    with fake_pool.connection() as fresh:
+        assert fresh is not conn
+    assert conn.closed
+
+
+def test_connections_above_the_minimum_are_kept(fake_pool):
+    burst = [fake_pool.get_connection(), fake_pool.get_connection()]
+    for conn in burst:
+        fake_pool.return_connection(conn)
+
+    assert not any(conn.closed for conn in burst)
+    assert fake_pool.stats()['idle'] == 2
+    with fake_pool.connection() as conn:
+        assert conn in burst
+    assert len(FakeConnection.opened) == 2
+    assert set(fake_pool._returned) == set(burst)
+
+
+def test_borrowers_wait_then_time_out(fake_pool):
+    held = [fake_pool.get_connection(), fake_pool.get_connection()]
+    with pytest.raises(PoolTimeout):
+        fake_pool.get_connection()
+
+    released = threading.Timer(0.01, fake_pool.return_connection, args=(held.pop(),))
+    released.start()
+    conn = fake_pool.get_connection(timeout=1)
+    fake_pool.return_connection(conn)
+    fake_pool.return_connection(held.pop())
+    assert fake_pool.stats()['in_use'] == 0
+
+
+def test_child_process_never_touches_inherited_connections(fake_pool):
+    with fake_pool.connection() as parent_conn:
+        pass
+    inherited = fake_pool._pool
+    fake_pool._after_fork_in_child()  # what os.register_at_fork runs in a gunicorn worker
+
+    with fake_pool.connection() as child_conn:
+        assert child_conn is not parent_conn
+    assert not parent_conn.closed
+    assert inherited in fake_pool._inherited
+    fake_pool._inherited.remove(inherited)
+
+
+def test_postgres_backend_shapes_rows_like_postgrest(fake_pool, monkeypatch):
+    monkeypatch.setattr(Config, 'DATABASE_BACKEND', 'postgres')
+    backend = get_backend()
+    assert isinstance(backend, PostgresBackend)
+
+    with fake_pool.connection() as conn:
+        pass
+    conn.results = [
+        [{'id': 1, 'email': 'a@example.com', 'created_at': datetime(2024, 1, 2, 3, 4, 5),
+          'client_count': 2}],
+        [{'id': 7, 'name': 'C', 'email': 'c@example.com', 'renewal_date': date(2025, 1, 1)}],
+        [{'account_id': 1, 'id': None, 'name': None, 'email': None, 'renewal_date': None}],
+        [],
+        [{'account_id': 1, 'id': 7, 'name': 'C', 'email': 'c@example.com', 'renewal_date': date(2025, 1, 1)},
+         {'account_id': 3, 'id': None, 'name': None, 'email': None, 'renewal_date': None}],
+    ]
+    assert backend.accounts_with_client_counts() == [{
+        'id': 1, 'email': 'a@example.com', 'created_at': '2024-01-02T03:04:05',
+        'account_clients': [{'count': 2}]
+    }]
+    assert backend.clients_page(None, 10)[0]['renewal_date'] == '2025-01-01'
+    assert backend.account_clients(1) == []  # account without clients
+    assert backend.account_clients(2) is None  # no such account
+    assert backend.clients_for_accounts([1, 2, 3]) == {
+        1: [{'id': 7, 'name': 'C', 'email': 'c@example.com', 'renewal_date': '2025-01-01'}],
+        3: []
+    }
+
+
+@pytest.mark.skipif(not os.getenv('TEST_DATABASE_URL'), reason='TEST_DATABASE_URL not set')
+def test_pool_against_postgres(monkeypatch):
+    """Runs against a real server; TEST_DATABASE_URL must point at a throwaway database"""
+    monkeypatch.setattr(Config, 'DATABASE_URL', os.environ['TEST_DATABASE_URL'])
+    DatabasePool.close_pool()
+    try:
+        with DatabasePool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+                assert cur.fetchone()[0] == 1
+        assert DatabasePool.stats()['idle'] >= 1
+    finally:
+        DatabasePool.close_pool()
+
+
+def test_default_backend_is_postgrest():
+    assert get_backend().name == Config.DATABASE_BACKEND == 'postgrest'
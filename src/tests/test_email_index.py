@@ -0,0 +1,145 @@
+import pytest
+
+from bulk_import import import_accounts
+from config import Config
+from email_index import BloomFilter, email_index
+from password_hasher import PasswordHasher
+
+
+@pytest.fixture
+def index(app_client, fake_db, monkeypatch):
+    fake_db.tables['accounts'] = [{'id': 1, 'email': 'owner@example.com', 'password': 'x'}]
+    fake_db.tables['clients'] = [{'id': i, 'name': f'Client {i}', 'email': f'c{i}@example.com',
+                                  'renewal_date': '2025-01-01'} for i in range(1, 6)]
+    monkeypatch.setattr(email_index, 'enabled', True)
+    monkeypatch.setattr(email_index, 'ensure_started', lambda: None)  # loaded inline instead
+    fake_db.bump_version('accounts', 'clients')
+    email_index.refresh_stale()
+    fake_db.reset_calls()
+    return email_index
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(10000, error_rate=0.01)
+    for i in range(10000):
+        bloom.add(f'user{i}@example.com')
+
+    assert all(f'user{i}@example.com' in bloom for i in range(10000))
+    false_positives = sum(f'other{i}@example.org' in bloom for i in range(10000))
+    assert false_positives / 10000 < 0.02
+    assert bloom.hashes == 7 and bloom.size_bytes == 11982
+    assert bloom.expected_error_rate() == pytest.approx(0.01, rel=0.05)
+
+
+def test_check_client_answers_negatives_from_a_current_filter(app_client, index, fake_db):
+    assert not app_client.post('/check_client', json={'email': 'nobody@example.com'}).get_json()['exists']
+    assert not app_client.post('/check_client', json={'email': 'nobody2@example.com'}).get_json()['exists']
+    # Only the (cached) version stamps were read
+    assert fake_db.calls == [('table_versions', 'select')]
+
+
+def test_check_client_asks_the_database_once_the_stamp_moved(app_client, index, fake_db):
+    # Written by another worker after this one's index was loaded
+    fake_db.tables['clients'].append({'id': 6, 'name': 'Late', 'email': 'late@example.com',
+                                      'renewal_date': '2025-01-01'})
+    fake_db.bump_version('clients')
+    assert not index.might_exist('clients', 'late@example.com')
+
+    assert app_client.post('/check_client', json={'email': 'late@example.com'}).get_json()['exists']
+    assert fake_db.calls == [('table_versions', 'select'), ('clients', 'select')]
+    assert index.stats()['stale'] == 1
+
+    # The loader reloads only the table whose stamp moved
+    fake_db.reset_calls()
+    index.refresh_stale()
+    assert fake_db.calls == [('table_versions', 'select'), ('clients', 'select')]
+    assert index.might_exist('clients', 'late@example.com')
+
+
+def test_add_account_reports_duplicates_the_index_missed(app_client, index, fake_db, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, 'hash_password', lambda password: 'hashed')
+    fake_db.tables['accounts'].append({'id': 2, 'email': 'late@example.com', 'password': 'x'})
+
+    response = app_client.post('/add_account', data={'email': 'late@example.com', 'password': 'Secret123'},
+                               follow_redirects=True)
+
+    assert 'An account with this email already exists' in response.get_data(as_text=True)
+    assert fake_db.calls[0] == ('accounts', 'insert')
+    assert index.might_exist('accounts', 'late@example.com')
+
+
+def test_import_marks_only_the_missed_duplicate(index, fake_db):
+    fake_db.tables['accounts'].append({'id': 2, 'email': 'late@example.com', 'password': 'x'})
+    rows = [{'email': email, 'password': 'Secret123'}
+            for email in ('new1@example.com', 'late@example.com', 'new2@example.com')]
+
+    result = import_accounts(rows, client=fake_db, hasher=PasswordHasher(rounds=4, pool_size=0))
+
+    assert [r['status'] for r in result['results']] == ['created', 'duplicate', 'created']
+    assert len(fake_db.tables['accounts']) == 4
+
+
+def test_add_account_skips_duplicate_query_for_new_emails(app_client, index, fake_db, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, 'hash_password', lambda password: 'hashed')
+
+    app_client.post('/add_account', data={'email': 'new@example.com', 'password': 'Secret123'})
+    assert fake_db.calls == [('accounts', 'insert')]
+
+    # Recorded on write, so the next attempt runs the duplicate check
+    fake_db.reset_calls()
+    app_client.post('/add_account', data={'email': 'new@example.com', 'password': 'Secret123'})
+    assert fake_db.calls[0] == ('accounts', 'select')
+    assert len(fake_db.tables['accounts']) == 2
+
+
+def test_added_clients_are_possible_after_write(app_client, index, fake_db):
+    app_client.post('/add_client', data={'name': 'Zoe', 'email': 'zoe@example.com',
+                                         'account_id': '1', 'renewal_date': '2026-01-01'})
+
+    assert app_client.post('/check_client', json={'email': 'zoe@example.com'}).get_json()['exists']
+
+
+def test_import_skips_duplicate_query_when_all_emails_are_new(index, fake_db):
+    rows = [{'email': f'new{i}@example.com', 'password': 'Secret123'} for i in range(3)]
+
+    import_accounts(rows, client=fake_db, hasher=PasswordHasher(rounds=4, pool_size=0))
+
+    assert fake_db.calls == [('accounts', 'insert')]
+
+
+def test_unstamped_tables_prove_nothing(index, fake_db):
+    index.load()  # no stamps
+
+    assert not index.definitely_absent('clients', 'nobody@example.com', None)
+    assert not index.definitely_absent('clients', 'nobody@example.com', 1)
+
+
+def test_load_pages_through_emails(index, fake_db, monkeypatch):
+    monkeypatch.setattr(Config, 'EMAIL_INDEX_PAGE_SIZE', 2)
+
+    index.load()
+
+    assert fake_db.calls == [('accounts', 'select')] + [('clients', 'select')] * 3
+    assert index.stats()['tables']['clients']['emails'] == 5
+
+
+def test_everything_is_possible_until_loaded(app_client, fake_db, monkeypatch):
+    monkeypatch.setattr(email_index, 'enabled', True)
+    monkeypatch.setattr(email_index, 'ensure_started', lambda: None)
+
+    assert email_index.might_exist('clients', 'anyone@example.com')
+    app_client.post('/check_client', json={'email': 'anyone@example.com'})
+    assert fake_db.calls == [('table_versions', 'select'), ('clients', 'select')]
+
+
+def test_loader_thread_loads_in_background(app_client, fake_db, monkeypatch):
+    fake_db.tables['clients'] = [{'id': 1, 'email': 'c1@example.com'}]
+    monkeypatch.setattr(email_index, 'enabled', True)
+
+    monkeypatch.setattr(email_index, 'refresh', 0)
+    app_client.get('/health/email_index')
+    email_index._thread.join(timeout=5)
+    assert not email_index.might_exist('clients', 'new@example.com')
+    assert email_index.might_exist('clients', 'c1@example.com')
@@ -0,0 +1,118 @@
+import pytest
+
+import events
+from config import Config
+from events import EventBus, SQLiteEventBus
+
+
+@pytest.fixture
+def short_streams(monkeypatch):
+    monkeypatch.setattr(Config, 'SERVER_MODE', 'asgi')  # streams are only served there
+    monkeypatch.setattr(Config, 'EVENTS_STREAM_MAX_SECONDS', 0.2)
+    monkeypatch.setattr(Config, 'EVENTS_HEARTBEAT', 0.05)
+
+
+def published():
+    return [(event_type, data) for _, event_type, data in events.event_bus.since(0)]
+
+
+def test_bus_replays_buffered_events_and_resets_past_them():
+    bus = EventBus(buffer_size=3)
+    for n in range(5):
+        bus.publish('tick', {'n': n})
+
+    assert [event[0] for event in bus.since(2)] == [3, 4, 5]
+    assert bus.since(5) == []
+    assert bus.since(1) is None  # event 2 has left the buffer
+    assert bus.since(9) is None  # an id from another log
+    assert bus.stats()['resets'] == 2
+
+
+def test_sqlite_log_is_shared_with_the_same_ids(tmp_path):
+    path = str(tmp_path / 'events.sqlite3')
+    first, second, late = (SQLiteEventBus(path, poll_interval=60) for _ in range(3))
+    first.publish('client_added', {'id': 6})  # before any reader started
+    try:
+        first.ensure_started()
+        second.ensure_started()
+        first.publish('client_added', {'id': 7})
+        second.read()
+
+        assert first.since(1) == second.since(1) == [(2, 'client_added', {'id': 7})]
+        # A worker starting later primes from the log's tail, so reconnects can resume on it
+        late.ensure_started()
+        assert [event[0] for event in late.since(0)] == [1, 2]
+    finally:
+        for bus in (first, second, late):
+            bus.stop()
+
+
+def test_stream_replays_from_last_event_id(app_client, fake_db, short_streams):
+    fake_db.tables['clients'] = [{'id': 10, 'name': 'C', 'email': 'c@example.com', 'renewal_date': '2025-01-01'}]
+    app_client.post('/renew_client', json={'client_id': 10, 'renewal_date': '2026-01-01'})
+
+    response = app_client.get('/events', headers={'Last-Event-ID': '0'})
+    body = response.get_data(as_text=True)
+
+    assert response.mimetype == 'text/event-stream'
+    assert body.startswith('retry: 3000\n\n')
+    assert 'id: 1\nevent: clients_renewed\ndata: {"ids":[10],"renewal_date":"2026-01-01"}\n\n' in body
+    assert body.endswith(events.KEEPALIVE)
+    assert events.event_bus.stats()['streams'] == 0
+
+
+def test_new_streams_start_from_now_and_stale_ones_reset(app_client, short_streams):
+    for n in range(150):
+        events.publish('tick', n=n)
+
+    assert 'event: tick' not in app_client.get('/events').get_data(as_text=True)
+    assert 'id: 150\nevent: reset' in app_client.get('/events?last_event_id=3').get_data(as_text=True)
+
+
+def test_sync_workers_keep_polling_instead_of_streaming(app_client, monkeypatch):
+    assert app_client.get('/events').status_code == 204
+    clients_page = app_client.get('/clients').get_data(as_text=True)
+    assert 'setInterval(updateStatus, 30000)' in clients_page
+    assert 'LokiEvents.start()' not in clients_page
+    assert 'LokiEvents.start()' not in app_client.get('/').get_data(as_text=True)
+
+    monkeypatch.setattr(Config, 'SERVER_MODE', 'asgi')
+    assert 'LokiEvents.start()' in app_client.get('/clients').get_data(as_text=True)
+
+
+def test_write_routes_publish(app_client, fake_db, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, 'hash_password', lambda password: 'hashed')
+
+    app_client.post('/add_account', data={'email': 'a@example.com', 'password': 'Secret123'})
+    app_client.post('/update_status', data={'account_id': '1', 'status': 'suspended'})
+    app_client.post('/add_client', data={'name': 'Zoe', 'email': 'zoe@example.com',
+                                         'account_id': '1', 'renewal_date': '2026-01-01'})
+    app_client.post('/unlink_client', json={'client_id': 1, 'account_id': 1})
+    app_client.post('/link_client', json={'client_id': 1, 'account_id': 1})
+    app_client.post('/renew_clients', json={'client_ids': [1], 'extend_months': 1})
+    app_client.post('/delete_account', data={'account_id': '1'})
+    app_client.post('/delete_account', data={'account_id': '1'})  # not found: nothing to publish
+
+    assert [event_type for event_type, _ in published()] == [
+        'account_added', 'account_updated', 'client_added', 'client_unlinked', 'client_linked',
+        'clients_renewed', 'account_deleted'
+    ]
+    assert published()[2][1] == {'id': 1, 'name': 'Zoe', 'email': 'zoe@example.com',
+                                  'renewal_date': '2026-01-01', 'account_id': 1}
+    assert published()[5][1] == {'ids': [1], 'renewal_date': None}
+
+
+def test_health_publishes_status_transitions_only(app_client, monkeypatch):
+    from health_probe import health_prober
+    health_prober.probe_once()
+    health_prober.probe_once()
+    assert published() == []
+
+    monkeypatch.setattr(health_prober, 'probe', lambda: 1 / 0)
+    health_prober.probe_once()
+    health_prober.probe_once()
+
+    [(event_type, data)] = published()
+    assert event_type == 'health'
+    assert (data['status'], data['previous'], data['error']) == ('unhealthy', 'healthy', 'division by zero')
@@ -0,0 +1,98 @@
+import pytest
+
+from cache import cache
+from fragments import FragmentCache, fragment_cache
+
+
+def render_calls(cache_, rows, version=None):
+    rendered = []
+
+    def render_row(row):
+        rendered.append(row['id'])
+        return f"<li>{row['name']}</li>"
+
+    body = cache_.render('items', rows, render_row, ('name',), version)
+    return body, rendered
+
+
+def test_only_new_and_changed_rows_are_rendered():
+    fragments = FragmentCache()
+    rows = [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]
+    assert render_calls(fragments, rows) == ('<li>a</li><li>b</li>', [1, 2])
+
+    rows = [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'B'}, {'id': 3, 'name': 'c'}]
+    assert render_calls(fragments, rows) == ('<li>a</li><li>B</li><li>c</li>', [2, 3])
+    assert fragments.stats()['row_hits'] == 1
+
+
+def test_bodies_are_reused_for_the_same_version_only():
+    fragments = FragmentCache()
+    rows = [{'id': 1, 'name': 'a'}]
+    render_calls(fragments, rows, version=(1, 1))
+
+    # Same version: the rows are not even looked at
+    assert render_calls(fragments, [], version=(1, 1)) == ('<li>a</li>', [])
+    assert render_calls(fragments, [], version=(1, 2)) == ('', [])
+    assert render_calls(fragments, rows, version=None) == ('<li>a</li>', [])
+    assert render_calls(fragments, [], version=None) == ('', [])
+    assert fragments.stats()['body_hits'] == 1
+
+
+def test_least_recently_used_rows_are_evicted():
+    fragments = FragmentCache(max_rows=2)
+    render_calls(fragments, [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}])
+    render_calls(fragments, [{'id': 1, 'name': 'a'}, {'id': 3, 'name': 'c'}])
+
+    assert render_calls(fragments, [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}])[1] == [2]
+    assert fragments.stats()['evictions'] == 2
+
+
+def test_disabled_cache_renders_every_row():
+    fragments = FragmentCache(enabled=False)
+    render_calls(fragments, [{'id': 1, 'name': 'a'}], version=(1,))
+
+    assert render_calls(fragments, [{'id': 1, 'name': 'a'}], version=(1,))[1] == [1]
+    assert fragments.stats()['rows'] == 0
+
+
+@pytest.fixture
+def seeded(app_client, fake_db):
+    fake_db.tables.update({
+        'accounts': [{'id': i, 'email': f'a{i}@example.com', 'status': 'active',
+                      'created_at': '2024-01-02T03:04:05Z'} for i in (1, 2)],
+        'clients': [{'id': 10, 'name': 'C', 'email': 'c@example.com', 'renewal_date': '2025-01-01'}],
+        'account_clients': [{'id': 1, 'account_id': 1, 'client_id': 10}],
+    })
+    fake_db.bump_version('accounts', 'clients', 'account_clients')
+    return app_client
+
+
+def counted(request, counter='row_renders'):
+    before = fragment_cache.stats()[counter]
+    html = request().get_data(as_text=True)
+    return html, fragment_cache.stats()[counter] - before
+
+
+def test_dashboard_rows_are_rendered_once_per_change(seeded):
+    html, renders = counted(lambda: seeded.get('/'))
+    assert '<td>2024-01-02 03:04:05</td>' in html
+    assert '<option value="10">C (c@example.com)</option>' in html
+    assert '<tr data-account-row="1">' in html and '<tr data-account-row="2">' in html
+    assert renders == 5  # two rows, two account options, one client option
+
+    cache.clear()
+    assert counted(lambda: seeded.get('/'), 'body_hits')[1] == 3
+
+    seeded.post('/update_status', data={'account_id': '2', 'status': 'suspended'})
+    html, renders = counted(lambda: seeded.get('/'))
+    assert '<option value="suspended" selected>' in html
+    assert renders == 1  # only account 2's row
+
+
+def test_client_cards_come_from_the_fragment_cache(seeded):
+    html, renders = counted(lambda: seeded.get('/clients'))
+    assert 'data-client-id="10"' in html
+    assert renders == 1
+
+    cache.clear()
+    assert counted(lambda: seeded.get('/clients'))[1] == 0
@@ -0,0 +1,127 @@
+import os
+from contextlib import contextmanager
+
+import pytest
+
+from config import Config
+from db import DatabasePool
+from health_checker import HealthChecker, TABLES_QUERY
+
+
+class CatalogCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=()):
+        self.conn.statements.append(sql)
+        self.rows = self.conn.catalog if sql == TABLES_QUERY else [{'?column?': 1}]
+
+    def fetchall(self):
+        return self.rows
+
+
+class CatalogConnection:
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.statements = []
+
+    def cursor(self, cursor_factory=None):
+        return CatalogCursor(self)
+
+
+def index(name, *columns):
+    return {'name': name, 'definition': f"CREATE INDEX {name} ON x ({', '.join(columns)})",
+            'columns': list(columns)}
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    conn = CatalogConnection([
+        {'table_name': 'clients', 'table_exists': True, 'estimated_rows': 2500000,
+         'indexes': [index('clients_pkey', 'id')]},
+        {'table_name': 'accounts', 'table_exists': True, 'estimated_rows': 40, 'indexes': []},
+        {'table_name': 'account_clients', 'table_exists': True, 'estimated_rows': 120,
+         'indexes': [index('account_clients_account_id_client_id_key', 'account_id', 'client_id')]},
+    ])
+    borrowed = []
+
+    @contextmanager
+    def connection(timeout=None):
+        borrowed.append(conn)
+        yield conn
+
+    monkeypatch.setattr(DatabasePool, 'connection', connection)
+    conn.borrowed = borrowed
+    return conn
+
+
+def test_check_uses_one_pooled_connection_and_catalog_query(catalog):
+    status = HealthChecker().check_database(force=True)
+
+    assert status['status'] == 'healthy'
+    assert len(catalog.borrowed) == 1
+    assert catalog.statements == ['SELECT 1', TABLES_QUERY]
+    assert not any('COUNT(*)' in sql for sql in catalog.statements)
+    assert status['tables']['clients']['row_count'] == 2500000
+    assert set(status['tables']) == {'clients', 'accounts', 'account_clients'}
+
+
+def test_check_is_cached(catalog):
+    checker = HealthChecker()
+    checker.check_database()
+    checker.check_database()
+
+    assert len(catalog.borrowed) == 1
+
+
+def test_missing_table_reported(catalog):
+    catalog.catalog[2] = {'table_name': 'account_clients', 'table_exists': False,
+                          'estimated_rows': 0, 'indexes': []}
+
+    tables = HealthChecker().check_database(force=True)['tables']
+
+    assert tables['account_clients'] == {'exists': False,
+                                         'error': "Table 'account_clients' does not exist"}
+
+
+def test_recommendations_use_index_metadata(catalog):
+    messages = [r['message'] for r in HealthChecker().get_recommendations()]
+
+    # The composite (account_id, client_id) index cannot serve lookups by client_id
+    assert "Add index on account_clients.client_id for better query performance" in messages
+    assert not any('account_clients.account_id' in message for message in messages)
+    assert any('archiving old data from clients' in message for message in messages)
+
+
+def test_unreachable_database_is_unhealthy(monkeypatch):
+    @contextmanager
+    def connection(timeout=None):
+        raise Exception('could not connect to server')
+        yield
+
+    monkeypatch.setattr(DatabasePool, 'connection', connection)
+    checker = HealthChecker()
+
+    assert checker.check_database(force=True)['status'] == 'unhealthy'
+    assert checker.get_recommendations() == []
+
+
+@pytest.mark.skipif(not os.getenv('TEST_DATABASE_URL'), reason='TEST_DATABASE_URL not set')
+def test_catalog_query_against_postgres(monkeypatch):
+    """Runs against a real server; TEST_DATABASE_URL must point at a database with the schema applied"""
+    monkeypatch.setattr(Config, 'DATABASE_URL', os.environ['TEST_DATABASE_URL'])
+    DatabasePool.close_pool()
+    try:
+        tables = HealthChecker().check_database(force=True)['tables']
+        assert tables['account_clients']['exists']
+        leading = {idx['columns'][0] for idx in tables['account_clients']['indexes']}
+        assert {'account_id', 'client_id'} <= leading
+    finally:
+        DatabasePool.close_pool()
@@ -0,0 +1,71 @@
+import time
+
+import health_probe
+from health_probe import HealthProber
+
+
+def test_health_endpoints_answer_from_memory(app_client, fake_db, monkeypatch):
+    # Push the background thread's first probe to the end of its interval
+    monkeypatch.setattr(health_probe.random, 'uniform', lambda low, high: high)
+    responses = [app_client.get(path) for path in ('/health', '/health/database', '/health/live') * 10]
+
+    assert all(response.status_code == 200 for response in responses)
+    assert responses[0].get_json()['status'] == 'healthy'
+    assert responses[0].get_json()['age_seconds'] is not None
+    assert responses[2].get_json()['services']['database']['status'] == 'healthy'
+    # One inline probe on the first request; the rest are served from the prober's state
+    assert fake_db.calls == [('accounts', 'select')]
+
+
+def test_failed_probe_reports_unhealthy(app_client, fake_db, monkeypatch):
+    def broken(*args, **kwargs):
+        raise Exception('connection refused')
+    monkeypatch.setattr(fake_db, 'table', broken)
+
+    response = app_client.get('/health')
+    assert response.status_code == 503
+    assert response.get_json()['error'] == 'connection refused'
+
+    live = app_client.get('/health/live')
+    assert live.status_code == 500 and live.get_json()['status'] == 'error'
+
+
+def test_stale_result_is_degraded():
+    prober = HealthProber(probe=lambda: None, interval=60, stale_after=0.01)
+    try:
+        assert prober.snapshot()['status'] == 'healthy'
+        time.sleep(0.02)
+        snapshot = prober.snapshot()
+        assert snapshot['status'] == 'degraded' and snapshot['stale']
+    finally:
+        prober.stop()
+
+
+def test_background_thread_refreshes_state():
+    calls = []
+    prober = HealthProber(probe=lambda: calls.append(1), interval=0.01, jitter=0.5)
+    try:
+        prober.ensure_started()
+        time.sleep(0.2)
+        assert len(calls) > 3
+        assert prober.snapshot()['age_seconds'] < 0.1
+    finally:
+        prober.stop()
+
+
+def test_jittered_delays_stay_within_bounds():
+    prober = HealthProber(probe=lambda: None, interval=10, jitter=0.2)
+    delays = [prober._next_delay() for _ in range(200)]
+
+    assert all(8 <= delay <= 12 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_zero_interval_probes_on_every_request():
+    calls = []
+    prober = HealthProber(probe=lambda: calls.append(1), interval=0)
+
+    prober.snapshot()
+    assert prober.snapshot()['status'] == 'healthy'
+
+    assert len(calls) == 2 and prober._thread is None
@@ -0,0 +1,68 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from supabase import create_client
+
+import http_transport
+from http_transport import TransportSettings, install_pooled_transport, transport_stats
+
+
+class PostgrestStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    client_ports = set()
+
+    def do_GET(self):
+        PostgrestStub.client_ports.add(self.client_address[1])
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        body = b'[{"id": 1}]'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def pooled_client():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PostgrestStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    PostgrestStub.client_ports = set()
+    client = create_client(f'http://127.0.0.1:{server.server_port}', 'eyJhbGciOiJIUzI1NiJ9.e30.test')
+    install_pooled_transport(client, TransportSettings(max_connections=4, max_keepalive_connections=2))
+    yield client
+    server.shutdown()
+
+
+def test_requests_reuse_a_kept_alive_connection(pooled_client):
+    for _ in range(5):
+        assert pooled_client.table('accounts').select('id').execute().data == [{'id': 1}]
+
+    assert len(PostgrestStub.client_ports) == 1
+    stats = transport_stats()
+    assert (stats['open'], stats['idle'], stats['waiting'], stats['initialized']) == (1, 1, 0, True)
+
+
+def test_pool_limits_come_from_settings(pooled_client):
+    pooled_client.table('accounts').select('id').execute()
+
+    pool = http_transport._registry.client.transport._pool
+    assert pool._max_connections == 4
+    assert pool._max_keepalive_connections == 2
+
+
+def test_child_process_builds_its_own_pool(pooled_client):
+    pooled_client.table('accounts').select('id').execute()
+    parent_session = pooled_client.postgrest.session
+
+    pid = os.fork()
+    if pid == 0:
+        fresh = pooled_client._postgrest is None and http_transport._registry.client is None
+        fresh = fresh and pooled_client.postgrest.session is not parent_session
+        os._exit(0 if fresh else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
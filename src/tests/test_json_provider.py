@@ -0,0 +1,83 @@
+import dataclasses
+import math
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import json_provider
+from json_provider import OrjsonProvider
+
+
+@dataclasses.dataclass
+class Renewal:
+    client_id: int
+    months: int
+
+
+PAYLOAD = {
+    'zeta': [1, 2.5, None, True],
+    'alpha': {'renewal_date': date(2025, 1, 31), 'checked_at': datetime(2025, 1, 31, 12, 30)},
+    'amount': Decimal('19.90'),
+    'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'renewal': Renewal(10, 12),
+    'counts': {2: 'two', 1: 'one'},
+}
+
+
+@pytest.fixture
+def providers():
+    app = Flask(__name__)  # providers only hold a weak reference to their app
+    with app.app_context():
+        yield DefaultJSONProvider(app), OrjsonProvider(app)
+
+
+def test_output_matches_the_stdlib_provider(providers):
+    stdlib, fast = providers
+
+    assert fast.dumps(PAYLOAD) == stdlib.dumps(PAYLOAD, separators=(',', ':'))
+    assert fast.loads(fast.dumps(PAYLOAD))['alpha']['renewal_date'] == 'Fri, 31 Jan 2025 00:00:00 GMT'
+
+
+def test_responses_are_byte_identical(providers):
+    stdlib, fast = providers
+
+    assert fast.response(PAYLOAD).get_data() == stdlib.response(PAYLOAD).get_data()
+    assert fast.response(PAYLOAD).mimetype == 'application/json'
+
+
+def test_falls_back_to_stdlib_for_what_orjson_refuses(providers):
+    _, fast = providers
+
+    assert fast.dumps({'n': 2 ** 70}) == '{"n": 1180591620717411303424}'
+    assert math.isnan(fast.loads('[NaN]')[0])
+    with pytest.raises(ValueError):
+        fast.loads('{not json')
+
+
+def test_init_app_is_opt_in():
+    app = Flask(__name__)
+    json_provider.init_app(app, 'stdlib')
+    assert type(app.json) is DefaultJSONProvider
+
+    json_provider.init_app(app, 'orjson')
+    assert isinstance(app.json, OrjsonProvider)
+    with pytest.raises(ValueError):
+        json_provider.init_app(app, 'simdjson')
+
+
+def test_app_endpoints_serve_the_same_data(app_client, fake_db, monkeypatch):
+    import app as app_module
+    fake_db.tables['clients'] = [{'id': i, 'name': f'Client {i}', 'email': f'c{i}@example.com',
+                                  'renewal_date': '2025-01-01'} for i in range(1, 6)]
+    page = app_client.get('/clients?format=json').get_data()
+    export = app_client.get('/clients?stream=json').get_json()
+
+    monkeypatch.setattr(app_module.app, 'json', OrjsonProvider(app_module.app))
+
+    assert app_client.get('/clients?format=json').get_data() == page
+    # The streams lose the spaces after separators, nothing else
+    assert app_client.get('/clients?stream=json').get_json() == export
@@ -0,0 +1,97 @@
+import os
+import subprocess
+import sys
+
+import httpx
+from flask import Flask
+from prometheus_client.openmetrics.exposition import generate_latest
+from prometheus_client.parser import text_string_to_metric_families
+
+import http_transport
+import metrics
+from config import Config
+from http_transport import ObservedTransport, describe_request
+from password_hasher import password_hasher
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sample(text, name, **labels):
+    for family in text_string_to_metric_families(text):
+        for s in family.samples:
+            if s.name == name and all(s.labels.get(k) == v for k, v in labels.items()):
+                return s.value
+    return None
+
+
+def test_metrics_endpoint_serves_openmetrics(app_client):
+    app_client.get('/health/cache')
+    before = sample(app_client.get('/metrics').get_data(as_text=True),
+                    'lokiplus_http_requests_total', endpoint='cache_status', status='200') or 0
+    app_client.get('/health/cache')
+
+    response = app_client.get('/metrics')
+    text = response.get_data(as_text=True)
+    assert response.content_type.startswith('application/openmetrics-text')
+    assert text.rstrip().endswith('# EOF')
+    assert sample(text, 'lokiplus_http_requests_total', endpoint='cache_status', status='200') == before + 1
+    assert sample(text, 'lokiplus_http_request_duration_seconds_count', endpoint='cache_status') >= 2
+    assert sample(text, 'lokiplus_cache_entries') is not None
+
+
+def test_cache_and_bcrypt_hooks(app_client, fake_db):
+    fake_db.tables['clients'] = [{'id': 1, 'name': 'C', 'email': 'c@example.com', 'renewal_date': None}]
+    text = app_client.get('/metrics').get_data(as_text=True)
+    hits = sample(text, 'lokiplus_cache_events_total', event='hits') or 0
+    timed = sample(text, 'lokiplus_bcrypt_duration_seconds_count', operation='verify') or 0
+
+    for _ in range(2):
+        app_client.post('/check_client', json={'email': 'c@example.com'})
+    password_hasher._run('verify', lambda: True)
+
+    text = app_client.get('/metrics').get_data(as_text=True)
+    assert sample(text, 'lokiplus_cache_events_total', event='hits') == hits + 1
+    assert sample(text, 'lokiplus_bcrypt_duration_seconds_count', operation='verify') == timed + 1
+
+
+def test_supabase_requests_are_timed_by_table_and_operation():
+    def handler(request):
+        return httpx.Response(200, json=[])
+
+    with httpx.Client(transport=ObservedTransport(httpx.MockTransport(handler)),
+                      base_url='https://example.supabase.co/rest/v1') as client:
+        client.get('/clients', params={'select': '*'})
+
+    text = generate_latest(metrics.collect_registry()).decode()
+    assert sample(text, 'lokiplus_supabase_request_duration_seconds_count',
+                  table='clients', operation='select', status='200') >= 1
+
+
+
+def test_disabled_metrics_leave_the_transport_unobserved(monkeypatch):
+    monkeypatch.setattr(Config, 'METRICS_ENABLED', False)
+    monkeypatch.setattr(http_transport, '_observers', [])
+    metrics.init_app(Flask(__name__))
+
+    assert http_transport._observers == []
+
+
+def test_describe_request():
+    base = 'https://example.supabase.co/rest/v1'
+    assert describe_request(httpx.Request('POST', f'{base}/rpc/link_client_to_account')) == \
+        ('link_client_to_account', 'rpc')
+    assert describe_request(httpx.Request('POST', f'{base}/clients',
+                                          headers={'Prefer': 'resolution=merge-duplicates'})) == \
+        ('clients', 'upsert')
+    assert describe_request(httpx.Request('PATCH', f'{base}/clients?id=eq.1')) == ('clients', 'update')
+
+
+def test_samples_from_all_workers_are_merged(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path), PYTHONPATH=SRC_DIR)
+    worker = "import metrics; metrics.observe_request('index', 'GET', 200, 0.02)"
+    for _ in range(2):
+        subprocess.run([sys.executable, '-c', worker], env=env, check=True, cwd=SRC_DIR)
+
+    text = generate_latest(metrics.collect_registry(str(tmp_path))).decode()
+    assert sample(text, 'lokiplus_http_requests_total', endpoint='index', status='200') == 2
+    assert sample(text, 'lokiplus_http_request_duration_seconds_count', endpoint='index') == 2
@@ -0,0 +1,75 @@
+import pytest
+
+from password_hasher import PasswordHasher, HasherBusy, HashSlots
+
+
+@pytest.fixture
+def hasher(tmp_path):
+    pooled = PasswordHasher(rounds=4, pool_size=1, max_pending=1, retry_after=7, slots_dir=str(tmp_path))
+    yield pooled
+    pooled.shutdown()
+
+
+def test_hash_uses_configured_cost(hasher):
+    hashed = hasher.hash('Secret123')
+
+    assert hashed.startswith('$2b$04$')
+    assert hasher.verify('Secret123', hashed)
+    assert not hasher.verify('wrong', hashed)
+    assert hasher.stats()['hashed'] == 1
+
+
+def test_slots_are_shared_by_every_worker_on_the_host(hasher, tmp_path):
+    other_worker = PasswordHasher(rounds=4, max_pending=1, slots_dir=str(tmp_path))
+    slot = other_worker._slots.acquire()  # a hash in flight in another worker
+    try:
+        with pytest.raises(HasherBusy) as excinfo:
+            hasher.hash('Secret123')
+    finally:
+        other_worker._slots.release(slot)
+
+    assert excinfo.value.retry_after == 7
+    assert hasher.stats()['rejected'] == 1
+    assert hasher.hash('Secret123').startswith('$2b$04$')
+
+
+def test_threads_of_one_worker_share_its_slots(hasher):
+    slot = hasher._slots.acquire()
+    try:
+        with pytest.raises(HasherBusy):
+            hasher.verify('Secret123', '$2b$04$' + 'x' * 53)
+    finally:
+        hasher._slots.release(slot)
+
+
+def test_batch_is_spread_over_the_thread_pool(hasher):
+    hashed = hasher.hash_many(['Secret123', 'Other456'])
+
+    assert [hasher.verify(p, h) for p, h in zip(['Secret123', 'Other456'], hashed)] == [True, True]
+    assert hasher.stats()['hashed'] == 2
+
+
+def test_add_account_answers_503_with_retry_after(app_client, monkeypatch):
+    import password_hasher as module
+
+    def busy(*args):
+        raise HasherBusy(7)
+    monkeypatch.setattr(module.password_hasher, '_run', busy)
+
+    response = app_client.post('/add_account', data={'email': 'new@example.com', 'password': 'Secret123'})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '7'
+
+
+def test_one_fork_hook_resets_every_instance(hasher, tmp_path):
+    import password_hasher as module
+
+    other = HashSlots(1, str(tmp_path / 'other'))
+    held = [hasher._slots.acquire(), other.acquire()]
+    assert held == [0, 0]
+
+    module._after_fork_in_child()  # what os.register_at_fork runs in a gunicorn worker
+
+    assert hasher._slots._files == {} and other._files == {}
+    assert hasher._slots._locks[0].acquire(blocking=False) and other._locks[0].acquire(blocking=False)
@@ -0,0 +1,122 @@
+import os
+import subprocess
+import sys
+
+from flask import Flask
+from flask_limiter import Limiter
+from limits import RateLimitItemPerMinute
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+
+from rate_limit_storage import SQLiteStorage, storage_stats
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_storage(tmp_path, **options):
+    return storage_from_string(f"sqlite://{tmp_path / 'limits.sqlite3'}", **options)
+
+
+def test_scheme_is_registered(tmp_path):
+    storage = make_storage(tmp_path)
+    assert isinstance(storage, SQLiteStorage)
+    assert storage.check()
+
+
+def test_sliding_window_refuses_over_limit(tmp_path):
+    limiter = SlidingWindowCounterRateLimiter(make_storage(tmp_path))
+    item = RateLimitItemPerMinute(3)
+
+    assert [limiter.hit(item, '10.0.0.1') for _ in range(4)] == [True, True, True, False]
+    assert limiter.hit(item, '10.0.0.2')
+    assert limiter.get_window_stats(item, '10.0.0.1').remaining == 0
+
+
+def test_previous_window_is_weighted(tmp_path, monkeypatch):
+    storage = make_storage(tmp_path)
+    clock = [6000.0]
+    monkeypatch.setattr('rate_limit_storage.time.time', lambda: clock[0])
+
+    for _ in range(10):
+        assert storage.acquire_sliding_window_entry('ip', 10, 60)
+    assert not storage.acquire_sliding_window_entry('ip', 10, 60)
+
+    # A quarter into the next window 7.5 of the previous 10 still count (floored with the new hits)
+    clock[0] = 6075.0
+    taken = sum(storage.acquire_sliding_window_entry('ip', 10, 60) for _ in range(10))
+    assert taken == 3
+
+
+def test_idle_keys_expire_and_are_swept(tmp_path, monkeypatch):
+    storage = make_storage(tmp_path, sweep_interval=0)
+    clock = [1000.0]
+    monkeypatch.setattr('rate_limit_storage.time.time', lambda: clock[0])
+
+    for n in range(50):
+        storage.incr(f'ip-{n}', 60)
+    assert storage.stats()['keys'] == 50
+
+    clock[0] += 61
+    assert storage.get('ip-0') == 0
+    storage.incr('ip-new', 60)
+    stats = storage.stats()
+    assert stats['keys'] == 1
+    assert stats['expired_pending_sweep'] == 0
+
+
+def test_stats_report_bytes_per_key(tmp_path):
+    storage = make_storage(tmp_path)
+    for n in range(200):
+        storage.incr(f'LIMITER/10.0.{n // 256}.{n % 256}/index/200/1/day', 86400)
+
+    stats = storage.stats()
+    assert stats['keys'] == 200
+    assert 16 < stats['payload_bytes_per_key'] < stats['bytes_per_key']
+    assert stats['file_bytes'] > 0
+    assert storage_stats(storage) == stats
+
+
+def test_counters_are_shared_between_processes(tmp_path):
+    uri = f"sqlite://{tmp_path / 'limits.sqlite3'}"
+    worker = (
+        "import sys; import rate_limit_storage\n"
+        "from limits.storage import storage_from_string\n"
+        "storage = storage_from_string(sys.argv[1])\n"
+        "print(sum(storage.acquire_sliding_window_entry('ip', 5, 86400) for _ in range(4)))"
+    )
+    # A day-long window: two runs straddling a window boundary would see the
+    # first run's entries down-weighted and take more than one slot
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    taken = [
+        int(subprocess.run([sys.executable, '-c', worker, uri], env=env, check=True, cwd=SRC_DIR,
+                           capture_output=True, text=True).stdout)
+        for _ in range(2)
+    ]
+    assert taken == [4, 1]
+
+
+def test_flask_limiter_uses_shared_storage(tmp_path):
+    uri = f"sqlite://{tmp_path / 'limits.sqlite3'}"
+    clients = []
+    for _ in range(2):
+        # Two apps on one file stand in for two gunicorn workers
+        app = Flask(__name__)
+        limiter = Limiter(app=app, key_func=lambda: 'client', storage_uri=uri,
+                          strategy='sliding-window-counter')
+
+        @app.route('/limited')
+        @limiter.limit('3 per minute')
+        def limited():
+            return 'ok'
+
+        clients.append(app.test_client())
+
+    statuses = [clients[n % 2].get('/limited').status_code for n in range(4)]
+    assert statuses == [200, 200, 200, 429]
+
+
+def test_ratelimit_health_endpoint(app_client):
+    body = app_client.get('/health/ratelimit').get_json()
+    assert body['strategy'] == 'sliding-window-counter'
+    assert body['storage']['backend'] == 'sqlite'
+    assert 'bytes_per_key' in body['storage']
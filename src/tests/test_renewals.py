@@ -0,0 +1,143 @@
+import os
+from datetime import date
+
+import pytest
+
+import renewals
+from config import Config
+from db import DatabasePool, PostgresBackend
+
+TODAY = date(2026, 3, 11)  # a Wednesday
+
+
+@pytest.fixture
+def clients(fake_db, monkeypatch):
+    monkeypatch.setattr(renewals, '_today', lambda: TODAY)
+    fake_db.tables['clients'] = [
+        {'id': 1, 'email': 'a@example.com', 'status': 'active', 'renewal_date': '2026-03-01'},
+        {'id': 2, 'email': 'b@example.com', 'status': 'active', 'renewal_date': '2026-03-10'},
+        {'id': 3, 'email': 'c@example.com', 'status': 'active', 'renewal_date': '2026-03-11'},
+        {'id': 4, 'email': 'd@example.com', 'status': 'active', 'renewal_date': '2026-03-15'},
+        {'id': 5, 'email': 'e@example.com', 'status': 'active', 'renewal_date': '2026-03-15'},
+        {'id': 6, 'email': 'f@example.com', 'status': 'active', 'renewal_date': '2026-04-09'},
+        {'id': 7, 'email': 'g@example.com', 'status': 'active', 'renewal_date': '2026-06-01'},
+        {'id': 8, 'email': 'h@example.com', 'status': 'inactive', 'renewal_date': '2026-03-12'},
+        {'id': 9, 'email': 'i@example.com', 'status': 'active', 'renewal_date': None},
+    ]
+    return fake_db
+
+
+def ids(payload):
+    return [client['id'] for client in payload['clients']]
+
+
+def test_due_within_days_pages_in_renewal_order(app_client, clients):
+    first = app_client.get('/renewals/due?days=30&limit=2').get_json()
+    assert ids(first) == [3, 4]
+    assert first['next_cursor'] == '2026-03-15,4'
+    assert (first['from'], first['to']) == ('2026-03-11', '2026-04-10')
+
+    second = app_client.get(f"/renewals/due?days=30&limit=2&after={first['next_cursor']}").get_json()
+    assert ids(second) == [5, 6]
+
+    last = app_client.get('/renewals/due?days=30&limit=2&after=2026-04-09,6').get_json()
+    assert ids(last) == []
+    assert last['next_cursor'] is None
+
+
+def test_due_is_one_indexed_query_per_page(app_client, clients):
+    clients.reset_calls()
+    app_client.get('/renewals/due?days=7')
+
+    # The table_versions read is the ETag's version stamp
+    assert clients.calls == [('table_versions', 'select'), ('clients_by_renewal', 'rpc')]
+
+
+def test_overdue_and_status_filter(app_client, clients):
+    assert ids(app_client.get('/renewals/overdue').get_json()) == [1, 2]
+    assert ids(app_client.get('/renewals/due?days=7&status=inactive').get_json()) == [8]
+
+
+def test_weekly_counts_fill_empty_weeks(app_client, clients):
+    payload = app_client.get('/renewals/weekly?weeks=5').get_json()
+
+    assert payload['weeks'] == [
+        {'week_start': '2026-03-09', 'clients': 4},
+        {'week_start': '2026-03-16', 'clients': 0},
+        {'week_start': '2026-03-23', 'clients': 0},
+        {'week_start': '2026-03-30', 'clients': 0},
+        {'week_start': '2026-04-06', 'clients': 1},
+    ]
+    assert payload['total'] == 5
+
+
+def test_arguments_are_validated(app_client, clients, monkeypatch):
+    monkeypatch.setattr(Config, 'RENEWALS_MAX_DAYS', 10)
+
+    assert app_client.get('/renewals/due?days=soon').status_code == 400
+    assert app_client.get('/renewals/due?days=-1').status_code == 400
+    assert app_client.get('/renewals/overdue?after=42').status_code == 400
+    assert app_client.get('/renewals/overdue?limit=0').status_code == 400
+    assert app_client.get('/renewals/due?days=365').get_json()['to'] == '2026-03-21'
+
+
+def test_bulk_renewal_by_ids_is_one_round_trip(app_client, clients):
+    clients.reset_calls()
+    response = app_client.post('/renew_clients', json={'client_ids': [1, 2, 404], 'renewal_date': '2027-03-01'})
+
+    assert response.get_json() == {'success': True, 'updated': 2, 'failed_ids': [404]}
+    assert clients.calls == [('renew_clients', 'rpc')]
+    renewed = {c['id']: c['renewal_date'] for c in clients.tables['clients']}
+    assert renewed[1] == renewed[2] == '2027-03-01'
+    assert renewed[3] == '2026-03-11'
+
+
+def test_bulk_renewal_of_due_clients_extends_each_date(app_client, clients):
+    response = app_client.post('/renew_clients', json={'due_before': '2026-03-16', 'extend_months': 12})
+
+    assert response.get_json() == {'success': True, 'updated': 5, 'failed_ids': []}
+    renewed = {c['id']: c['renewal_date'] for c in clients.tables['clients']}
+    assert renewed[1] == '2027-03-01'
+    assert renewed[5] == '2027-03-15'
+    assert renewed[6] == '2026-04-09'  # not due yet
+    assert renewed[8] == '2026-03-12'  # inactive
+    assert ids(app_client.get('/renewals/overdue').get_json()) == []
+
+
+def test_bulk_renewal_drops_cached_pages(app_client, clients):
+    assert app_client.get('/clients?format=json').get_json()['clients'][0]['renewal_date'] == '2026-03-01'
+
+    app_client.post('/renew_clients', json={'client_ids': [1], 'extend_months': 1})
+
+    assert app_client.get('/clients?format=json').get_json()['clients'][0]['renewal_date'] == '2026-04-01'
+
+
+@pytest.mark.parametrize('body', [
+    {'renewal_date': '2027-01-01'},
+    {'client_ids': [1], 'due_before': '2026-04-01', 'renewal_date': '2027-01-01'},
+    {'client_ids': [1]},
+    {'client_ids': [], 'renewal_date': '2027-01-01'},
+    {'client_ids': ['1'], 'renewal_date': '2027-01-01'},
+    {'due_before': 'soon', 'extend_months': 1},
+    {'client_ids': [1], 'extend_months': 0},
+])
+def test_bulk_renewal_rejects_bad_requests(app_client, clients, body):
+    response = app_client.post('/renew_clients', json=body)
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+@pytest.mark.skipif(not os.getenv('TEST_DATABASE_URL'), reason='TEST_DATABASE_URL not set')
+def test_renewal_queries_against_postgres(monkeypatch):
+    """Runs against a real server; TEST_DATABASE_URL must point at a database with the schema applied"""
+    monkeypatch.setattr(Config, 'DATABASE_URL', os.environ['TEST_DATABASE_URL'])
+    DatabasePool.close_pool()
+    try:
+        backend = PostgresBackend()
+        page = backend.clients_by_renewal('active', TODAY, date(2026, 4, 11), None, 5)
+        assert all('2026-03-11' <= client['renewal_date'] < '2026-04-11' for client in page)
+        weeks = backend.renewal_week_counts('active', renewals.week_start(TODAY), 4)
+        assert all(row['client_count'] > 0 for row in weeks)
+    finally:
+        DatabasePool.close_pool()
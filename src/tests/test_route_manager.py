@@ -1 +1,104 @@
- 
\ No newline at end of file
+import threading
+
+import pytest
+from flask import Flask
+
+from route_manager import LatencyHistogram, RollingHistogram, RouteManager, route_manager
+
+
+def test_percentiles_within_bucket_error():
+    histogram = LatencyHistogram()
+    for ms in range(1, 1001):
+        histogram.record(ms / 1000)
+
+    summary = histogram.summary()
+    assert summary['count'] == 1000
+    assert summary['max_ms'] == 1000
+    for pct, expected in ((50, 500), (90, 900), (99, 990)):
+        assert expected <= summary[f'p{pct}_ms'] <= expected * 1.19
+
+
+def test_rolling_window_forgets_old_slots():
+    rolling = RollingHistogram(horizon=60, slot_seconds=5)
+    rolling.record(0.5, now=0)
+    rolling.record(0.01, now=100)
+
+    assert rolling.window(60, now=100).count == 1
+    assert rolling.window(60, now=100).max == 0.01
+    assert rolling.window(60, now=200).count == 0
+
+
+def test_concurrent_updates_are_not_lost():
+    manager = RouteManager(windows=[60], slot_seconds=5)
+
+    def hammer():
+        for _ in range(2000):
+            manager.record('index', 0.002)
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    route = manager.generate_report()['routes']['index']
+    assert route['total_calls'] == 16000
+    assert route['latency']['1m']['count'] == 16000
+    assert route['latency']['all']['count'] == 16000
+
+
+def test_hooks_time_every_endpoint():
+    app = Flask(__name__)
+    manager = RouteManager(windows=[60, 300], slot_seconds=5)
+    manager.init_app(app)
+
+    @app.route('/ok')
+    def ok():
+        return 'ok'
+
+    @app.route('/boom')
+    def boom():
+        return 'boom', 500
+
+    client = app.test_client()
+    for _ in range(3):
+        client.get('/ok')
+    client.get('/boom')
+    client.get('/missing')
+
+    report = manager.generate_report()
+    assert report['routes']['ok']['total_calls'] == 3
+    assert report['routes']['ok']['latency']['5m']['p99_ms'] is not None
+    assert report['routes']['boom']['failed_calls'] == 1
+    assert report['routes']['boom']['status'] == 'unhealthy'
+    assert report['routes']['unmatched']['total_calls'] == 1
+    assert manager.summary() == {'status': 'degraded', 'total': 3, 'healthy': 2}
+
+
+def test_monitor_validates_and_records_without_hooks():
+    app = Flask(__name__)
+    manager = RouteManager(windows=[60], slot_seconds=5)
+
+    @app.route('/items', methods=['POST'])
+    @manager.monitor(required_params={'POST': {'count': int}})
+    def items():
+        return 'created'
+
+    client = app.test_client()
+    assert client.post('/items', json={'count': 2}).status_code == 200
+    with pytest.raises(ValueError):
+        app.testing = True
+        client.post('/items', json={'count': 'many'})
+
+    route = manager.generate_report()['routes']['items']
+    assert route['total_calls'] == 2 and route['failed_calls'] == 1
+    assert route['required_params'] == {'POST': {'count': int}}
+
+
+def test_app_routes_are_reported(app_client):
+    app_client.get('/health/cache')
+
+    report = app_client.get('/health/routes').get_json()
+    assert report['routes']['cache_status']['total_calls'] >= 1
+    assert set(report['routes']['cache_status']['latency']) == {'1m', '5m', '15m', 'all'}
+    assert route_manager.summary()['total'] >= 1
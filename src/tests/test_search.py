@@ -0,0 +1,97 @@
+import pytest
+
+import search
+from config import Config
+from search import PrefixIndex
+
+
+@pytest.fixture
+def directory(fake_db):
+    fake_db.tables['clients'] = [
+        {'id': 1, 'name': 'Maria Lopez', 'email': 'maria@example.com'},
+        {'id': 2, 'name': 'Mark Stone', 'email': 'mstone@example.com'},
+        {'id': 3, 'name': 'Jonathan Marsh', 'email': 'jon@example.org'},
+        {'id': 4, 'name': 'Ann Lee', 'email': 'ann.lee@example.net'},
+    ]
+    fake_db.tables['accounts'] = [
+        {'id': 1, 'email': 'marketing@example.com'},
+        {'id': 2, 'email': 'billing@example.com'},
+    ]
+    return fake_db
+
+
+def found(payload):
+    return [(result['kind'], result['id']) for result in payload['results']]
+
+
+@pytest.mark.parametrize('source', ['database', 'memory'])
+def test_prefix_matches_emails_names_and_name_words(app_client, directory, monkeypatch, source):
+    monkeypatch.setattr(Config, 'SEARCH_BACKEND', source)
+
+    payload = app_client.get('/search?q=mar').get_json()
+
+    assert payload['source'] == source
+    # Whole email/name prefixes first, then "Jonathan Marsh" matched on a later word
+    assert found(payload) == [('client', 1), ('account', 1), ('client', 2), ('client', 3)]
+    assert found(app_client.get('/search?q=MAR&kind=account').get_json()) == [('account', 1)]
+
+
+@pytest.mark.parametrize('source', ['database', 'memory'])
+def test_fuzzy_tolerates_typos(app_client, directory, monkeypatch, source):
+    monkeypatch.setattr(Config, 'SEARCH_BACKEND', source)
+
+    payload = app_client.get('/search?q=jonathon&mode=fuzzy').get_json()
+
+    assert payload['mode'] == 'fuzzy'
+    assert found(payload)[0] == ('client', 3)
+    assert found(app_client.get('/search?q=billing&mode=fuzzy&kind=client').get_json()) == []
+
+
+def test_pages_are_capped(app_client, fake_db, monkeypatch):
+    monkeypatch.setattr(Config, 'SEARCH_MAX_RESULTS', 5)
+    fake_db.tables['clients'] = [{'id': i, 'name': f'Client {i}', 'email': f'client{i:02}@example.com'}
+                                 for i in range(1, 21)]
+
+    first = app_client.get('/search?q=client&limit=3').get_json()
+    assert [r['id'] for r in first['results']] == [1, 2, 3]
+    assert first['next_offset'] == 3
+
+    last = app_client.get('/search?q=client&limit=3&offset=3').get_json()
+    assert [r['id'] for r in last['results']] == [4, 5]
+    assert last['next_offset'] is None
+    assert app_client.get('/search?q=client&offset=5').status_code == 400
+
+
+@pytest.mark.parametrize('query', ['q=ma', 'q=mar&kind=users', 'q=mar&mode=regex', 'q=mar&limit=x'])
+def test_invalid_searches_are_rejected(app_client, directory, query):
+    assert app_client.get(f'/search?{query}').status_code == 400
+
+
+def test_auto_falls_back_to_in_process_index(app_client, directory, monkeypatch):
+    monkeypatch.setattr(Config, 'SEARCH_BACKEND', 'auto')
+    del directory.functions['search_directory']  # e.g. migration not applied yet
+
+    payload = app_client.get('/search?q=ann').get_json()
+
+    assert payload['source'] == 'memory'
+    assert found(payload) == [('client', 4)]
+
+
+def test_in_process_index_follows_writes(app_client, directory, monkeypatch):
+    monkeypatch.setattr(Config, 'SEARCH_BACKEND', 'memory')
+    assert found(app_client.get('/search?q=zoe').get_json()) == []
+    directory.tables['accounts'].append({'id': 1, 'email': 'owner@example.com', 'password': 'x'})
+
+    app_client.post('/add_client', data={'name': 'Zoe Quinn', 'email': 'zoe@example.com',
+                                         'account_id': '1', 'renewal_date': '2026-01-01'})
+
+    assert [r['email'] for r in app_client.get('/search?q=zoe').get_json()['results']] == ['zoe@example.com']
+
+
+def test_prefix_index_handles_large_directories():
+    clients = [{'id': i, 'name': f'Person {i}', 'email': f'user{i}@example.com'} for i in range(50000)]
+    index = PrefixIndex([], clients)
+
+    assert sorted(r['id'] for r in index.search('user4999', limit=50)) == [4999] + list(range(49990, 50000))
+    assert [r['id'] for r in index.search('user12345@', limit=5)] == [12345]
+    assert search.trigrams('cat') == {'  c', ' ca', 'cat', 'at '}
@@ -0,0 +1,99 @@
+import json
+import logging
+
+import httpx
+import pytest
+from flask import Flask, jsonify
+
+import tracing
+from config import Config
+from http_transport import ObservedTransport
+
+
+def postgrest_handler(request):
+    if request.url.path.endswith('/accounts'):
+        return httpx.Response(200, json=[{'id': 1}], headers={'Content-Range': '0-0/*'})
+    return httpx.Response(200, json=[], headers={'Content-Range': '*/0'})
+
+
+def make_client():
+    return httpx.Client(transport=ObservedTransport(httpx.MockTransport(postgrest_handler)),
+                        base_url='https://example.supabase.co/rest/v1')
+
+
+@pytest.fixture
+def traced_app(monkeypatch):
+    monkeypatch.setattr(Config, 'SUPABASE_TRACE', True)
+    app = Flask(__name__)
+    tracing.init_app(app)
+
+    @app.route('/two-queries')
+    def two_queries():
+        with make_client() as client:
+            client.get('/accounts', params={'select': 'id', 'id': 'eq.1'})
+            client.get('/clients', params={'select': '*', 'email': 'eq.c@example.com', 'limit': '1'})
+        return jsonify(tracing.current_calls())
+
+    return app
+
+
+def test_calls_are_attached_to_the_request(traced_app):
+    response = traced_app.test_client().get('/two-queries')
+    calls = response.get_json()
+
+    assert [(c['table'], c['operation'], c['rows']) for c in calls] == \
+        [('accounts', 'select', 1), ('clients', 'select', 0)]
+    assert calls[0]['filters'] == {'id': 'eq.1'}
+    assert calls[1]['filters'] == {'email': 'eq.c@example.com'}
+
+    timing = response.headers['Server-Timing']
+    assert timing.startswith('supabase;desc="2 calls";dur=')
+    assert 'sb1;desc="select clients"' in timing
+
+
+def test_traces_do_not_leak_between_requests(traced_app):
+    client = traced_app.test_client()
+    client.get('/two-queries')
+
+    assert len(client.get('/two-queries').get_json()) == 2
+    assert tracing.current_calls() == []
+
+
+def test_slow_calls_are_logged_as_json(traced_app, monkeypatch, caplog):
+    monkeypatch.setattr(Config, 'SLOW_QUERY_MS', 0.000001)
+    with caplog.at_level(logging.WARNING, logger='lokiplus.slow_query'):
+        traced_app.test_client().get('/two-queries')
+
+    entries = [json.loads(record.getMessage()) for record in caplog.records
+               if record.name == 'lokiplus.slow_query']
+    assert len(entries) == 2
+    assert entries[0]['event'] == 'slow_query' and entries[0]['path'] == '/two-queries'
+    assert entries[0]['table'] == 'accounts' and entries[0]['duration_ms'] >= 0
+
+
+def test_disabled_tracing_collects_nothing(monkeypatch):
+    monkeypatch.setattr(Config, 'SUPABASE_TRACE', False)
+    app = Flask(__name__)
+    tracing.init_app(app)
+
+    @app.route('/query')
+    def query():
+        with make_client() as client:
+            client.get('/accounts')
+        return jsonify(tracing.current_calls())
+
+    response = app.test_client().get('/query')
+    assert response.get_json() == []
+    assert 'Server-Timing' not in response.headers
+
+
+def test_end_trace_restores_the_enclosing_trace(monkeypatch):
+    monkeypatch.setattr(Config, 'SUPABASE_TRACE', True)
+    outer = tracing.start_trace('/outer')
+    tracing.current_calls().append({'table': 'accounts'})
+    inner = tracing.start_trace('/inner')
+    tracing.end_trace(inner)
+
+    assert tracing.current_calls() == [{'table': 'accounts'}]
+    tracing.end_trace(outer)
+    assert tracing.current_calls() == []
@@ -0,0 +1,134 @@
+"""
+Per-request tracing of PostgREST calls and the slow-query log.
+
+Every Supabase round trip passes through the observed transport in
+http_transport.py. With ``SUPABASE_TRACE`` on, each call (table, operation,
+filters, rows, duration) is appended to the trace of the request that made
+it and summarised in a ``Server-Timing`` response header. Independently,
+calls slower than ``SLOW_QUERY_MS`` are logged as one JSON object each.
+With both off no observer is registered at all.
+"""
+import json
+import logging
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+from flask import g, request
+
+from config import Config
+from http_transport import add_request_observer, describe_request
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('lokiplus.slow_query')
+
+# Query parameters that shape the result rather than filter rows
+SHAPING_PARAMS = {'select', 'order', 'limit', 'offset', 'on_conflict', 'columns'}
+MAX_TIMING_ENTRIES = 10
+
+_trace: ContextVar[Optional[Dict[str, Any]]] = ContextVar('supabase_trace', default=None)
+_installed = False
+
+
+def _row_count(response) -> Optional[int]:
+    """Rows in a PostgREST response, from ``Content-Range: 0-24/*`` style headers"""
+    if response is None:
+        return None
+    content_range = response.headers.get('content-range', '')
+    span = content_range.split('/', 1)[0]
+    if span == '*':
+        return 0
+    start, _, end = span.partition('-')
+    if start.isdigit() and end.isdigit():
+        return int(end) - int(start) + 1
+    return None
+
+
+def _observe(http_request, response, seconds, error):
+    trace = _trace.get()
+    duration_ms = seconds * 1000
+    slow = Config.SLOW_QUERY_MS > 0 and duration_ms >= Config.SLOW_QUERY_MS
+    if trace is None and not slow:
+        return
+
+    table, operation = describe_request(http_request)
+    params = parse_qsl(http_request.url.query.decode('ascii', 'replace'), keep_blank_values=True)
+    call = {
+        'table': table,
+        'operation': operation,
+        'filters': {key: value for key, value in params if key not in SHAPING_PARAMS},
+        'rows': _row_count(response),
+        'status': response.status_code if response is not None else None,
+        'duration_ms': round(duration_ms, 2)
+    }
+    if error is not None:
+        call['error'] = str(error)
+    if trace is not None:
+        trace['calls'].append(call)
+    if slow:
+        slow_query_logger.warning(json.dumps({
+            'event': 'slow_query',
+            'path': trace['path'] if trace is not None else None,
+            'threshold_ms': Config.SLOW_QUERY_MS,
+            **call
+        }, default=str))
+
+
+def start_trace(path: str):
+    """Begin collecting calls for the current request; returns a token for ``end_trace``"""
+    if not Config.SUPABASE_TRACE:
+        return None
+    return _trace.set({'path': path, 'calls': []})
+
+
+def current_calls() -> List[Dict[str, Any]]:
+    """PostgREST calls made so far by the current request"""
+    trace = _trace.get()
+    return trace['calls'] if trace is not None else []
+
+
+def end_trace(token):
+    """Stop collecting, restoring the trace that was current at ``start_trace``"""
+    if token is not None:
+        _trace.reset(token)
+
+
+def server_timing(calls: List[Dict[str, Any]]) -> str:
+    """Format calls as a ``Server-Timing`` header: a total plus the first few calls"""
+    total = sum(call['duration_ms'] for call in calls)
+    entries = [f'supabase;desc="{len(calls)} calls";dur={total:.1f}']
+    for index, call in enumerate(calls[:MAX_TIMING_ENTRIES]):
+        entries.append(f'sb{index};desc="{call["operation"]} {call["table"]}";dur={call["duration_ms"]:.1f}')
+    return ', '.join(entries)
+
+
+def install():
+    """Register the transport observer once, if tracing or the slow-query log is on"""
+    global _installed
+    if _installed or not (Config.SUPABASE_TRACE or Config.SLOW_QUERY_MS > 0):
+        return
+    add_request_observer(_observe)
+    _installed = True
+
+
+def init_app(app):
+    """Trace the Supabase calls of every request of ``app``"""
+    install()
+    if not Config.SUPABASE_TRACE:
+        return
+
+    def begin():
+        g._trace_token = start_trace(request.path)
+
+    def add_header(response):
+        calls = current_calls()
+        if calls:
+            response.headers['Server-Timing'] = server_timing(calls)
+        return response
+
+    def finish(exc):
+        end_trace(g.pop('_trace_token', None))
+
+    app.before_request(begin)
+    app.after_request(add_header)
+    app.teardown_request(finish)